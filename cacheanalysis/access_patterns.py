@@ -0,0 +1,258 @@
+"""
+Detection of patterns in how the blocks of files are accessed, to find opportunities to prefetch blocks before they
+are needed: sequential scans of files, how often accessing a block of a file is followed by accessing the next
+block of the file and which blocks are frequently accessed together.
+
+Accesses (hits and misses) are processed as a stream, in memory bounded by the window that accesses are related
+within and the number of co-accessed pairs kept (aside from the block files that are registered).
+"""
+from collections import defaultdict, deque, namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from tabulate import tabulate
+
+from cacheanalysis.collections import RecordColumns, DELETE_EVENT
+from cacheanalysis.models import Record, CacheHitRecord, CacheMissRecord, BlockFile
+from cacheanalysis.sketches import SpaceSaving
+
+# Position of a block in a file: (file id, index of the block in the file's block hashes)
+_Position = Tuple[int, int]
+
+FileAccessPatterns = namedtuple("FileAccessPatterns", [
+    "files", "accesses", "scans", "scan_accesses", "follow_opportunities", "follows", "follow_probabilities"])
+FileAccessPatterns.__doc__ = """
+Access patterns of all registered block files, held as arrays that are indexed in the same order as `files` (i.e. in
+the order they were registered). `accesses` is the number of accesses to blocks in each file, `scans` is the number
+of sequential scans of the file and `scan_accesses` is the number of accesses that were part of them.
+`follow_opportunities` is the number of accesses to a block of the file that has a next block in the file, and
+`follows` is the number of those that were followed, within the window, by an access to the next block:
+`follow_probabilities` is the proportion that were (NaN if there were no opportunities).
+"""
+
+
+class _Scan:
+    """
+    Sequential scan of a file that is in progress.
+    """
+    __slots__ = ("length", "last_access")
+
+    def __init__(self, length: int, last_access: int):
+        self.length = length
+        self.last_access = last_access
+
+
+class AccessPatterns:
+    """
+    Detects access patterns in a stream of records, over the registered block files.
+
+    A sequential scan is a run of accesses to consecutive blocks of a file, in order, each within `window` accesses
+    of the last, that is at least `minimum_scan_length` blocks long. Scans may be interleaved with other accesses
+    (e.g. other scans). Every access to a block at a position in a file other than the last is an opportunity for
+    the next block in the file to follow it, which it does if the next block is accessed within the window. Pairs of
+    distinct blocks that are accessed within the window of each other are co-accessed, and the pairs that are
+    co-accessed most often are kept with Space-Saving.
+    """
+    def __init__(self, window: int=16, minimum_scan_length: int=4, capacity: int=1000):
+        """
+        Constructor.
+        :param window: the number of accesses after an access that are related to it
+        :param minimum_scan_length: the number of blocks in a run of accesses to consecutive blocks of a file for it
+        to be counted as a sequential scan
+        :param capacity: the number of co-accessed pairs of blocks to keep
+        """
+        if window < 1:
+            raise ValueError("Window must be at least one access: %d" % window)
+        self.window = window
+        self.minimum_scan_length = minimum_scan_length
+        self.co_accesses = SpaceSaving(capacity)
+        self.files = []     # type: List[BlockFile]
+        self.total_accesses = 0
+        self._file_ids = dict()     # type: Dict[BlockFile, int]
+        self._block_positions = defaultdict(list)   # type: Dict[str, List[_Position]]
+        self._file_lengths = []     # type: List[int]
+        self._accesses = []     # type: List[int]
+        self._scans = []    # type: List[int]
+        self._scan_accesses = []    # type: List[int]
+        self._follow_opportunities = []     # type: List[int]
+        self._follows = []  # type: List[int]
+        self._recent_blocks = deque(maxlen=window)    # type: deque
+        # Positions expected to be accessed next, with the accesses that expect them, oldest first
+        self._expected = dict()     # type: Dict[_Position, deque]
+        self._expectations = deque()    # type: deque
+        # Scans in progress, by the position that would continue them
+        self._active_scans = dict()     # type: Dict[_Position, _Scan]
+        self._scan_expiries = deque()   # type: deque
+
+    def register_file(self, file: BlockFile):
+        """
+        Registers a block file, so that accesses to its blocks are related to their positions in it. Registering a
+        file again has no effect.
+        :param file: the block file
+        """
+        if file in self._file_ids:
+            return
+        file_id = len(self.files)
+        self._file_ids[file] = file_id
+        self.files.append(file)
+        for index, block_hash in enumerate(file.block_hashes):
+            self._block_positions[block_hash].append((file_id, index))
+        self._file_lengths.append(len(file.block_hashes))
+        for counts in (self._accesses, self._scans, self._scan_accesses, self._follow_opportunities, self._follows):
+            counts.append(0)
+
+    def add_record(self, record: Record):
+        """
+        Adds a record to the stream.
+        :param record: the record, which should not have occurred before any of the records already added
+        """
+        if type(record) in (CacheHitRecord, CacheMissRecord):
+            self._access(record.block_hash)
+
+    def add_records(self, records: Iterable[Record]):
+        """
+        Adds records to the stream.
+        :param records: the records, in chronological order
+        """
+        for record in records:
+            self.add_record(record)
+
+    def add_columns(self, columns: RecordColumns):
+        """
+        Adds the events in the given columns to the stream, without creating records.
+        :param columns: the columns of events
+        """
+        block_hashes = columns.block_hashes
+        access = self._access
+        for block_id, event_type in zip(columns.block_ids.tolist(), columns.event_types.tolist()):
+            if event_type != DELETE_EVENT:
+                access(block_hashes[block_id])
+
+    def file_access_patterns(self) -> FileAccessPatterns:
+        """
+        Gets the access patterns of all registered files. Scans still in progress are included if they are long
+        enough, and accesses in the last window that are yet to be followed are not counted as opportunities.
+        :return: the access patterns
+        """
+        follow_opportunities = np.array(self._follow_opportunities, dtype=np.int64)
+        for (file_id, _), expecting_accesses in self._expected.items():
+            follow_opportunities[file_id] -= len(expecting_accesses)
+        follows = np.array(self._follows, dtype=np.int64)
+        return FileAccessPatterns(
+            list(self.files), np.array(self._accesses, dtype=np.int64), np.array(self._scans, dtype=np.int64),
+            np.array(self._scan_accesses, dtype=np.int64), follow_opportunities, follows,
+            np.divide(follows, follow_opportunities, out=np.full(len(follows), np.nan),
+                      where=follow_opportunities > 0))
+
+    def co_accessed_blocks(self, k: int=None) -> List[Tuple[Tuple[str, str], int, int]]:
+        """
+        Gets the pairs of blocks that were most often accessed within the window of each other.
+        :param k: the number of pairs to get, or `None` to get all that are kept
+        :return: list of (pair of block hashes, estimated count, maximum overestimate of the count), in descending
+        order of count
+        """
+        return self.co_accesses.top(k)
+
+    def report(self, k: int=20) -> str:
+        """
+        Gets a report of the files with the most sequential scans, the files whose blocks are most often followed
+        by their next block, and the blocks most often accessed together.
+        :param k: the number of files or pairs to list in each table
+        :return: the report
+        """
+        patterns = self.file_access_patterns()
+        by_scans = np.argsort(-patterns.scans, kind="mergesort")[:k]
+        follow_probabilities = np.where(np.isnan(patterns.follow_probabilities), -1, patterns.follow_probabilities)
+        by_follows = np.argsort(-follow_probabilities, kind="mergesort")[:k]
+        total_follow_opportunities = int(patterns.follow_opportunities.sum())
+        return "\n".join([
+            "Files sorted by number of sequential scans",
+            tabulate([[patterns.files[i].name, patterns.scans[i], patterns.scan_accesses[i], patterns.accesses[i]]
+                      for i in by_scans if patterns.scans[i] > 0],
+                     headers=("File", "Scans", "Accesses in scans", "Accesses")),
+            "Files sorted by probability of the next block following within %d accesses" % self.window,
+            tabulate([[patterns.files[i].name, patterns.follow_probabilities[i], patterns.follow_opportunities[i]]
+                      for i in by_follows if patterns.follow_opportunities[i] > 0],
+                     headers=("File", "Follow probability", "Opportunities"), floatfmt=".3f"),
+            "Pairs of blocks sorted by number of accesses within %d accesses of each other" % self.window,
+            tabulate([[block_hashes[0], block_hashes[1], count, error]
+                      for block_hashes, count, error in self.co_accessed_blocks(k)],
+                     headers=("Block", "Block", "Co-accesses", "Maximum overestimate")),
+            "Accesses in sequential scans: %d of %d" % (int(patterns.scan_accesses.sum()), self.total_accesses),
+            "Next block followed: %d of %d opportunities" % (int(patterns.follows.sum()), total_follow_opportunities)
+        ])
+
+    def _access(self, block_hash: str):
+        """
+        Processes an access to the given block.
+        :param block_hash: the block hash
+        """
+        self.total_accesses += 1
+        access = self.total_accesses
+        for other_block_hash in set(self._recent_blocks):
+            if other_block_hash != block_hash:
+                self.co_accesses.add((block_hash, other_block_hash) if block_hash < other_block_hash
+                                     else (other_block_hash, block_hash))
+        self._recent_blocks.append(block_hash)
+
+        self._expire(access)
+        positions = self._block_positions.get(block_hash)
+        if positions is None:
+            return
+        # The expectations and scans that the access meets are all found before any are added, so that an access to
+        # a block that is at consecutive positions in a file does not follow itself
+        expecting = [self._expected.pop(position, None) for position in positions]
+        scans = [self._active_scans.pop(position, None) for position in positions]
+        for (file_id, index), expecting_accesses, scan in zip(positions, expecting, scans):
+            self._accesses[file_id] += 1
+            if expecting_accesses is not None:
+                self._follows[file_id] += len(expecting_accesses)
+            if scan is None:
+                scan = _Scan(0, access)
+            self._continue_scan(file_id, scan, access)
+            if index + 1 < self._file_lengths[file_id]:
+                next_position = (file_id, index + 1)
+                self._follow_opportunities[file_id] += 1
+                self._expected.setdefault(next_position, deque()).append(access)
+                self._expectations.append((access, next_position))
+                current = self._active_scans.get(next_position)
+                # Of scans that would be continued by the same access, the longest is kept
+                if current is None or current.length <= scan.length:
+                    self._active_scans[next_position] = scan
+                    self._scan_expiries.append((access, next_position))
+
+    def _continue_scan(self, file_id: int, scan: _Scan, access: int):
+        """
+        Continues a scan of the given file with an access, counting it once it is long enough.
+        :param file_id: the id of the file
+        :param scan: the scan
+        :param access: the number of the access
+        """
+        scan.length += 1
+        scan.last_access = access
+        if scan.length == self.minimum_scan_length:
+            self._scans[file_id] += 1
+            self._scan_accesses[file_id] += scan.length
+        elif scan.length > self.minimum_scan_length:
+            self._scan_accesses[file_id] += 1
+
+    def _expire(self, access: int):
+        """
+        Discards the expectations of, and scans continued by, accesses more than the window before the given one.
+        :param access: the number of the access
+        """
+        oldest = access - self.window
+        expectations = self._expectations
+        while len(expectations) > 0 and expectations[0][0] < oldest:
+            expected_access, position = expectations.popleft()
+            expecting = self._expected.get(position)
+            if expecting is not None and expecting[0] == expected_access:
+                expecting.popleft()
+                if len(expecting) == 0:
+                    del self._expected[position]
+        scan_expiries = self._scan_expiries
+        while len(scan_expiries) > 0 and scan_expiries[0][0] < oldest:
+            last_access, position = scan_expiries.popleft()
+            scan = self._active_scans.get(position)
+            if scan is not None and scan.last_access == last_access:
+                del self._active_scans[position]
@@ -1,8 +1,8 @@
 from abc import ABCMeta
-from collections import defaultdict
-from typing import Dict, Set
+from typing import Hashable, Set
 
-from cacheanalysis.collections import RecordCollection
+from cacheanalysis.collections import BaseRecordCollection
+from cacheanalysis.file_index import BlockFileIndex
 from cacheanalysis.models import BlockFile
 
 
@@ -10,7 +10,7 @@ class Analysis(metaclass=ABCMeta):
     """
     Analysis of a collection of records that describe how blocks are put into a cache.
     """
-    def __init__(self, record_collection: RecordCollection):
+    def __init__(self, record_collection: BaseRecordCollection):
         """
         Constructor.
         :param record_collection: the records that are to be analysed
@@ -23,7 +23,16 @@ class Analysis(metaclass=ABCMeta):
         Gets a set of hashes of all the blocks that are known about in this analysis.
         :return: hashes of all known blocks
         """
-        return set(self.record_collection.records.keys())
+        return set(self.record_collection.block_hashes)
+
+    @property
+    def memoisation_state(self) -> Hashable:
+        """
+        Gets the state of this analysis, other than the collection of records, that memoised results depend on
+        (see `memoisation.memoised`).
+        :return: the state
+        """
+        return ()
 
 
 class BlockAnalysis(Analysis, metaclass=ABCMeta):
@@ -38,13 +47,17 @@ class BlockFileAnalysis(Analysis, metaclass=ABCMeta):
     Analysis of a collection of records that describe how blocks are put into a cache with added
     information about the origin and relationship of blocks.
     """
-    def __init__(self, record_collection: RecordCollection):
+    def __init__(self, record_collection: BaseRecordCollection):
         """
         Constructor.
         :param record_collection: see `Analysis.__init__`
         """
         super().__init__(record_collection)
-        self._known_blocks = defaultdict(set)  # type: Dict[str, Set[BlockFile]]
+        self.file_index = BlockFileIndex()
+
+    @property
+    def memoisation_state(self) -> Hashable:
+        return self.file_index, len(self.file_index)
 
     def register_file(self, file: BlockFile):
         """
@@ -52,5 +65,4 @@ class BlockFileAnalysis(Analysis, metaclass=ABCMeta):
         origin of blocks and their relationship to each other.
         :param file: the block file
         """
-        for block_id in file.block_hashes:
-            self._known_blocks[block_id].add(file)
+        self.file_index.add_file(file)
@@ -0,0 +1,65 @@
+"""
+Compares the time and memory taken to decode the JSON of records into a columnar collection, and to decode block
+files, between decoding records into objects first and decoding them straight into columns, and between the generic
+mapping decoder of block files and the dedicated one.
+
+Usage: python -m cacheanalysis.benchmarks.json_decoding [number_of_records] [number_of_blocks]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from tabulate import tabulate
+
+from cacheanalysis.benchmarks.synthetic_traces import generate_trace, to_json_dict
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.json_converters import RecordJSONDecoder, BlockFileJSONDecoder, _MappingBlockFileJSONDecoder
+
+
+def measure(decode: Callable[[], object]) -> Tuple[float, float]:
+    """
+    Measures the time taken to decode, and the peak memory allocated whilst decoding.
+    :param decode: function that decodes
+    :return: tuple of the time taken (seconds) and the peak memory (bytes)
+    """
+    started = time.perf_counter()
+    decode()
+    seconds = time.perf_counter() - started
+    # Memory is measured separately, as tracing slows allocation
+    tracemalloc.start()
+    decode()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main(number_of_records: int=1000000, number_of_blocks: int=None):
+    trace = generate_trace(number_of_records, number_of_blocks)
+    json_as_dict = to_json_dict(trace)
+    records = json_as_dict["records"]
+    records_as_bytes = json.dumps(records).encode("utf-8")
+    files = [{"name": file.name, "block_hashes": list(file.block_hashes)} for file in trace.files]
+    # Check that the decoders agree before measuring them
+    assert RecordJSONDecoder().decode_to_collection(records[:1000]).columns.block_ids.tolist() \
+        == ColumnarRecordCollection(RecordJSONDecoder().decode_parsed(records[:1000])).columns.block_ids.tolist()
+
+    rows = []
+    for name, decode in [
+        ("Records to objects to columns (before)",
+         lambda: ColumnarRecordCollection(RecordJSONDecoder().decode_parsed(records)).columns),
+        ("Records straight to columns (after)", lambda: RecordJSONDecoder().decode_to_collection(records).columns),
+        ("Records as bytes straight to columns (after)",
+         lambda: RecordJSONDecoder().decode_to_collection(records_as_bytes).columns),
+        ("Block files through mappings (before)", lambda: _MappingBlockFileJSONDecoder().decode_parsed(files)),
+        ("Block files directly (after)", lambda: BlockFileJSONDecoder().decode_parsed(files))
+    ]:
+        seconds, peak = measure(decode)
+        rows.append([name, seconds, peak / 2 ** 20])
+    print("%d records, %d block files" % (len(records), len(files)))
+    print(tabulate(rows, headers=("Decoding", "Seconds", "Peak memory (MiB)"), floatfmt=".3f"))
+
+
+if __name__ == "__main__":
+    main(*[int(argument) for argument in sys.argv[1:]])
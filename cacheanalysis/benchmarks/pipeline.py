@@ -0,0 +1,185 @@
+"""
+Times, and measures the memory used by, each stage of the `run_with_data` pipeline on synthetic traces of different
+sizes (see `cacheanalysis.benchmarks.synthetic_traces`). Results can be saved, and compared with results saved
+from another version, to find performance regressions.
+
+Each size is run in a new process, so that the peak memory of one size does not hide that of the next. Peak memory
+is the resident set size of that process at the end of each stage.
+
+Usage: python -m cacheanalysis.benchmarks.pipeline [--sizes N [N ...]] [--output PATH] [--compare PATH]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+from typing import Dict, List, Sequence
+
+import numpy as np
+from tabulate import tabulate
+
+from cacheanalysis.benchmarks.synthetic_traces import generate_trace, to_json
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.instrumentation import get_peak_memory
+from cacheanalysis.json_converters import RecordJSONDecoder, BlockFileJSONDecoder
+from cacheanalysis.visual_analysis import VisualBlockFileAnalysis
+
+DEFAULT_SIZES = (10000, 1000000, 10000000)
+STAGES = ("generate", "decode", "collect", "register", "statistics", "plot")
+
+# Changes in time smaller than this fraction are not reported as regressions or improvements
+_SIGNIFICANT_CHANGE = 0.1
+
+
+def run_pipeline(number_of_records: int, columnar: bool=False) -> Dict[str, Dict[str, float]]:
+    """
+    Runs each stage of the pipeline on a synthetic trace with the given number of records.
+    :param number_of_records: the number of records in the trace
+    :param columnar: whether to hold the records in a `ColumnarRecordCollection`
+    :return: the time taken (seconds) and the peak memory (bytes) of the process after each stage, by stage name
+    """
+    results = OrderedDict()     # type: Dict[str, Dict[str, float]]
+    output_directory = tempfile.mkdtemp()
+
+    def run_stage(name: str, stage):
+        started = time.perf_counter()
+        value = stage()
+        results[name] = {"seconds": time.perf_counter() - started, "peak_memory": get_peak_memory()}
+        return value
+
+    try:
+        json_as_string = run_stage("generate", lambda: to_json(generate_trace(number_of_records)))
+
+        def decode():
+            json_as_dict = json.loads(json_as_string)
+            # Columnar collections are decoded to straight away (so the collect stage has nothing to do)
+            decoder = RecordJSONDecoder()
+            records = decoder.decode_to_collection(json_as_dict["records"]) if columnar \
+                else decoder.decode_parsed(json_as_dict["records"])
+            return records, BlockFileJSONDecoder().decode_parsed(json_as_dict["references"])
+        records, reference_files = run_stage("decode", decode)
+        del json_as_string
+
+        record_collection = run_stage("collect", lambda: records if columnar else RecordCollection(records))
+        del records
+
+        def register():
+            analysis = VisualBlockFileAnalysis(record_collection)
+            for file in reference_files:
+                analysis.register_file(file)
+            return analysis
+        analysis = run_stage("register", register)
+
+        def calculate_statistics():
+            statistical_analysis = analysis.statistical_analysis
+            statistical_analysis.block_statistics()
+            statistical_analysis.all_mean_other_block_misses_between_reload()
+            statistical_analysis.known_file_block_hit_to_miss_proportion()
+            statistical_analysis.not_known_file_block_hit_to_miss_proportion()
+            statistical_analysis.file_statistics()
+            statistical_analysis.lru_miss_ratio_curves()
+        run_stage("statistics", calculate_statistics)
+
+        run_stage("plot", lambda: analysis.visualise(output_path=os.path.join(output_directory, "plot.png")))
+    finally:
+        shutil.rmtree(output_directory)
+    return results
+
+
+def run_benchmarks(sizes: Sequence[int]=DEFAULT_SIZES, columnar: bool=False) -> Dict:
+    """
+    Runs the pipeline on synthetic traces of each of the given sizes, each in a new process.
+    :param sizes: the numbers of records in the traces
+    :param columnar: see `run_pipeline`
+    :return: the results, with a description of the environment that they were measured in
+    """
+    results = OrderedDict()
+    for size in sizes:
+        with Pool(processes=1) as pool:
+            results[str(size)] = pool.apply(run_pipeline, (size, columnar))
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "columnar": columnar
+        },
+        "results": results
+    }
+
+
+def compare_results(baseline: Dict, current: Dict) -> List[List]:
+    """
+    Compares the times of the stages of two sets of results.
+    :param baseline: the results to compare against
+    :param current: the results to compare
+    :return: rows of size, stage, baseline time, current time, relative change in time and whether the change
+    is significant ("slower" or "faster", or empty), for each stage of each size in both sets of results
+    """
+    rows = []
+    for size, stages in current["results"].items():
+        baseline_stages = baseline["results"].get(size, {})
+        for stage, measurements in stages.items():
+            if stage not in baseline_stages:
+                continue
+            before, after = baseline_stages[stage]["seconds"], measurements["seconds"]
+            change = (after - before) / before if before > 0 else 0.0
+            significance = ""
+            if change > _SIGNIFICANT_CHANGE:
+                significance = "slower"
+            elif change < -_SIGNIFICANT_CHANGE:
+                significance = "faster"
+            rows.append([int(size), stage, before, after, change, significance])
+    return sorted(rows, key=lambda row: (row[0], STAGES.index(row[1]) if row[1] in STAGES else len(STAGES)))
+
+
+def format_results(results: Dict) -> str:
+    """
+    Formats the given results as a table.
+    :param results: the results
+    :return: the table
+    """
+    return tabulate(
+        [[int(size), stage, measurements["seconds"], measurements["peak_memory"] / 2 ** 20]
+         for size, stages in results["results"].items() for stage, measurements in stages.items()],
+        headers=("Records", "Stage", "Seconds", "Peak memory (MiB)"), floatfmt=".3f")
+
+
+def _parse_arguments(argv):
+    """
+    Parses the command line arguments.
+    :param argv: the arguments to parse
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks each stage of analysing synthetic traces")
+    parser.add_argument("--sizes", metavar="N", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of records in the traces to benchmark")
+    parser.add_argument("--columnar", action="store_true",
+                        help="hold records in compact columns rather than as record objects")
+    parser.add_argument("--output", metavar="PATH", help="JSON file to save the results to")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="JSON file of results (saved with --output) to compare the results with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = _parse_arguments(argv)
+    results = run_benchmarks(arguments.sizes, arguments.columnar)
+    print(format_results(results))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if arguments.compare is not None:
+        with open(arguments.compare, "r") as file:
+            baseline = json.load(file, object_pairs_hook=OrderedDict)
+        print(tabulate(
+            [row[:4] + ["%+.1f%%" % (row[4] * 100)] + row[5:] for row in compare_results(baseline, results)],
+            headers=("Records", "Stage", "Baseline seconds", "Seconds", "Change", ""), floatfmt=".3f"))
+
+
+if __name__ == "__main__":
+    main()
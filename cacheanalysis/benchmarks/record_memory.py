@@ -0,0 +1,89 @@
+"""
+Measures the memory used per record, comparing the record models against an equivalent of the previous models
+(which held their values in a per-instance `__dict__` and did not intern block hashes).
+
+Usage: python -m cacheanalysis.benchmarks.record_memory [number_of_records] [number_of_blocks]
+"""
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from tabulate import tabulate
+
+from cacheanalysis.models import CacheHitRecord, CacheMissRecord, CacheDeleteRecord
+
+_BLOCK_SIZE = 64 * 1024 * 1024
+_START = datetime(year=2016, month=1, day=1)
+
+
+class _DictRecord:
+    """
+    Record held in the same way as the models were before they were made slotted.
+    """
+    def __init__(self, block_hash: str, timestamp: datetime, block_size: int=None):
+        self.block_hash = block_hash
+        self.timestamp = timestamp
+        if block_size is not None:
+            self.block_size = block_size
+
+
+def generate_trace(number_of_records: int, number_of_blocks: int, seed: int=0) -> List[Tuple[str, int, datetime]]:
+    """
+    Generates a synthetic trace of (type, block number, timestamp) events.
+    :param number_of_records: the number of events to generate
+    :param number_of_blocks: the number of distinct blocks involved in the events
+    :param seed: seed for the random number generator
+    :return: the events
+    """
+    generator = random.Random(seed)
+    types = ("get", "put", "delete")
+    return [(generator.choice(types), generator.randrange(number_of_blocks), _START + timedelta(seconds=i))
+            for i in range(number_of_records)]
+
+
+def create_records(trace: List[Tuple[str, int, datetime]]) -> List:
+    record_types = {"get": CacheHitRecord, "delete": CacheDeleteRecord}
+    return [CacheMissRecord(_to_block_hash(block), timestamp, _BLOCK_SIZE) if event_type == "put"
+            else record_types[event_type](_to_block_hash(block), timestamp)
+            for event_type, block, timestamp in trace]
+
+
+def create_dict_records(trace: List[Tuple[str, int, datetime]]) -> List:
+    return [_DictRecord(_to_block_hash(block), timestamp, _BLOCK_SIZE if event_type == "put" else None)
+            for event_type, block, timestamp in trace]
+
+
+def measure_bytes_per_record(trace: List[Tuple[str, int, datetime]], create: Callable[[List], List]) -> float:
+    """
+    Measures the memory held per record after creating records for the given trace. Block hashes are created
+    afresh for every record, as they are when decoded from JSON, so are counted; timestamps are shared with the
+    trace so are not.
+    :param trace: the trace
+    :param create: function that creates records from the trace
+    :return: bytes per record
+    """
+    tracemalloc.start()
+    records = create(trace)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated / len(records)
+
+
+def _to_block_hash(block: int) -> str:
+    return "%032x" % block
+
+
+def main(number_of_records: int=100000, number_of_blocks: int=1000):
+    trace = generate_trace(number_of_records, number_of_blocks)
+    before = measure_bytes_per_record(trace, create_dict_records)
+    after = measure_bytes_per_record(trace, create_records)
+    print(tabulate(
+        [["__dict__ records (before)", before], ["Slotted, interned records (after)", after]],
+        headers=("Model", "Bytes per record"), floatfmt=".1f"
+    ))
+
+
+if __name__ == "__main__":
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,148 @@
+"""
+Generates synthetic traces of how blocks are put into a cache, for benchmarking.
+
+Blocks are grouped into files. Files are read whole, in order of their blocks, with the popularity of files
+following a Zipf distribution. Reads go through an LRU cache of blocks: a block that is in the cache is a hit,
+otherwise it is a miss and is put into the cache, deleting the least recently used block if the cache is full.
+"""
+import json
+import random
+from array import array
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from cacheanalysis.collections import RecordColumns, HIT_EVENT, MISS_EVENT, DELETE_EVENT, NO_BLOCK_SIZE
+from cacheanalysis.models import BlockFile
+from cacheanalysis.timestamps import to_epoch_nanoseconds, from_epoch_nanoseconds
+
+_START = datetime(year=2016, month=1, day=1)
+_MEGABYTE = 1024 * 1024
+_EVENT_TYPE_NAMES = {HIT_EVENT: "get", MISS_EVENT: "put", DELETE_EVENT: "delete"}
+
+SyntheticTrace = namedtuple("SyntheticTrace", ["columns", "files", "reference_files"])
+SyntheticTrace.__doc__ = """
+Synthetic trace: the events (see `RecordColumns`), all of the files that the blocks belong to and the files that
+are known references.
+"""
+
+
+def generate_trace(number_of_records: int, number_of_blocks: int=None, zipf_exponent: float=1.0,
+                   mean_blocks_per_file: float=8, cache_capacity: int=None, reference_fraction: float=0.1,
+                   mean_interval: float=0.01, seed: int=0) -> SyntheticTrace:
+    """
+    Generates a synthetic trace.
+    :param number_of_records: the number of events to generate
+    :param number_of_blocks: the number of distinct blocks, or `None` for a tenth of the number of events
+    :param zipf_exponent: the exponent of the Zipf distribution of the popularity of files, where larger values
+    concentrate reads on fewer files
+    :param mean_blocks_per_file: the mean number of blocks in each file (sizes are geometrically distributed)
+    :param cache_capacity: the number of blocks that the cache holds before deleting blocks, or `None` for a tenth
+    of the number of blocks
+    :param reference_fraction: the fraction of files that are known references
+    :param mean_interval: the mean time between events, in seconds
+    :param seed: seed for the random number generators
+    :return: the trace
+    """
+    if number_of_blocks is None:
+        number_of_blocks = max(1, number_of_records // 10)
+    if cache_capacity is None:
+        cache_capacity = max(1, number_of_blocks // 10)
+    generator = np.random.RandomState(seed)
+
+    file_sizes = _generate_file_sizes(number_of_blocks, mean_blocks_per_file, generator)
+    file_offsets = np.zeros(len(file_sizes) + 1, dtype=np.int64)
+    np.cumsum(file_sizes, out=file_offsets[1:])
+    block_hashes = ["%032x" % block_id for block_id in range(number_of_blocks)]
+    block_sizes = generator.randint(1, 65, number_of_blocks) * _MEGABYTE
+    files = [BlockFile("file-%d" % file_id, block_hashes[file_offsets[file_id]:file_offsets[file_id + 1]])
+             for file_id in range(len(file_sizes))]
+
+    # Popularity is independent of the position of files
+    file_ranks = generator.permutation(len(files))
+    cumulative_weights = np.cumsum(1.0 / np.power(np.arange(1, len(files) + 1, dtype=np.float64), zipf_exponent))
+
+    block_ids = array("q")
+    event_types = array("b")
+    cache = OrderedDict()   # type: OrderedDict
+    while len(block_ids) < number_of_records:
+        # Choose files in batches, as choosing each separately is slow
+        read_files = file_ranks[np.searchsorted(
+            cumulative_weights, generator.random_sample(1024) * cumulative_weights[-1], side="right")]
+        for file_id in read_files.tolist():
+            for block_id in range(file_offsets[file_id], file_offsets[file_id + 1]):
+                if block_id in cache:
+                    cache.move_to_end(block_id)
+                    block_ids.append(block_id)
+                    event_types.append(HIT_EVENT)
+                else:
+                    cache[block_id] = None
+                    block_ids.append(block_id)
+                    event_types.append(MISS_EVENT)
+                    if len(cache) > cache_capacity:
+                        block_ids.append(cache.popitem(last=False)[0])
+                        event_types.append(DELETE_EVENT)
+            if len(block_ids) >= number_of_records:
+                break
+
+    block_ids = np.frombuffer(block_ids, dtype=np.int64)[:number_of_records].copy()
+    event_types = np.frombuffer(event_types, dtype=np.int8)[:number_of_records].copy()
+    intervals = np.round(generator.exponential(mean_interval * 10 ** 9, number_of_records)).astype(np.int64)
+    timestamps = to_epoch_nanoseconds(_START) + np.cumsum(intervals)
+    sizes = np.where(event_types == MISS_EVENT, block_sizes[block_ids], NO_BLOCK_SIZE).astype(np.int64)
+    columns = RecordColumns(block_hashes, block_ids, event_types, timestamps, sizes)
+
+    reference_files = random.Random(seed).sample(files, int(round(len(files) * reference_fraction)))
+    return SyntheticTrace(columns, files, reference_files)
+
+
+def to_json_dict(trace: SyntheticTrace) -> Dict:
+    """
+    Converts the given trace to the JSON that `run_with_data` reads.
+    :param trace: the trace
+    :return: the JSON, as a dictionary
+    """
+    columns = trace.columns
+    records = []    # type: List[Dict]
+    for block_id, event_type, timestamp, block_size in zip(columns.block_ids.tolist(), columns.event_types.tolist(),
+                                                           columns.timestamps.tolist(), columns.block_sizes.tolist()):
+        record = {
+            "type": _EVENT_TYPE_NAMES[event_type],
+            "hash": columns.block_hashes[block_id],
+            "timestamp": from_epoch_nanoseconds(timestamp).isoformat() + "Z"
+        }
+        if event_type == MISS_EVENT:
+            record["size"] = block_size
+        records.append(record)
+    references = [{"name": file.name, "block_hashes": list(file.block_hashes)} for file in trace.reference_files]
+    return {"records": records, "references": references}
+
+
+def to_json(trace: SyntheticTrace) -> str:
+    """
+    Converts the given trace to the JSON that `run_with_data` reads.
+    :param trace: the trace
+    :return: the JSON
+    """
+    return json.dumps(to_json_dict(trace))
+
+
+def _generate_file_sizes(number_of_blocks: int, mean_blocks_per_file: float,
+                         generator: np.random.RandomState) -> np.ndarray:
+    """
+    Generates the number of blocks in each file, so that every block is in exactly one file.
+    :param number_of_blocks: the total number of blocks
+    :param mean_blocks_per_file: the mean number of blocks in a file
+    :param generator: the random number generator
+    :return: the size of each file
+    """
+    sizes = generator.geometric(1 / max(mean_blocks_per_file, 1), int(number_of_blocks / mean_blocks_per_file) + 1)
+    while sizes.sum() < number_of_blocks:
+        sizes = np.append(sizes, generator.geometric(1 / max(mean_blocks_per_file, 1), len(sizes)))
+    ends = np.cumsum(sizes)
+    number_of_files = int(np.searchsorted(ends, number_of_blocks)) + 1
+    sizes = sizes[:number_of_files]
+    sizes[-1] -= ends[number_of_files - 1] - number_of_blocks
+    return sizes.astype(np.int64)
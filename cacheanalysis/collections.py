@@ -1,30 +1,235 @@
-from collections import abc, defaultdict, Iterator
+from abc import ABCMeta, abstractmethod
+from collections import abc, defaultdict, namedtuple
+from datetime import datetime, timezone
+from bisect import bisect_left
 from itertools import chain
-from typing import Dict, Set, Iterable
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
 from cacheanalysis.models import Record, CacheHitRecord, CacheMissRecord, CacheDeleteRecord
+from cacheanalysis.timestamps import to_epoch_nanoseconds, from_epoch_nanoseconds, Timestamp
+
+HIT_EVENT = 0
+MISS_EVENT = 1
+DELETE_EVENT = 2
+
+RECORD_TYPE_EVENTS = {
+    CacheHitRecord: HIT_EVENT,
+    CacheMissRecord: MISS_EVENT,
+    CacheDeleteRecord: DELETE_EVENT
+}
+EVENT_RECORD_TYPES = {event: record_type for record_type, event in RECORD_TYPE_EVENTS.items()}
+
+# Size given to events that do not have a block size (i.e. all but misses)
+NO_BLOCK_SIZE = -1
+
+RecordColumns = namedtuple("RecordColumns", ["block_hashes", "block_ids", "event_types", "timestamps", "block_sizes"])
+RecordColumns.__doc__ = """
+Events in a collection of records, held as parallel arrays in chronological order. `block_ids` index into
+`block_hashes`, `event_types` are one of `HIT_EVENT`, `MISS_EVENT` or `DELETE_EVENT`, `timestamps` are nanoseconds
+since the epoch and `block_sizes` are `NO_BLOCK_SIZE` for events other than misses.
+"""
+BlockEventCounts = namedtuple("BlockEventCounts", ["block_hashes", "counts", "bytes_missed"])
+BlockEventCounts.__doc__ = """
+Number of events involving each block. `counts` has a row for each block in `block_hashes` and a column for each
+event type (i.e. it is indexed by `HIT_EVENT`, `MISS_EVENT` and `DELETE_EVENT`).
+"""
+_EVENT_ORDERED_RECORD_TYPES = (CacheHitRecord, CacheMissRecord, CacheDeleteRecord)
+_COLUMN_DTYPES = (np.int64, np.int8, np.int64, np.int64)
+# Number of events that room is first made for when records are added to a columnar collection
+_MINIMUM_CAPACITY = 1024
 
 
-class RecordCollection(abc.Iterable, abc.Container):
+class BaseRecordCollection(abc.Iterable, abc.Container, metaclass=ABCMeta):
     """
-    TODO
+    Collection of records, indexed by the block that they involve.
     """
     def __init__(self, records: Iterable[Record]=()):
         """
         Constructor.
         :param records: an iterable containing records to add to the collection
         """
-        self._records = defaultdict(lambda: defaultdict(set))  # type: Dict[str, Dict[type, Set[Record]]]
+        self._version = 0
+        self._time_index = None     # type: Optional[Tuple[int, List[Record], List]]
+        self._block_time_indexes = dict()   # type: Dict[str, Tuple[List[Record], List]]
+        self._block_time_indexes_version = 0
+        self._columns_cache = None  # type: Optional[Tuple[int, RecordColumns]]
         for record in records:
             self.add_record(record)
 
+    @abstractmethod
+    def __contains__(self, item: Record) -> bool:
+        """
+        Test if a record is contained within the collection.
+        :param item: a record
+        :return: whether the record is in the collection
+        """
+
+    @abstractmethod
+    def __iter__(self) -> Iterator:
+        """
+        Iterate over all records in the collection.
+        :return: an iterator
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        Gets the number of records in the collection.
+        :return: the number of records
+        """
+
+    @property
+    def version(self) -> int:
+        """
+        Gets the version of the collection, which changes whenever a record is added to the collection.
+        :return: the version
+        """
+        return self._version
+
+    @property
+    def columns(self) -> RecordColumns:
+        """
+        Gets the events in this collection as columns, sorted in chronological order. The columns are kept until
+        records are added to the collection.
+        :return: the columns of events
+        """
+        if self._columns_cache is None or self._columns_cache[0] != self.version:
+            records = self.get_records_in_time_order()
+            block_hashes = []   # type: List[str]
+            block_ids = dict()  # type: Dict[str, int]
+            for record in records:
+                if record.block_hash not in block_ids:
+                    block_ids[record.block_hash] = len(block_hashes)
+                    block_hashes.append(record.block_hash)
+            columns = RecordColumns(
+                block_hashes,
+                np.fromiter((block_ids[record.block_hash] for record in records), np.int64, len(records)),
+                np.fromiter((RECORD_TYPE_EVENTS[type(record)] for record in records), np.int8, len(records)),
+                np.fromiter((to_epoch_nanoseconds(record.timestamp) for record in records), np.int64, len(records)),
+                np.fromiter((getattr(record, "block_size", NO_BLOCK_SIZE) for record in records), np.int64,
+                            len(records))
+            )
+            self._columns_cache = (self.version, columns)
+        return self._columns_cache[1]
+
+    def get_block_event_counts(self) -> BlockEventCounts:
+        """
+        Gets the number of events of each type and the number of bytes missed for every block in the collection.
+        :return: the counts for every block
+        """
+        columns = self.columns
+        number_of_blocks = len(columns.block_hashes)
+        # Count every (block, event type) combination at once
+        counts = np.bincount(columns.block_ids * 3 + columns.event_types, minlength=number_of_blocks * 3) \
+            .reshape((number_of_blocks, 3))
+        bytes_missed = np.bincount(
+            columns.block_ids, weights=np.where(columns.event_types == MISS_EVENT, columns.block_sizes, 0),
+            minlength=number_of_blocks
+        ).astype(np.int64)
+        return BlockEventCounts(list(columns.block_hashes), counts, bytes_missed)
+
+    @property
+    @abstractmethod
+    def block_hashes(self) -> Iterable[str]:
+        """
+        Gets the hashes of all the blocks that have records in the collection.
+        :return: the block hashes
+        """
+
+    @abstractmethod
+    def add_record(self, record: Record):
+        """
+        Add a record to the collection.
+        :param record: a record
+        """
+
+    @abstractmethod
+    def get_block_hits(self, block_hash: str) -> List[CacheHitRecord]:
+        """
+        Get all cache hits associated with the given block hash.
+        :param block_hash: block hash to look up
+        :return: a list of records, with repeated events listed each time they occurred
+        """
+
+    def get_records_in_time_order(self, start: Timestamp=None, end: Timestamp=None) -> Sequence[Record]:
+        """
+        Gets the records in the collection that occurred in the given time window, in chronological order.
+        The time ordering is indexed when first required and kept until records are added to the collection,
+        so that each query is a binary search.
+        :param start: the (inclusive) start of the window. If `None`, the window starts at the first record
+        :param end: the (exclusive) end of the window. If `None`, the window ends at the last record
+        :return: the records in the window
+        """
+        if self._time_index is None or self._time_index[0] != self.version:
+            records = sorted(self, key=attrgetter("timestamp"))
+            self._time_index = (self.version, records, [record.timestamp for record in records])
+        _, records, timestamps = self._time_index
+        return records[_get_window(timestamps, start, end)]
+
+    def get_block_records_in_time_order(self, block_hash: str, start: Timestamp=None,
+                                        end: Timestamp=None) -> Sequence[Record]:
+        """
+        Gets the records associated with the given block hash that occurred in the given time window, in
+        chronological order. See `get_records_in_time_order`.
+        :param block_hash: block hash to look up
+        :param start: see `get_records_in_time_order`
+        :param end: see `get_records_in_time_order`
+        :return: the block's records in the window
+        """
+        if self._block_time_indexes_version != self.version:
+            self._block_time_indexes.clear()
+            self._block_time_indexes_version = self.version
+        block_time_index = self._block_time_indexes.get(block_hash)
+        if block_time_index is None:
+            records = sorted(chain(self.get_block_hits(block_hash), self.get_block_misses(block_hash),
+                                   self.get_block_deletes(block_hash)), key=attrgetter("timestamp"))
+            block_time_index = (records, [record.timestamp for record in records])
+            self._block_time_indexes[block_hash] = block_time_index
+        records, timestamps = block_time_index
+        return records[_get_window(timestamps, start, end)]
+
+    @abstractmethod
+    def get_block_misses(self, block_hash: str) -> List[CacheMissRecord]:
+        """
+        Get all cache misses associated with the given block hash.
+        :param block_hash: block hash to look up
+        :return: a list of records, with repeated events listed each time they occurred
+        """
+
+    @abstractmethod
+    def get_block_deletes(self, block_hash: str) -> List[CacheDeleteRecord]:
+        """
+        Get all cache deletes associated with the given block hash.
+        :param block_hash: block hash to look up
+        :return: a list of records, with repeated events listed each time they occurred
+        """
+
+
+class RecordCollection(BaseRecordCollection):
+    """
+    Collection of records, held as record objects in lists indexed by block hash and record type. Every record
+    that is added is held, including records equal to ones already in the collection (i.e. repeated events, such
+    as hits of the same block within the resolution of the clock).
+    """
+    def __init__(self, records: Iterable[Record]=()):
+        """
+        Constructor.
+        :param records: an iterable containing records to add to the collection
+        """
+        self._records = defaultdict(lambda: defaultdict(list))  # type: Dict[str, Dict[type, List[Record]]]
+        self._distinct_records = set()  # type: Set[Record]
+        super().__init__(records)
+
     def __contains__(self, item: Record) -> bool:
         """
         Test if a record is contained within the collection.
         :param item: a record
         :return:
         """
-        return item in iter(self)
+        return item in self._distinct_records
 
     def __iter__(self) -> Iterator:
         """
@@ -35,6 +240,24 @@ class RecordCollection(abc.Iterable, abc.Container):
             [d.values() for d in self._records.values()]
         ))
 
+    def __len__(self) -> int:
+        return sum(len(records) for d in self._records.values() for records in d.values())
+
+    @property
+    def block_hashes(self) -> Iterable[str]:
+        return self._records.keys()
+
+    def get_block_event_counts(self) -> BlockEventCounts:
+        block_hashes = []   # type: List[str]
+        counts = []
+        bytes_missed = []
+        for block_hash, records_by_type in self._records.items():
+            block_hashes.append(block_hash)
+            counts.append([len(records_by_type.get(record_type, ())) for record_type in _EVENT_ORDERED_RECORD_TYPES])
+            bytes_missed.append(sum(record.block_size for record in records_by_type.get(CacheMissRecord, ())))
+        return BlockEventCounts(block_hashes, np.array(counts, dtype=np.int64).reshape((len(block_hashes), 3)),
+                                np.array(bytes_missed, dtype=np.int64))
+
     @property
     def records(self):
         return self._records
@@ -44,28 +267,304 @@ class RecordCollection(abc.Iterable, abc.Container):
         Add a record to the collection.
         :param record: a record
         """
-        self._records[record.block_hash][type(record)].add(record)
+        self._records[record.block_hash][type(record)].append(record)
+        self._distinct_records.add(record)
+        self._version += 1
 
-    def get_block_hits(self, block_hash: str) -> Set[CacheHitRecord]:
+    def get_block_hits(self, block_hash: str) -> List[CacheHitRecord]:
         """
         Get all cache hits associated with the given block hash.
         :param block_hash: block hash to look up
-        :return: a set of records
+        :return: a list of records
         """
         return self._records[block_hash][CacheHitRecord]
 
-    def get_block_misses(self, block_hash: str) -> Set[CacheMissRecord]:
+    def get_block_misses(self, block_hash: str) -> List[CacheMissRecord]:
         """
         Get all cache misses associated with the given block hash.
         :param block_hash: block hash to look up
-        :return: a set of records
+        :return: a list of records
         """
         return self._records[block_hash][CacheMissRecord]
 
-    def get_block_deletes(self, block_hash: str) -> Set[CacheDeleteRecord]:
+    def get_block_deletes(self, block_hash: str) -> List[CacheDeleteRecord]:
         """
         Get all cache deletes associated with the given block hash.
         :param block_hash: block hash to look up
-        :return: a set of records
+        :return: a list of records
         """
         return self._records[block_hash][CacheDeleteRecord]
+
+
+class ColumnarRecordCollection(BaseRecordCollection):
+    """
+    Collection of records, held in compact parallel arrays of events rather than as record objects. Block hashes
+    are interned to integer ids and events are kept sorted by time, with an index of the events of each block.
+
+    Record objects are created on demand when records are retrieved, so records that are returned are equal in
+    value, but not identical, to those that were added. Timestamps are held to microsecond precision when added as
+    `datetime` objects and are returned in UTC, so all records in the collection must have timestamps of the same
+    type.
+    """
+    def __init__(self, records: Iterable[Record]=()):
+        """
+        Constructor.
+        :param records: an iterable containing records to add to the collection
+        """
+        self._block_hashes = []     # type: List[str]
+        self._block_ids = dict()    # type: Dict[str, int]
+        # Columns of events with room for more, of which the first `_size` are used and the first `_sorted_size`
+        # are in chronological order
+        self._buffers = [np.empty(0, dtype=dtype) for dtype in _COLUMN_DTYPES]     # type: List[np.ndarray]
+        self._size = 0
+        self._sorted_size = 0
+        self._columns = RecordColumns(self._block_hashes, *self._buffers)
+        self._block_offsets = None  # type: Optional[np.ndarray]
+        self._block_order = None    # type: Optional[np.ndarray]
+        self._datetime_timestamps = None    # type: Optional[bool]
+        self._timestamp_timezone = None
+        super().__init__(records)
+
+    @classmethod
+    def from_columns(cls, columns: RecordColumns, datetime_timestamps: bool=False,
+                     timestamp_timezone: timezone=None) -> "ColumnarRecordCollection":
+        """
+        Creates a collection of the events in the given columns. The columns are used as they are, without being
+        copied, so they may be (read-only) memory-mapped arrays; they are only copied if records are added.
+        :param columns: the events, in chronological order
+        :param datetime_timestamps: whether the timestamps of the records that are returned should be `datetime`
+        objects, rather than integer nanoseconds since the epoch
+        :param timestamp_timezone: the time zone given to `datetime` timestamps, or `None` for naive timestamps
+        :return: the collection
+        """
+        collection = cls()
+        collection._block_hashes.extend(columns.block_hashes)
+        collection._block_ids.update((block_hash, i) for i, block_hash in enumerate(collection._block_hashes))
+        collection._buffers = list(columns[1:])
+        collection._size = collection._sorted_size = len(columns.block_ids)
+        collection._columns = RecordColumns(collection._block_hashes, *columns[1:])
+        if len(columns.block_ids) > 0:
+            collection._datetime_timestamps = datetime_timestamps
+            collection._timestamp_timezone = timestamp_timezone
+        collection._version += 1
+        return collection
+
+    def __contains__(self, item: Record) -> bool:
+        block_id = self._block_ids.get(item.block_hash)
+        event_type = RECORD_TYPE_EVENTS.get(type(item))
+        if block_id is None or event_type is None:
+            return False
+        columns = self.columns
+        timestamp = to_epoch_nanoseconds(item.timestamp)
+        # The columns are in chronological order, so only the events at the record's time need to be compared
+        start = np.searchsorted(columns.timestamps, timestamp, side="left")
+        end = np.searchsorted(columns.timestamps, timestamp, side="right")
+        matches = (columns.block_ids[start:end] == block_id) & (columns.event_types[start:end] == event_type)
+        if event_type == MISS_EVENT:
+            matches &= columns.block_sizes[start:end] == item.block_size
+        return bool(matches.any())
+
+    def __iter__(self) -> Iterator:
+        """
+        Iterate over all records in the collection, in chronological order.
+        :return: an iterator
+        """
+        columns = self.columns
+        return (self._create_record(columns, event) for event in range(len(columns.block_ids)))
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def block_hashes(self) -> Iterable[str]:
+        return self._block_hashes
+
+    @property
+    def timestamp_type(self) -> Tuple[bool, Optional[timezone]]:
+        """
+        Gets how the timestamps of records in the collection are represented.
+        :return: tuple of whether timestamps are `datetime` objects and the time zone they are given (`None` if
+        naive or not `datetime` objects)
+        """
+        return bool(self._datetime_timestamps), self._timestamp_timezone
+
+    @property
+    def columns(self) -> RecordColumns:
+        """
+        See `BaseRecordCollection.columns`. The columns are views of arrays that records are appended to, so
+        getting them after adding records only costs time in the number of records added, unless records were
+        added out of chronological order (in which case, the events from the earliest one onwards are re-sorted).
+        :return: the columns of events
+        """
+        if self._sorted_size < self._size:
+            self._sort_added_events()
+            self._columns = RecordColumns(self._block_hashes, *(buffer[:self._size] for buffer in self._buffers))
+        return self._columns
+
+    def add_record(self, record: Record):
+        """
+        Add a record to the collection.
+        :param record: a record, whose timestamp must be of the same type (and, if a `datetime`, be naive or
+        aware in the same way) as those of the records already in the collection
+        :raises ValueError: if the timestamp of the record is not of the same type as the others
+        """
+        is_datetime = isinstance(record.timestamp, datetime)
+        is_aware = is_datetime and record.timestamp.utcoffset() is not None
+        if self._datetime_timestamps is None:
+            self._datetime_timestamps = is_datetime
+            self._timestamp_timezone = timezone.utc if is_aware else None
+        elif is_datetime != self._datetime_timestamps or is_aware != (self._timestamp_timezone is not None):
+            raise ValueError("Timestamp of %r is not of the type of the timestamps in the collection (%s)"
+                             % (record, _describe_timestamp_type(self._datetime_timestamps,
+                                                                 self._timestamp_timezone is not None)))
+        block_id = self._block_ids.get(record.block_hash)
+        if block_id is None:
+            block_id = len(self._block_hashes)
+            self._block_ids[record.block_hash] = block_id
+            self._block_hashes.append(record.block_hash)
+        event_type = RECORD_TYPE_EVENTS[type(record)]
+
+        if self._size == len(self._buffers[0]):
+            self._grow()
+        block_ids, event_types, timestamps, block_sizes = self._buffers
+        block_ids[self._size] = block_id
+        event_types[self._size] = event_type
+        timestamps[self._size] = to_epoch_nanoseconds(record.timestamp)
+        block_sizes[self._size] = record.block_size if event_type == MISS_EVENT else NO_BLOCK_SIZE
+        self._size += 1
+        self._block_offsets = None
+        self._block_order = None
+        self._version += 1
+
+    def get_block_hits(self, block_hash: str) -> List[CacheHitRecord]:
+        return self._get_block_records(block_hash, HIT_EVENT)
+
+    def get_block_misses(self, block_hash: str) -> List[CacheMissRecord]:
+        return self._get_block_records(block_hash, MISS_EVENT)
+
+    def get_block_deletes(self, block_hash: str) -> List[CacheDeleteRecord]:
+        return self._get_block_records(block_hash, DELETE_EVENT)
+
+    def get_records_in_time_order(self, start: Timestamp=None, end: Timestamp=None) -> Sequence[Record]:
+        columns = self.columns
+        window = _get_window(columns.timestamps, *_to_epoch_nanoseconds_window(start, end))
+        return [self._create_record(columns, event) for event in range(window.start, window.stop)]
+
+    def get_block_records_in_time_order(self, block_hash: str, start: Timestamp=None,
+                                        end: Timestamp=None) -> Sequence[Record]:
+        block_id = self._block_ids.get(block_hash)
+        if block_id is None:
+            return []
+        columns = self.columns
+        events = self._get_block_events(block_id)
+        window = _get_window(columns.timestamps[events], *_to_epoch_nanoseconds_window(start, end))
+        return [self._create_record(columns, event) for event in events[window]]
+
+    def _get_block_records(self, block_hash: str, event_type: int) -> List[Record]:
+        """
+        Gets the records of the given type associated with the given block hash.
+        :param block_hash: block hash to look up
+        :param event_type: the type of event
+        :return: a list of records
+        """
+        block_id = self._block_ids.get(block_hash)
+        if block_id is None:
+            return []
+        columns = self.columns
+        events = self._get_block_events(block_id)
+        events = events[columns.event_types[events] == event_type]
+        return [self._create_record(columns, event) for event in events]
+
+    def _grow(self):
+        """
+        Makes room for more events, doubling the capacity of the columns so that the cost of copying them is
+        amortised over the records that are added.
+        """
+        capacity = max(_MINIMUM_CAPACITY, 2 * len(self._buffers[0]))
+        buffers = []
+        for buffer in self._buffers:
+            grown = np.empty(capacity, dtype=buffer.dtype)
+            grown[:self._size] = buffer[:self._size]
+            buffers.append(grown)
+        self._buffers = buffers
+
+    def _sort_added_events(self):
+        """
+        Puts the events added since the columns were last got into chronological order with the others. Only the
+        events from where the earliest added event belongs onwards are sorted; events at the same time are kept in
+        the order that they were added.
+        """
+        timestamps = self._buffers[2]
+        added = timestamps[self._sorted_size:self._size]
+        if np.any(added[1:] < added[:-1]) \
+                or (self._sorted_size > 0 and added[0] < timestamps[self._sorted_size - 1]):
+            start = int(np.searchsorted(timestamps[:self._sorted_size], added.min(), side="right"))
+            order = start + np.argsort(timestamps[start:self._size], kind="mergesort")
+            for buffer in self._buffers:
+                buffer[start:self._size] = buffer[order]
+        self._sorted_size = self._size
+
+    def _get_block_events(self, block_id: int) -> np.ndarray:
+        """
+        Gets the positions of the events of the given block in the (chronologically ordered) columns.
+        :param block_id: the id of the block
+        :return: the event positions, in chronological order
+        """
+        if self._block_offsets is None:
+            block_ids = self.columns.block_ids
+            self._block_order = np.argsort(block_ids, kind="mergesort")
+            self._block_offsets = np.zeros(len(self._block_hashes) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(block_ids, minlength=len(self._block_hashes)), out=self._block_offsets[1:])
+        return self._block_order[self._block_offsets[block_id]:self._block_offsets[block_id + 1]]
+
+    def _create_record(self, columns: RecordColumns, event: int) -> Record:
+        """
+        Creates the record object for the event at the given position in the columns.
+        :param columns: the columns of events
+        :param event: the position of the event
+        :return: the record
+        """
+        event_type = int(columns.event_types[event])
+        block_hash = self._block_hashes[columns.block_ids[event]]
+        timestamp = int(columns.timestamps[event])
+        if self._datetime_timestamps:
+            timestamp = from_epoch_nanoseconds(timestamp, self._timestamp_timezone)
+        if event_type == MISS_EVENT:
+            return CacheMissRecord(block_hash, timestamp, int(columns.block_sizes[event]))
+        return EVENT_RECORD_TYPES[event_type](block_hash, timestamp)
+
+
+def _describe_timestamp_type(is_datetime: bool, is_aware: bool) -> str:
+    """
+    Describes a type of timestamp.
+    :param is_datetime: whether the timestamps are `datetime` objects, rather than integer nanoseconds
+    :param is_aware: whether the `datetime` timestamps are aware of their time zone
+    :return: the description
+    """
+    if not is_datetime:
+        return "integer nanoseconds since the epoch"
+    return "aware datetimes" if is_aware else "naive datetimes"
+
+
+def _get_window(timestamps: Sequence, start: Optional[Timestamp], end: Optional[Timestamp]) -> slice:
+    """
+    Gets the slice of the given chronologically ordered timestamps that are in the given time window.
+    :param timestamps: the timestamps, in chronological order
+    :param start: the (inclusive) start of the window, or `None` if unbounded
+    :param end: the (exclusive) end of the window, or `None` if unbounded
+    :return: the slice of the timestamps in the window
+    """
+    lower = 0 if start is None else bisect_left(timestamps, start)
+    upper = len(timestamps) if end is None else bisect_left(timestamps, end)
+    return slice(lower, max(lower, upper))
+
+
+def _to_epoch_nanoseconds_window(start: Optional[Timestamp], end: Optional[Timestamp]) \
+        -> Tuple[Optional[int], Optional[int]]:
+    """
+    Converts the bounds of a time window to nanoseconds since the epoch.
+    :param start: the start of the window, or `None` if unbounded
+    :param end: the end of the window, or `None` if unbounded
+    :return: the converted start and end
+    """
+    return tuple(None if bound is None else to_epoch_nanoseconds(bound) for bound in (start, end))
@@ -0,0 +1,154 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cacheanalysis.models import BlockFile
+
+
+class BlockFileIndex:
+    """
+    Bidirectional index between block files and the blocks that they consist of. Files and blocks are given
+    integer ids in the order that they are first registered and membership is held in compressed sparse row form
+    in both directions: `file_offsets` and `file_block_ids` give the blocks of each file, and `block_offsets` and
+    `block_file_ids` give the files of each block. The arrays are built when first required after files are
+    registered.
+    """
+    def __init__(self):
+        self.files = []     # type: List[BlockFile]
+        self.block_hashes = []  # type: List[str]
+        self._file_ids = dict()     # type: Dict[BlockFile, int]
+        self._block_ids = dict()    # type: Dict[str, int]
+        self._membership = []   # type: List[int]
+        self._membership_offsets = [0]  # type: List[int]
+        self._arrays = None     # type: Optional[Sequence[np.ndarray]]
+
+    def __contains__(self, block_hash: str) -> bool:
+        """
+        Tests if the given block is in any registered file.
+        :param block_hash: the block hash
+        :return: whether the block is in a registered file
+        """
+        return block_hash in self._block_ids
+
+    def __len__(self) -> int:
+        """
+        Gets the number of files that have been registered.
+        :return: the number of files
+        """
+        return len(self.files)
+
+    def add_file(self, file: BlockFile):
+        """
+        Registers the given block file. Registering a file again has no effect.
+        :param file: the block file
+        """
+        if file in self._file_ids:
+            return
+        self._file_ids[file] = len(self.files)
+        self.files.append(file)
+        block_ids = self._block_ids
+        # A block that appears more than once in a file is only counted once
+        for block_hash in dict.fromkeys(file.block_hashes):
+            block_id = block_ids.get(block_hash)
+            if block_id is None:
+                block_id = len(self.block_hashes)
+                block_ids[block_hash] = block_id
+                self.block_hashes.append(block_hash)
+            self._membership.append(block_id)
+        self._membership_offsets.append(len(self._membership))
+        self._arrays = None
+
+    def get_file_id(self, file: BlockFile) -> Optional[int]:
+        """
+        Gets the id of the given file.
+        :param file: the file
+        :return: the id, or `None` if the file has not been registered
+        """
+        return self._file_ids.get(file)
+
+    def get_block_id(self, block_hash: str) -> Optional[int]:
+        """
+        Gets the id of the given block.
+        :param block_hash: the block hash
+        :return: the id, or `None` if the block is not in any registered file
+        """
+        return self._block_ids.get(block_hash)
+
+    def get_files(self, block_hash: str) -> List[BlockFile]:
+        """
+        Gets the registered files that contain the given block.
+        :param block_hash: the block hash
+        :return: the files, in the order they were registered
+        """
+        block_id = self._block_ids.get(block_hash)
+        if block_id is None:
+            return []
+        return [self.files[file_id] for file_id in
+                self.block_file_ids[self.block_offsets[block_id]:self.block_offsets[block_id + 1]].tolist()]
+
+    @property
+    def file_offsets(self) -> np.ndarray:
+        """
+        Gets the offsets of the blocks of each file (and of the end of the last file's blocks) in `file_block_ids`.
+        :return: the offsets
+        """
+        return self._get_arrays()[0]
+
+    @property
+    def file_block_ids(self) -> np.ndarray:
+        """
+        Gets the ids of the blocks of each file, concatenated in order of file id.
+        :return: the block ids
+        """
+        return self._get_arrays()[1]
+
+    @property
+    def block_offsets(self) -> np.ndarray:
+        """
+        Gets the offsets of the files of each block (and of the end of the last block's files) in
+        `block_file_ids`.
+        :return: the offsets
+        """
+        return self._get_arrays()[2]
+
+    @property
+    def block_file_ids(self) -> np.ndarray:
+        """
+        Gets the ids of the files containing each block, concatenated in order of block id.
+        :return: the file ids
+        """
+        return self._get_arrays()[3]
+
+    @property
+    def membership_file_ids(self) -> np.ndarray:
+        """
+        Gets the id of the file of each entry in `file_block_ids`.
+        :return: the file ids
+        """
+        return self._get_arrays()[4]
+
+    def sum_over_files(self, block_values: np.ndarray) -> np.ndarray:
+        """
+        Sums the given values of blocks over the blocks of each file.
+        :param block_values: a value for each block, indexed by block id
+        :return: the sum for each file, indexed by file id
+        """
+        return np.bincount(self.membership_file_ids, weights=block_values[self.file_block_ids],
+                           minlength=len(self.files))
+
+    def _get_arrays(self) -> Sequence[np.ndarray]:
+        """
+        Gets the membership arrays, building them if files have been registered since they were last built.
+        :return: the file offsets, file block ids, block offsets, block file ids and membership file ids
+        """
+        if self._arrays is None:
+            file_offsets = np.array(self._membership_offsets, dtype=np.int64)
+            file_block_ids = np.array(self._membership, dtype=np.int64)
+            membership_file_ids = np.repeat(np.arange(len(self.files), dtype=np.int64), np.diff(file_offsets))
+            # Inverting the membership is a stable sort of the file of each membership by block
+            order = np.argsort(file_block_ids, kind="mergesort")
+            block_offsets = np.zeros(len(self.block_hashes) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(file_block_ids, minlength=len(self.block_hashes)), out=block_offsets[1:])
+            self._arrays = (file_offsets, file_block_ids, block_offsets, membership_file_ids[order],
+                            membership_file_ids)
+        return self._arrays
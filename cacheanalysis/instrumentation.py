@@ -0,0 +1,282 @@
+"""
+Instrumentation of the stages of analysing records: the time spent in each stage, the number of items (e.g. records)
+that each stage processed, counts of notable events, the peak memory used and, optionally, profiles of chosen
+methods.
+
+Instrumentation is disabled by default, in which case stages, timed methods and counters do no more than check that
+it is disabled.
+"""
+import cProfile
+import pstats
+import resource
+import sys
+import time
+from collections import OrderedDict
+from functools import wraps
+from io import StringIO
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from tabulate import tabulate
+
+# Name that can be given to profile every timed method
+PROFILE_ALL = "all"
+
+
+class _StageMeasurements:
+    """
+    Measurements of a stage, accumulated over every time that it is run.
+    """
+    __slots__ = ("calls", "seconds", "items", "peak_memory")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_memory = 0
+
+
+class _Stage:
+    """
+    Context in which a stage is run, which is timed.
+    """
+    __slots__ = ("_measurements", "_started")
+
+    def __init__(self, measurements: _StageMeasurements):
+        self._measurements = measurements
+        self._started = 0.0
+
+    def __enter__(self) -> "_Stage":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        measurements = self._measurements
+        measurements.calls += 1
+        measurements.seconds += time.perf_counter() - self._started
+        measurements.peak_memory = get_peak_memory()
+
+    def add_items(self, number_of_items: int):
+        """
+        Adds to the number of items that the stage has processed, from which its throughput is calculated.
+        :param number_of_items: the number of items
+        """
+        self._measurements.items += number_of_items
+
+
+class _NullStage:
+    """
+    Context in which a stage is run when instrumentation is disabled, which does nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def add_items(self, number_of_items: int):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Instrumentation:
+    """
+    Collects measurements of stages, counters and profiles whilst enabled.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.stages = OrderedDict()     # type: Dict[str, _StageMeasurements]
+        self.counters = OrderedDict()   # type: Dict[str, int]
+        self._profiled_names = frozenset()
+        self._profiler = None   # type: Optional[cProfile.Profile]
+        self._profiling = False
+
+    def enable(self, profile: Iterable[str]=()):
+        """
+        Enables instrumentation.
+        :param profile: names of timed methods to profile (either qualified, e.g.
+        "StatisticalBlockAnalysis.block_statistics", or not, e.g. "block_statistics"), or `PROFILE_ALL` to
+        profile all of them
+        """
+        self.enabled = True
+        self._profiled_names = frozenset(profile)
+        if len(self._profiled_names) > 0 and self._profiler is None:
+            self._profiler = cProfile.Profile()
+
+    def disable(self):
+        """
+        Disables instrumentation. Measurements that have been made are kept.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Discards all measurements that have been made.
+        """
+        self.stages.clear()
+        self.counters.clear()
+        self._profiler = cProfile.Profile() if len(self._profiled_names) > 0 else None
+
+    def stage(self, name: str):
+        """
+        Gets a context in which to run a stage of the given name, which is timed if instrumentation is enabled.
+        Stages that are run within others are included in their time.
+        :param name: the name of the stage
+        :return: the context, which has an `add_items` method to record how many items the stage processed
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        measurements = self.stages.get(name)
+        if measurements is None:
+            measurements = _StageMeasurements()
+            self.stages[name] = measurements
+        return _Stage(measurements)
+
+    def increment(self, name: str, amount: int=1):
+        """
+        Increments the counter of the given name, if instrumentation is enabled.
+        :param name: the name of the counter
+        :param amount: the amount to increment it by
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def call(self, name: str, function: Callable, args: Sequence=(), kwargs: Dict[str, Any]=None) -> Any:
+        """
+        Calls the given function as a stage, profiling it if it is one of the functions that should be profiled.
+        :param name: the name of the stage
+        :param function: the function
+        :param args: the positional arguments to call the function with
+        :param kwargs: the keyword arguments to call the function with
+        :return: the result of the function
+        """
+        kwargs = kwargs if kwargs is not None else {}
+        with self.stage(name):
+            if not self.enabled or self._profiling or not self._is_profiled(name):
+                return function(*args, **kwargs)
+            # Profiles of functions called within a profiled function are included in its profile
+            self._profiling = True
+            self._profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._profiler.disable()
+                self._profiling = False
+
+    def report(self, number_of_profiled_functions: int=30) -> Dict:
+        """
+        Gets a report of the measurements that have been made.
+        :param number_of_profiled_functions: the number of functions to include in the profile, by cumulative time
+        :return: the report, which can be serialised as JSON
+        """
+        stages = []
+        for name, measurements in self.stages.items():
+            stages.append(OrderedDict([
+                ("name", name),
+                ("calls", measurements.calls),
+                ("seconds", measurements.seconds),
+                ("seconds_per_call", measurements.seconds / measurements.calls if measurements.calls > 0 else None),
+                ("items", measurements.items),
+                ("items_per_second",
+                 measurements.items / measurements.seconds if measurements.items > 0 and measurements.seconds > 0
+                 else None),
+                ("peak_memory", measurements.peak_memory)
+            ]))
+        profile = None
+        if self._profiler is not None:
+            output = StringIO()
+            try:
+                pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(
+                    number_of_profiled_functions)
+                profile = output.getvalue()
+            except TypeError:
+                # Nothing has been profiled
+                pass
+        return OrderedDict([
+            ("stages", stages),
+            ("counters", OrderedDict(self.counters)),
+            ("peak_memory", get_peak_memory()),
+            ("profile", profile)
+        ])
+
+    def format_report(self, number_of_profiled_functions: int=30) -> str:
+        """
+        Gets a report of the measurements that have been made, formatted as text.
+        :param number_of_profiled_functions: see `report`
+        :return: the report
+        """
+        report = self.report(number_of_profiled_functions)
+        lines = [
+            tabulate([[stage["name"], stage["calls"], stage["seconds"], stage["seconds_per_call"], stage["items"],
+                       stage["items_per_second"], stage["peak_memory"] / 2 ** 20] for stage in report["stages"]],
+                     headers=("Stage", "Calls", "Seconds", "Seconds per call", "Items", "Items per second",
+                              "Peak memory (MiB)"), floatfmt=".3f"),
+            "Peak memory (MiB): %.3f" % (report["peak_memory"] / 2 ** 20)
+        ]
+        if len(report["counters"]) > 0:
+            lines.insert(1, tabulate(list(report["counters"].items()), headers=("Counter", "Count")))
+        if report["profile"] is not None:
+            lines.append(report["profile"])
+        return "\n".join(lines)
+
+    def _is_profiled(self, name: str) -> bool:
+        """
+        Tests if the function with the given (qualified) name should be profiled.
+        :param name: the name
+        :return: whether it should be profiled
+        """
+        profiled_names = self._profiled_names
+        return PROFILE_ALL in profiled_names or name in profiled_names or name.rsplit(".", 1)[-1] in profiled_names
+
+
+instrumentation = Instrumentation()
+
+
+def stage(name: str):
+    """
+    Gets a context in which to run a stage of the given name (see `Instrumentation.stage`).
+    :param name: the name of the stage
+    :return: the context
+    """
+    return instrumentation.stage(name) if instrumentation.enabled else _NULL_STAGE
+
+
+def increment(name: str, amount: int=1):
+    """
+    Increments the counter of the given name (see `Instrumentation.increment`).
+    :param name: the name of the counter
+    :param amount: the amount to increment it by
+    """
+    if instrumentation.enabled:
+        instrumentation.increment(name, amount)
+
+
+def timed(name: str=None) -> Callable[[Callable], Callable]:
+    """
+    Decorator of functions that should be timed as stages (and profiled if chosen) when instrumentation is enabled.
+    :param name: the name of the stage, or `None` to use the qualified name of the function
+    :return: the decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        stage_name = function.__qualname__ if name is None else name
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            return instrumentation.call(stage_name, function, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def get_peak_memory() -> int:
+    """
+    Gets the peak resident set size of this process.
+    :return: the peak memory, in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kilobytes, macOS gives bytes
+    return peak if sys.platform == "darwin" else peak * 1024
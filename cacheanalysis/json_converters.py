@@ -1,12 +1,19 @@
 import json
-from json import JSONDecoder
+import sys
+from array import array
+from datetime import datetime, timezone
+from json import JSONDecoder, JSONEncoder
 
-import dateutil.parser
+import numpy as np
 from hgijson import JsonPropertyMapping, MappingJSONEncoderClassBuilder, MappingJSONDecoderClassBuilder
-from typing import List
+from typing import Dict, List, Iterable, Iterator, Union
 
+from cacheanalysis.collections import ColumnarRecordCollection, RecordColumns, HIT_EVENT, MISS_EVENT, \
+    DELETE_EVENT, NO_BLOCK_SIZE
+from cacheanalysis.instrumentation import stage
 from cacheanalysis.models import BlockFile, CacheMissRecord, CacheHitRecord, \
-    CacheDeleteRecord
+    CacheDeleteRecord, Record
+from cacheanalysis.timestamps import TimestampParser, Timestamp, from_epoch_nanoseconds
 
 
 _block_file_json_property_mappings = [
@@ -14,7 +21,45 @@ _block_file_json_property_mappings = [
     JsonPropertyMapping("block_hashes", "block_hashes", object_constructor_parameter_name="block_hashes")
 ]
 BlockFileJSONEncoder = MappingJSONEncoderClassBuilder(BlockFile, _block_file_json_property_mappings).build()
-BlockFileJSONDecoder = MappingJSONDecoderClassBuilder(BlockFile, _block_file_json_property_mappings).build()
+_MappingBlockFileJSONDecoder = MappingJSONDecoderClassBuilder(BlockFile, _block_file_json_property_mappings).build()
+
+
+class BlockFileJSONDecoder(_MappingBlockFileJSONDecoder):
+    """
+    Decoder of block files. As there are often many block files to decode, they are constructed directly rather
+    than through the generic property mappings.
+    """
+    def decode_parsed(self, json_as_dict):
+        if isinstance(json_as_dict, list):
+            return [BlockFile(file["name"], file["block_hashes"]) for file in json_as_dict]
+        return BlockFile(json_as_dict["name"], json_as_dict["block_hashes"])
+
+
+class RecordJSONEncoder(JSONEncoder):
+    """
+    Encoder of records to the JSON that `RecordJSONDecoder` decodes. Timestamps that are nanoseconds since the
+    epoch are encoded as ISO-8601 timestamps in UTC, to microsecond precision.
+    """
+    _record_type_mapping = {
+        CacheHitRecord: "get",
+        CacheMissRecord: "put",
+        CacheDeleteRecord: "delete"
+    }
+
+    def default(self, record):
+        record_type = RecordJSONEncoder._record_type_mapping.get(type(record))
+        if record_type is None:
+            return super().default(record)
+        timestamp = record.timestamp
+        json_as_dict = {
+            "type": record_type,
+            "hash": record.block_hash,
+            "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime)
+            else from_epoch_nanoseconds(timestamp).isoformat() + "Z"
+        }
+        if record_type == "put":
+            json_as_dict["size"] = record.block_size
+        return json_as_dict
 
 
 class RecordJSONDecoder(JSONDecoder):
@@ -23,18 +68,142 @@ class RecordJSONDecoder(JSONDecoder):
         "put": CacheMissRecord,
         "delete": CacheDeleteRecord
     }
+    _record_type_events = {
+        "get": HIT_EVENT,
+        "put": MISS_EVENT,
+        "delete": DELETE_EVENT
+    }
+
+    def __init__(self, *args, epoch_nanoseconds: bool=False, **kwargs):
+        """
+        Constructor.
+        :param args: see `JSONDecoder.__init__`
+        :param epoch_nanoseconds: whether record timestamps should be decoded to integer nanoseconds since
+        the epoch, rather than to `datetime` objects
+        :param kwargs: see `JSONDecoder.__init__`
+        """
+        super().__init__(*args, **kwargs)
+        self._timestamp_parser = TimestampParser(epoch_nanoseconds)
 
     def decode(self, record_as_string, *kwargs):
         json_as_dict = json.loads(record_as_string)
         return self.decode_parsed(json_as_dict)
 
+    def decode_lines(self, lines: Iterable[str]) -> Iterator[Record]:
+        """
+        Decodes newline-delimited JSON, where each line holds a single record. Records are yielded as
+        soon as their line has been read so the input never has to be held in memory in full.
+        :param lines: the lines to decode (e.g. an open file). Blank lines are ignored
+        :return: an iterator of the decoded records
+        """
+        for line in lines:
+            line = line.strip()
+            if len(line) > 0:
+                yield self.decode_parsed(json.loads(line))
+
     def decode_parsed(self, json_as_dict):
-        if isinstance(json_as_dict, List):
-            return [self.decode_parsed(x) for x in json_as_dict]
+        if isinstance(json_as_dict, list):
+            # Timestamps are parsed before records are created, so that the time of each can be instrumented
+            with stage("parse timestamps") as timestamps_stage:
+                parse = self._timestamp_parser.parse
+                timestamps = [parse(record_as_dict["timestamp"]) for record_as_dict in json_as_dict]
+                timestamps_stage.add_items(len(timestamps))
+            with stage("create records") as records_stage:
+                create_record = self._create_record
+                records = [create_record(record_as_dict, timestamp)
+                           for record_as_dict, timestamp in zip(json_as_dict, timestamps)]
+                records_stage.add_items(len(records))
+            return records
+        return self._decode_record(json_as_dict)
+
+    def decode_to_collection(self, records_as_json: Union[str, bytes, List[Dict]]) -> ColumnarRecordCollection:
+        """
+        Decodes a list of records into a columnar collection of them, without creating record objects (see
+        `decode_to_columns`).
+        :param records_as_json: the list of records, either as JSON (string or UTF-8 encoded bytes) or as parsed
+        JSON
+        :return: the collection of records. Timestamps of the records that it returns are of the type given by
+        this decoder
+        """
+        if isinstance(records_as_json, bytes):
+            records_as_json = records_as_json.decode("utf-8")
+        if isinstance(records_as_json, str):
+            records_as_json = json.loads(records_as_json)
+        datetime_timestamps = not self._timestamp_parser.epoch_nanoseconds
+        timestamp_timezone = None
+        if datetime_timestamps and len(records_as_json) > 0 \
+                and self._timestamp_parser.parse(records_as_json[0]["timestamp"]).utcoffset() is not None:
+            # As for records added to the collection, time zones are normalised to UTC
+            timestamp_timezone = timezone.utc
+        return ColumnarRecordCollection.from_columns(
+            self.decode_to_columns(records_as_json), datetime_timestamps, timestamp_timezone)
+
+    def decode_to_columns(self, records_as_json: Iterable[Dict]) -> RecordColumns:
+        """
+        Decodes parsed JSON records straight into columns of events, without creating record objects. Timestamps
+        are decoded to nanoseconds since the epoch (see `TimestampParser.parse_all_to_epoch_nanoseconds`).
+        :param records_as_json: the parsed records
+        :return: the events in the records, in chronological order
+        """
+        block_hashes = []   # type: List[str]
+        block_ids = dict()  # type: Dict[str, int]
+        block_id_column, event_type_column, block_size_column = array("q"), array("b"), array("q")
+        timestamps = []     # type: List[str]
+        append_block_id = block_id_column.append
+        append_event_type = event_type_column.append
+        append_timestamp = timestamps.append
+        append_block_size = block_size_column.append
+        event_types = RecordJSONDecoder._record_type_events
+        intern = sys.intern
+
+        with stage("build columns") as columns_stage:
+            for record_as_dict in records_as_json:
+                event_type = event_types[record_as_dict["type"]]
+                block_hash = record_as_dict["hash"]
+                block_id = block_ids.get(block_hash)
+                if block_id is None:
+                    block_id = len(block_hashes)
+                    block_hash = intern(block_hash)
+                    block_ids[block_hash] = block_id
+                    block_hashes.append(block_hash)
+                append_block_id(block_id)
+                append_event_type(event_type)
+                append_timestamp(record_as_dict["timestamp"])
+                append_block_size(record_as_dict["size"] if event_type == MISS_EVENT else NO_BLOCK_SIZE)
+            columns_stage.add_items(len(timestamps))
+
+        # The arrays are viewed rather than copied
+        block_id_column, event_type_column, block_size_column = (
+            np.frombuffer(column, dtype=dtype) if len(column) > 0 else np.empty(0, dtype=dtype)
+            for column, dtype in zip((block_id_column, event_type_column, block_size_column),
+                                     (np.int64, np.int8, np.int64)))
+        # Timestamps are parsed together, as that is much faster than parsing them one by one
+        with stage("parse timestamps") as timestamps_stage:
+            timestamps = self._timestamp_parser.parse_all_to_epoch_nanoseconds(timestamps)
+            timestamps_stage.add_items(len(timestamps))
+        columns = [block_id_column, event_type_column, timestamps, block_size_column]
+        if np.any(timestamps[1:] < timestamps[:-1]):
+            order = np.argsort(timestamps, kind="mergesort")
+            columns = [column[order] for column in columns]
+        return RecordColumns(block_hashes, *columns)
+
+    def _decode_record(self, json_as_dict: Dict) -> Record:
+        """
+        Decodes a single parsed record.
+        :param json_as_dict: the parsed record
+        :return: the record
+        """
+        return self._create_record(json_as_dict, self._timestamp_parser.parse(json_as_dict["timestamp"]))
 
+    def _create_record(self, json_as_dict: Dict, block_timestamp: Timestamp) -> Record:
+        """
+        Creates the record from a single parsed record, with its timestamp already parsed.
+        :param json_as_dict: the parsed record
+        :param block_timestamp: the parsed timestamp of the record
+        :return: the record
+        """
         cls = RecordJSONDecoder._record_type_mapping[json_as_dict["type"]]
         block_hash = json_as_dict["hash"]
-        block_timestamp = dateutil.parser.parse(json_as_dict["timestamp"])
         if cls == CacheMissRecord:
             size = json_as_dict["size"]
             return cls(block_hash, block_timestamp, size)
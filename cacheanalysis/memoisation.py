@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable, Tuple
+from weakref import WeakKeyDictionary
+
+from cacheanalysis.collections import BaseRecordCollection
+
+DEFAULT_MAX_SIZE = 128
+
+# Cache of results for each collection of records, shared by all analyses of the collection
+_caches = WeakKeyDictionary()   # type: WeakKeyDictionary
+
+
+class ResultCache:
+    """
+    Bounded cache of the results of analysing a collection of records. Each result is stored with the version of
+    the collection that it was calculated from, so results are not used once records have been added. When the
+    cache is full, the least recently used result is discarded.
+    """
+    def __init__(self, max_size: int=DEFAULT_MAX_SIZE):
+        """
+        Constructor.
+        :param max_size: the maximum number of results to hold
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()   # type: OrderedDict
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_or_calculate(self, key: Hashable, version: int, calculate: Callable[[], Any]) -> Any:
+        """
+        Gets the result with the given key, calculating it if it is not held for the given version.
+        :param key: the key of the result
+        :param version: the current version of the collection
+        :param calculate: function that calculates the result
+        :return: the result
+        """
+        entry = self._results.get(key)
+        if entry is not None and entry[0] == version:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        result = calculate()
+        self._results[key] = (version, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        """
+        Discards all results.
+        """
+        self._results.clear()
+
+
+def get_result_cache(record_collection: BaseRecordCollection) -> ResultCache:
+    """
+    Gets the cache of the results of analysing the given collection, which is shared by all analyses of it and
+    is discarded with the collection.
+    :param record_collection: the collection of records
+    :return: the cache
+    """
+    cache = _caches.get(record_collection)
+    if cache is None:
+        cache = ResultCache()
+        _caches[record_collection] = cache
+    return cache
+
+
+def memoised(stateful: bool=False) -> Callable[[Callable], Callable]:
+    """
+    Decorator of methods of `Analysis` whose results depend only on the analysed collection of records and the
+    arguments, so that results are shared between calls, and between analyses of the same type of the same
+    collection, until records are added to the collection. Arguments must be hashable; results of calls with
+    unhashable arguments are not memoised.
+    :param stateful: whether the result also depends on the state of the analysis (see `Analysis.memoisation_state`)
+    :return: the decorator
+    """
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(analysis, *args, **kwargs):
+            # Subclasses of an analysis may calculate results differently, so results are only shared between
+            # analyses of the same type
+            key = (type(analysis), method.__qualname__, args, tuple(sorted(kwargs.items())))   # type: Tuple
+            if stateful:
+                key += (analysis.memoisation_state, )
+            try:
+                hash(key)
+            except TypeError:
+                return method(analysis, *args, **kwargs)
+            record_collection = analysis.record_collection
+            return get_result_cache(record_collection).get_or_calculate(
+                key, record_collection.version, lambda: method(analysis, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,129 @@
+import zlib
+from collections import namedtuple
+from typing import Dict, Tuple
+
+import numpy as np
+
+from cacheanalysis.simulation import Accesses
+
+MissRatioCurve = namedtuple("MissRatioCurve", ["capacities", "miss_ratios"])
+MissRatioCurve.__doc__ = """
+Miss ratio of an LRU cache as a function of its capacity. The curve is a step function: `miss_ratios[i]` is the
+miss ratio for capacities from `capacities[i]` up to (but excluding) `capacities[i + 1]`. Below the first capacity,
+every access is a miss.
+"""
+
+# Modulus of the hash used to decide which blocks are sampled
+_SAMPLING_MODULUS = 1 << 24
+
+
+def lru_miss_ratio_curves(accesses: Accesses, sampling_rate: float=1.0) -> Tuple[MissRatioCurve, MissRatioCurve]:
+    """
+    Computes the miss ratio curves of an LRU cache for the given accesses in a single pass, from the stack
+    (reuse) distance of every access: the number (or total size) of distinct other blocks accessed since the
+    block was last accessed. Distances are counted with a Fenwick tree that marks the position of the last
+    access to each block, giving O(N log N) time for N accesses.
+
+    For very large numbers of accesses, a spatially hashed sample of the blocks can be used instead (as in SHARDS,
+    Waldspurger et al.): only accesses to sampled blocks are processed and their distances are scaled up by the
+    inverse of the sampling rate.
+    :param accesses: the accesses, in chronological order
+    :param sampling_rate: the proportion of blocks to sample, in (0, 1]
+    :return: a tuple containing the curve of the proportion of accesses that miss against capacity in blocks,
+    and the curve of the proportion of bytes that miss against capacity in bytes
+    """
+    if not 0 < sampling_rate <= 1:
+        raise ValueError("Sampling rate must be in (0, 1]: %s" % sampling_rate)
+    block_ids = accesses.block_ids
+    block_sizes = accesses.block_sizes
+    if sampling_rate < 1:
+        sampled_blocks = np.array(
+            [zlib.crc32(block_hash.encode()) % _SAMPLING_MODULUS < sampling_rate * _SAMPLING_MODULUS
+             for block_hash in accesses.block_hashes], dtype=bool)
+        sampled = sampled_blocks[block_ids] if len(block_ids) > 0 else np.zeros(0, dtype=bool)
+        block_ids = block_ids[sampled]
+        block_sizes = block_sizes[sampled]
+
+    object_distances, byte_distances = _calculate_stack_distances(block_ids.tolist(), block_sizes.tolist())
+    # Distances of sampled accesses stand for those of 1 / sampling rate times as many blocks
+    object_curve = _to_miss_ratio_curve((object_distances + 1) / sampling_rate, np.ones(len(block_ids)))
+    byte_curve = _to_miss_ratio_curve((byte_distances + block_sizes) / sampling_rate, block_sizes)
+    return object_curve, byte_curve
+
+
+def miss_ratio_at(curve: MissRatioCurve, capacity: float) -> float:
+    """
+    Gets the miss ratio of the given curve at the given capacity.
+    :param curve: the miss ratio curve
+    :param capacity: the capacity of the cache
+    :return: the miss ratio
+    """
+    index = int(np.searchsorted(curve.capacities, capacity, side="right"))
+    return 1.0 if index == 0 else float(curve.miss_ratios[index - 1])
+
+
+def _calculate_stack_distances(block_ids: list, block_sizes: list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the number and total size of distinct other blocks accessed between each access and the previous
+    access to the same block. Accesses to blocks that have not been accessed before have infinite distances.
+    :param block_ids: the id of the block of each access
+    :param block_sizes: the size of the block of each access
+    :return: tuple of the number and total size of the other blocks, for each access
+    """
+    number_of_accesses = len(block_ids)
+    # Fenwick trees (1-indexed) of how many blocks, and how many bytes, were last accessed at each position
+    counts = [0] * (number_of_accesses + 1)
+    sizes = [0] * (number_of_accesses + 1)
+    object_distances = np.full(number_of_accesses, np.inf)
+    byte_distances = np.full(number_of_accesses, np.inf)
+    last_accesses = dict()  # type: Dict[int, Tuple[int, int]]
+    accessed_blocks = 0
+    accessed_bytes = 0
+
+    for position, (block_id, size) in enumerate(zip(block_ids, block_sizes), 1):
+        last_access = last_accesses.get(block_id)
+        if last_access is None:
+            accessed_blocks += 1
+        else:
+            last_position, last_size = last_access
+            # Blocks last accessed after the previous access to this block are those not in the prefix up to it
+            blocks_before = 0
+            bytes_before = 0
+            i = last_position
+            while i > 0:
+                blocks_before += counts[i]
+                bytes_before += sizes[i]
+                i &= i - 1
+            object_distances[position - 1] = accessed_blocks - blocks_before
+            byte_distances[position - 1] = accessed_bytes - bytes_before
+            i = last_position
+            while i <= number_of_accesses:
+                counts[i] -= 1
+                sizes[i] -= last_size
+                i += i & -i
+            accessed_bytes -= last_size
+        last_accesses[block_id] = (position, size)
+        accessed_bytes += size
+        i = position
+        while i <= number_of_accesses:
+            counts[i] += 1
+            sizes[i] += size
+            i += i & -i
+    return object_distances, byte_distances
+
+
+def _to_miss_ratio_curve(required_capacities: np.ndarray, weights: np.ndarray) -> MissRatioCurve:
+    """
+    Converts the capacity required for each access to hit into a miss ratio curve.
+    :param required_capacities: the smallest capacity at which each access is a hit (infinite for cold misses)
+    :param weights: the weight of each access
+    :return: the miss ratio curve
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    total = weights.sum()
+    finite = np.isfinite(required_capacities)
+    capacities, inverse = np.unique(required_capacities[finite], return_inverse=True)
+    if total == 0:
+        return MissRatioCurve(capacities, np.zeros(len(capacities)))
+    hits = np.cumsum(np.bincount(inverse, weights=weights[finite], minlength=len(capacities)))
+    return MissRatioCurve(capacities, 1 - hits / total)
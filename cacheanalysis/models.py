@@ -1,34 +1,65 @@
+import sys
 from abc import ABCMeta
 from datetime import datetime
-from typing import List
+from typing import List, Union, Tuple
 
 
 class Record(metaclass=ABCMeta):
     """
-    Record of an event involving a block.
+    Record of an event involving a block. Records are immutable and are equal to other records of the same type
+    that describe the same event.
+
+    Block hashes are interned so that records of events involving the same block share a single string.
     """
-    def __init__(self, block_hash: str, timestamp: datetime):
+    __slots__ = ("block_hash", "timestamp")
+
+    def __init__(self, block_hash: str, timestamp: Union[datetime, int]):
         """
         Constructor.
         :param block_hash: the block involved in the event
-        :param timestamp: the time the event occurred
+        :param timestamp: the time the event occurred, either as a `datetime` or as integer nanoseconds
+        since the epoch
+        """
+        object.__setattr__(self, "block_hash", sys.intern(block_hash))
+        object.__setattr__(self, "timestamp", timestamp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Records are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Records are immutable")
+
+    def __eq__(self, other) -> bool:
+        return type(other) == type(self) and other._get_values() == self._get_values()
+
+    def __hash__(self) -> int:
+        return hash(self._get_values())
+
+    def __repr__(self) -> str:
+        return "%s(%s)" % (type(self).__name__, ", ".join(repr(value) for value in self._get_values()))
+
+    def _get_values(self) -> Tuple:
         """
-        self.block_hash = block_hash
-        self.timestamp = timestamp
+        Gets the values that describe the event, in the order in which they are given to the constructor.
+        :return: the values
+        """
+        return self.block_hash, self.timestamp
 
 
 class CacheHitRecord(Record):
     """
     Record of a cache hit.
     """
-    pass
+    __slots__ = ()
 
 
 class CacheMissRecord(Record):
     """
     Record of a cache miss.
     """
-    def __init__(self, block_hash: str, timestamp: datetime, block_size: int):
+    __slots__ = ("block_size", )
+
+    def __init__(self, block_hash: str, timestamp: Union[datetime, int], block_size: int):
         """
         Constructor.
         :param block_hash: see `Record.__init__`
@@ -36,25 +67,49 @@ class CacheMissRecord(Record):
         :param block_size: the size of the missed block
         """
         super().__init__(block_hash, timestamp)
-        self.block_size = block_size
+        object.__setattr__(self, "block_size", block_size)
+
+    def _get_values(self) -> Tuple:
+        return self.block_hash, self.timestamp, self.block_size
 
 
 class CacheDeleteRecord(Record):
     """
     Record of the deletion of a block from a cache.
     """
-    pass
+    __slots__ = ()
 
 
 class BlockFile:
     """
-    Model of a named file comprised of a list of blocks.
+    Model of a named file comprised of a list of blocks. Block files are immutable and are equal to other block
+    files with the same name and blocks.
     """
+    __slots__ = ("name", "block_hashes", "_hash")
+
     def __init__(self, name: str, block_hashes: List[str]):
         """
         Constructor.
         :param name: the name of the file
         :param block_hashes: the blocks that constitute the file
         """
-        self.name = name
-        self.block_hashes = block_hashes
+        block_hashes = tuple(sys.intern(block_hash) for block_hash in block_hashes)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "block_hashes", block_hashes)
+        object.__setattr__(self, "_hash", hash((name, block_hashes)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Block files are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Block files are immutable")
+
+    def __eq__(self, other) -> bool:
+        return type(other) == type(self) and other._hash == self._hash and other.name == self.name \
+               and other.block_hashes == self.block_hashes
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return "%s(%r, %r)" % (type(self).__name__, self.name, list(self.block_hashes))
@@ -0,0 +1,352 @@
+"""
+Analysis of many traces at once, each tagged with the source that it came from (e.g. the cache node or the run of an
+experiment that recorded it).
+
+The events of each trace are already in chronological order, so traces are merged by timestamp without sorting all of
+their events again. Statistics are compared between sources using a compact summary of each trace (the number of
+events involving each block), which can be calculated for every trace in parallel and combined without going back to
+the events.
+
+Usage: python -m cacheanalysis.multi_trace SOURCE=PATH [SOURCE=PATH ...] [--compare SOURCE SOURCE] [--top N]
+[--processes N]
+(each path is a trace file, see `cacheanalysis.trace_files`)
+"""
+import argparse
+import heapq
+from collections import OrderedDict, namedtuple
+from itertools import repeat
+from multiprocessing import Pool, cpu_count
+from typing import Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+from tabulate import tabulate
+
+from cacheanalysis.collections import BaseRecordCollection, ColumnarRecordCollection, RecordColumns, BlockEventCounts, \
+    HIT_EVENT, MISS_EVENT, DELETE_EVENT
+from cacheanalysis.models import Record
+from cacheanalysis.timestamps import to_epoch_nanoseconds
+from cacheanalysis.trace_files import load_trace, get_timestamp_type
+
+# A trace: either a collection of records or the path of a trace file
+Source = Union[str, BaseRecordCollection]
+
+MergedTrace = namedtuple("MergedTrace", ["record_collection", "sources", "source_ids"])
+MergedTrace.__doc__ = """
+Records of many traces merged in chronological order. `source_ids` holds the index in `sources` of the source of
+each event in the columns of `record_collection`.
+"""
+TraceSummary = namedtuple("TraceSummary", ["event_counts", "start", "end"])
+TraceSummary.__doc__ = """
+Summary of a trace: the number of events involving each block (as `BlockEventCounts`) and the timestamps (nanoseconds
+since the epoch) of its first and last events, which are `None` if the trace is empty.
+"""
+HitRatioComparison = namedtuple("HitRatioComparison", ["block_hashes", "hit_ratios_a", "hit_ratios_b", "differences"])
+HitRatioComparison.__doc__ = """
+Hit ratios of every block accessed in either of two traces, held as arrays that are indexed in the same order as
+`block_hashes`. A hit ratio is NaN if the block was not accessed in the trace. `differences` is the hit ratio in the
+second trace minus that in the first.
+"""
+
+
+def load_sources(sources: Mapping[str, Source]) -> Dict[str, BaseRecordCollection]:
+    """
+    Loads the records of the given sources, memory-mapping those that are trace files.
+    :param sources: the sources, by tag
+    :return: the records of each source, by tag
+    """
+    return OrderedDict((tag, _get_record_collection(source)) for tag, source in sources.items())
+
+
+def merge_records(record_collections: Mapping[str, BaseRecordCollection]) -> Iterator[Tuple[str, Record]]:
+    """
+    Iterates over the records of the given traces in chronological order, with a k-way merge. Records with the same
+    timestamp are given in the order of their traces.
+    :param record_collections: the records of each trace, by tag
+    :return: an iterator of tuples of the tag of the trace and the record
+    """
+    return heapq.merge(
+        *(zip(repeat(tag), record_collection.get_records_in_time_order())
+          for tag, record_collection in record_collections.items()),
+        key=lambda tagged_record: to_epoch_nanoseconds(tagged_record[1].timestamp))
+
+
+def merge_traces(record_collections: Mapping[str, BaseRecordCollection]) -> MergedTrace:
+    """
+    Merges the records of the given traces into one collection, tagging each event with the trace that it came from.
+    Records with the same timestamp are kept in the order of their traces. The timestamps of the merged records are
+    represented in the same way as those of the first trace that has records.
+    :param record_collections: the records of each trace, by tag
+    :return: the merged records
+    """
+    columns, source_ids = merge_columns([record_collection.columns
+                                         for record_collection in record_collections.values()])
+    timestamp_type = next((get_timestamp_type(record_collection)
+                           for record_collection in record_collections.values() if len(record_collection) > 0),
+                          (False, None))
+    return MergedTrace(ColumnarRecordCollection.from_columns(columns, *timestamp_type),
+                       list(record_collections.keys()), source_ids)
+
+
+def merge_columns(columns_of_traces: Sequence[RecordColumns]) -> Tuple[RecordColumns, np.ndarray]:
+    """
+    Merges the events of the given traces in chronological order. As the events of each trace are already in order,
+    the traces are merged as sorted runs rather than all of their events being sorted. Block ids are renumbered so
+    that blocks in more than one trace have the same id.
+    :param columns_of_traces: the events of each trace
+    :return: tuple of the merged events and the index of the trace of each event
+    """
+    if len(columns_of_traces) == 0:
+        return ColumnarRecordCollection().columns, np.empty(0, dtype=np.int32)
+    block_hashes, block_id_maps = _unite_block_hashes([columns.block_hashes for columns in columns_of_traces])
+    order = _merge_order([columns.timestamps for columns in columns_of_traces])
+    merged = RecordColumns(
+        block_hashes,
+        np.concatenate([block_id_map[columns.block_ids]
+                        for block_id_map, columns in zip(block_id_maps, columns_of_traces)])[order],
+        *(np.concatenate([getattr(columns, name) for columns in columns_of_traces])[order]
+          for name in ("event_types", "timestamps", "block_sizes"))
+    )
+    source_ids = np.repeat(np.arange(len(columns_of_traces), dtype=np.int32),
+                           [len(columns.block_ids) for columns in columns_of_traces])[order]
+    return merged, source_ids
+
+
+def summarise_trace(record_collection: BaseRecordCollection) -> TraceSummary:
+    """
+    Summarises the given trace.
+    :param record_collection: the records of the trace
+    :return: the summary
+    """
+    timestamps = record_collection.columns.timestamps
+    if len(timestamps) == 0:
+        return TraceSummary(record_collection.get_block_event_counts(), None, None)
+    return TraceSummary(record_collection.get_block_event_counts(), int(timestamps[0]), int(timestamps[-1]))
+
+
+def summarise_traces(sources: Mapping[str, Source], processes: int=None) -> Dict[str, TraceSummary]:
+    """
+    Summarises each of the given traces, across a pool of processes. Only the summaries are sent back from the
+    processes. Trace files are loaded by the processes themselves, so are summarised without their events being
+    copied; the columns of collections of records are sent to the processes.
+    :param sources: the traces, by tag
+    :param processes: the number of processes to use. Defaults to the number of CPUs, or the number of traces if
+    there are fewer
+    :return: the summary of each trace, by tag
+    """
+    arguments = [source if isinstance(source, str) else source.columns for source in sources.values()]
+    processes = min(processes if processes is not None else cpu_count(), len(arguments))
+    if processes <= 1:
+        summaries = [_summarise_source(argument) for argument in arguments]
+    else:
+        with Pool(processes) as pool:
+            summaries = pool.map(_summarise_source, arguments)
+    return OrderedDict(zip(sources.keys(), summaries))
+
+
+def combine_summaries(summaries: Iterable[TraceSummary]) -> TraceSummary:
+    """
+    Combines summaries of traces into the summary of all of their records, as if the traces had been merged.
+    :param summaries: the summaries
+    :return: the combined summary
+    """
+    summaries = list(summaries)
+    block_hashes, block_id_maps = _unite_block_hashes([summary.event_counts.block_hashes for summary in summaries])
+    counts = np.zeros((len(block_hashes), 3), dtype=np.int64)
+    bytes_missed = np.zeros(len(block_hashes), dtype=np.int64)
+    for block_id_map, summary in zip(block_id_maps, summaries):
+        # Each block appears once in a summary, so there are no repeated ids to accumulate
+        counts[block_id_map] += summary.event_counts.counts
+        bytes_missed[block_id_map] += summary.event_counts.bytes_missed
+    starts = [summary.start for summary in summaries if summary.start is not None]
+    ends = [summary.end for summary in summaries if summary.end is not None]
+    return TraceSummary(BlockEventCounts(block_hashes, counts, bytes_missed),
+                        min(starts) if len(starts) > 0 else None, max(ends) if len(ends) > 0 else None)
+
+
+def compare_block_hit_ratios(summary_a: TraceSummary, summary_b: TraceSummary) -> HitRatioComparison:
+    """
+    Compares the hit ratio (the proportion of accesses that were hits) of every block between two traces.
+    :param summary_a: the summary of the first trace
+    :param summary_b: the summary of the second trace
+    :return: the comparison
+    """
+    block_hashes, block_id_maps = _unite_block_hashes(
+        [summary_a.event_counts.block_hashes, summary_b.event_counts.block_hashes])
+    hit_ratios = []
+    for block_id_map, summary in zip(block_id_maps, (summary_a, summary_b)):
+        block_hit_ratios = np.full(len(block_hashes), np.nan)
+        block_hit_ratios[block_id_map] = _calculate_hit_ratios(summary.event_counts.counts)
+        hit_ratios.append(block_hit_ratios)
+    return HitRatioComparison(block_hashes, hit_ratios[0], hit_ratios[1], hit_ratios[1] - hit_ratios[0])
+
+
+def format_summaries(summaries: Mapping[str, TraceSummary]) -> str:
+    """
+    Formats the given summaries side by side as a table, with a row for each trace and a row for all of them.
+    :param summaries: the summaries, by tag
+    :return: the table
+    """
+    rows = []
+    summaries_with_all = list(summaries.items()) + [("(all)", combine_summaries(summaries.values()))]
+    for tag, summary in summaries_with_all:
+        counts = summary.event_counts.counts
+        hits, misses, deletes = (int(counts[:, event].sum()) for event in (HIT_EVENT, MISS_EVENT, DELETE_EVENT))
+        rows.append([
+            tag, hits + misses + deletes, len(summary.event_counts.block_hashes), hits, misses, deletes,
+            hits / (hits + misses) if hits + misses > 0 else None, int(summary.event_counts.bytes_missed.sum()),
+            (summary.end - summary.start) / 1e9 if summary.start is not None else None
+        ])
+    return tabulate(rows, headers=("Source", "Records", "Blocks", "Hits", "Misses", "Deletes", "Hit ratio",
+                                   "Bytes missed", "Seconds"), floatfmt=".3f")
+
+
+def _get_record_collection(source: Source) -> BaseRecordCollection:
+    """
+    Gets the records of the given source.
+    :param source: the source
+    :return: the records
+    """
+    return load_trace(source).record_collection if isinstance(source, str) else source
+
+
+def _summarise_source(source: Union[str, RecordColumns]) -> TraceSummary:
+    """
+    Summarises a trace in a worker process.
+    :param source: the path of a trace file or the columns of the records of the trace
+    :return: the summary
+    """
+    if isinstance(source, str):
+        return summarise_trace(load_trace(source).record_collection)
+    return summarise_trace(ColumnarRecordCollection.from_columns(source))
+
+
+def _unite_block_hashes(block_hashes_of_traces: Sequence[Sequence[str]]) -> Tuple[List[str], List[np.ndarray]]:
+    """
+    Gives every block in the given traces an id, in order of first appearance.
+    :param block_hashes_of_traces: the block hashes of each trace, indexed by block id in that trace
+    :return: tuple of the hashes of all blocks, indexed by id, and, for each trace, an array mapping its block ids
+    to those of all blocks
+    """
+    block_hashes = []   # type: List[str]
+    block_ids = dict()  # type: Dict[str, int]
+    block_id_maps = []
+    for trace_block_hashes in block_hashes_of_traces:
+        block_id_map = np.empty(len(trace_block_hashes), dtype=np.int64)
+        for i, block_hash in enumerate(trace_block_hashes):
+            block_id = block_ids.get(block_hash)
+            if block_id is None:
+                block_id = len(block_hashes)
+                block_ids[block_hash] = block_id
+                block_hashes.append(block_hash)
+            block_id_map[i] = block_id
+        block_id_maps.append(block_id_map)
+    return block_hashes, block_id_maps
+
+
+def _merge_order(timestamps_of_traces: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Gets the chronological order of the events of the given traces, each of which is in chronological order. The
+    traces are merged in pairs, as a balanced tree of merges, so each event is moved O(log k) times for k traces.
+    Events with the same timestamp are kept in the order of their traces.
+    :param timestamps_of_traces: the timestamps of the events of each trace
+    :return: the indexes of the events in the concatenation of the traces, in chronological order
+    """
+    runs = []   # type: List[Tuple[np.ndarray, np.ndarray]]
+    offset = 0
+    for timestamps in timestamps_of_traces:
+        runs.append((np.asarray(timestamps, dtype=np.int64), np.arange(offset, offset + len(timestamps))))
+        offset += len(timestamps)
+    if len(runs) == 0:
+        return np.empty(0, dtype=np.int64)
+    while len(runs) > 1:
+        merged_runs = [_merge_runs(runs[i], runs[i + 1]) for i in range(0, len(runs) - 1, 2)]
+        if len(runs) % 2 == 1:
+            merged_runs.append(runs[-1])
+        runs = merged_runs
+    return runs[0][1]
+
+
+def _merge_runs(earlier: Tuple[np.ndarray, np.ndarray], later: Tuple[np.ndarray, np.ndarray]) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges two runs of events in chronological order. Each event's position in the merged run is its position in
+    its own run plus the number of events of the other run that precede it, which is found by binary search.
+    :param earlier: the timestamps and indexes of the events of one run, whose events go before those of the other
+    at the same time
+    :param later: the timestamps and indexes of the events of the other run
+    :return: the timestamps and indexes of the merged events
+    """
+    earlier_timestamps, earlier_indexes = earlier
+    later_timestamps, later_indexes = later
+    earlier_positions = np.arange(len(earlier_timestamps)) \
+        + np.searchsorted(later_timestamps, earlier_timestamps, side="left")
+    later_positions = np.arange(len(later_timestamps)) \
+        + np.searchsorted(earlier_timestamps, later_timestamps, side="right")
+    size = len(earlier_timestamps) + len(later_timestamps)
+    timestamps = np.empty(size, dtype=np.int64)
+    indexes = np.empty(size, dtype=np.int64)
+    timestamps[earlier_positions] = earlier_timestamps
+    timestamps[later_positions] = later_timestamps
+    indexes[earlier_positions] = earlier_indexes
+    indexes[later_positions] = later_indexes
+    return timestamps, indexes
+
+
+def _calculate_hit_ratios(counts: np.ndarray) -> np.ndarray:
+    """
+    Calculates the proportion of accesses to each block that were hits.
+    :param counts: the event counts of each block (see `BlockEventCounts`)
+    :return: the hit ratio of each block, or NaN if it was not accessed
+    """
+    hits = counts[:, HIT_EVENT]
+    accesses = hits + counts[:, MISS_EVENT]
+    return np.divide(hits, accesses, out=np.full(len(hits), np.nan), where=accesses > 0)
+
+
+def _parse_arguments(argv):
+    """
+    Parses the command line arguments.
+    :param argv: the arguments to parse
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Compares the statistics of traces from many sources")
+    parser.add_argument("sources", metavar="SOURCE=PATH", nargs="+",
+                        help="tag of a source (e.g. a cache node or a run) and the path of its trace file")
+    parser.add_argument("--compare", metavar="SOURCE", nargs=2,
+                        help="compare the hit ratio of each block between two sources")
+    parser.add_argument("--top", metavar="N", type=int, default=10,
+                        help="number of blocks with the largest differences in hit ratio to list (default: 10)")
+    parser.add_argument("--processes", metavar="N", type=int, help="number of processes to summarise traces with")
+    arguments = parser.parse_args(argv)
+    sources = OrderedDict()
+    for source in arguments.sources:
+        tag, separator, path = source.partition("=")
+        if separator == "" or tag == "" or path == "":
+            parser.error("Sources must be given as SOURCE=PATH: %s" % source)
+        sources[tag] = path
+    if arguments.compare is not None:
+        for tag in arguments.compare:
+            if tag not in sources:
+                parser.error("Unknown source to compare: %s" % tag)
+    arguments.sources = sources
+    return arguments
+
+
+def main(argv: List[str]=None):
+    arguments = _parse_arguments(argv)
+    summaries = summarise_traces(arguments.sources, arguments.processes)
+    print(format_summaries(summaries))
+    if arguments.compare is not None:
+        tag_a, tag_b = arguments.compare
+        comparison = compare_block_hit_ratios(summaries[tag_a], summaries[tag_b])
+        in_both = np.flatnonzero(~np.isnan(comparison.differences))
+        largest = in_both[np.argsort(-np.abs(comparison.differences[in_both]), kind="mergesort")[:arguments.top]]
+        print("%d blocks accessed in both %s and %s" % (len(in_both), tag_a, tag_b))
+        print(tabulate([[comparison.block_hashes[i], comparison.hit_ratios_a[i], comparison.hit_ratios_b[i],
+                         comparison.differences[i]] for i in largest],
+                       headers=("Block", "Hit ratio (%s)" % tag_a, "Hit ratio (%s)" % tag_b, "Difference"),
+                       floatfmt=".3f"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from cacheanalysis.collections import BaseRecordCollection
+from cacheanalysis.models import Record, CacheHitRecord, CacheMissRecord, CacheDeleteRecord, BlockFile
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis, \
+    BlockStatistics
+
+
+class _BlockCounters:
+    """
+    Running counts of the events involving a block.
+    """
+    __slots__ = ("hits", "misses", "deletes", "bytes_missed", "other_block_misses", "misses_when_deleted")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.deletes = 0
+        self.bytes_missed = 0
+        # Total number of other block misses whilst the block was deleted, excluding the time since it was last
+        # deleted if it has not yet been reloaded
+        self.other_block_misses = 0
+        # Total number of misses when the block was last deleted, or `None` if it has since been reloaded
+        self.misses_when_deleted = None     # type: Optional[int]
+
+
+class OnlineStatisticalBlockAnalysis(StatisticalBlockAnalysis):
+    """
+    Statistical analysis of blocks that are put into a cache, which keeps running totals that are updated in
+    constant time as each record is added, so that queries can be answered at any time without re-analysing the
+    records.
+
+    Records should be added through `add_record` and are assumed to be added in chronological order. If records
+    are added to the collection directly, the totals are recalculated from the collection when next queried.
+    """
+    def __init__(self, record_collection: BaseRecordCollection):
+        """
+        Constructor.
+        :param record_collection: see `Analysis.__init__`. Records already in the collection are included
+        """
+        super().__init__(record_collection)
+        self._reset_counters()
+
+    def add_record(self, record: Record):
+        """
+        Adds a record to the collection that is being analysed and updates the running totals with it.
+        :param record: the record, which should not have occurred before any of the records already added
+        """
+        self._update_counters()
+        self.record_collection.add_record(record)
+        self._count(record)
+        self._counted_version = self.record_collection.version
+
+    def total_block_misses(self, block_hash: str) -> int:
+        counters = self._get_block_counters(block_hash)
+        return 0 if counters is None else counters.misses
+
+    def total_block_hits(self, block_hash: str) -> int:
+        counters = self._get_block_counters(block_hash)
+        return 0 if counters is None else counters.hits
+
+    def mean_block_hits(self, block_hash: str) -> Optional[float]:
+        counters = self._get_block_counters(block_hash)
+        if counters is None or counters.misses == 0:
+            return None
+        return counters.hits / counters.misses
+
+    def mean_other_block_misses_between_reload(self, block_hash: str) -> Optional[float]:
+        counters = self._get_block_counters(block_hash)
+        if counters is None or counters.misses < 2 or counters.deletes == 0:
+            return None
+        return self._get_other_block_misses(counters) / counters.deletes
+
+    def _calculate_block_statistics(self) -> BlockStatistics:
+        self._update_counters()
+        block_hashes = list(self._block_counters.keys())
+        counters = self._block_counters.values()
+        hits = np.fromiter((block_counters.hits for block_counters in counters), np.int64, len(block_hashes))
+        misses = np.fromiter((block_counters.misses for block_counters in counters), np.int64, len(block_hashes))
+        deletes = np.fromiter((block_counters.deletes for block_counters in counters), np.int64, len(block_hashes))
+        bytes_missed = np.fromiter((block_counters.bytes_missed for block_counters in counters), np.int64,
+                                   len(block_hashes))
+        mean_hits = np.divide(hits, misses, out=np.full(len(hits), np.nan), where=misses > 0)
+        block_indexes = {block_hash: i for i, block_hash in enumerate(block_hashes)}
+        return BlockStatistics(block_hashes, block_indexes, hits, misses, deletes, mean_hits, bytes_missed)
+
+    def _calculate_mean_other_block_misses_between_reload(self) -> Dict[str, float]:
+        self._update_counters()
+        return {block_hash: self._get_other_block_misses(counters) / counters.deletes
+                for block_hash, counters in self._block_counters.items()
+                if counters.misses >= 2 and counters.deletes > 0}
+
+    def _count(self, record: Record):
+        """
+        Updates the running totals with the given record.
+        :param record: the record
+        """
+        counters = self._block_counters.get(record.block_hash)
+        if counters is None:
+            counters = _BlockCounters()
+            self._block_counters[record.block_hash] = counters
+        record_type = type(record)
+        if record_type == CacheHitRecord:
+            counters.hits += 1
+        elif record_type == CacheMissRecord:
+            if counters.misses_when_deleted is not None:
+                counters.other_block_misses += self._total_misses - counters.misses_when_deleted
+                counters.misses_when_deleted = None
+            counters.misses += 1
+            counters.bytes_missed += record.block_size
+            self._total_misses += 1
+        elif record_type == CacheDeleteRecord:
+            # Only the most recent delete is counted from if a block is deleted again before reloading
+            if counters.misses_when_deleted is not None:
+                counters.other_block_misses += self._total_misses - counters.misses_when_deleted
+            counters.misses_when_deleted = self._total_misses
+            counters.deletes += 1
+
+    def _get_other_block_misses(self, counters: _BlockCounters) -> int:
+        """
+        Gets the total number of other block misses whilst the block with the given counters was deleted, counting
+        those since it was last deleted if it has not yet been reloaded.
+        :param counters: the counters of the block
+        :return: the number of other block misses
+        """
+        if counters.misses_when_deleted is None:
+            return counters.other_block_misses
+        return counters.other_block_misses + self._total_misses - counters.misses_when_deleted
+
+    def _get_block_counters(self, block_hash: str) -> Optional[_BlockCounters]:
+        """
+        Gets the running totals of the given block.
+        :param block_hash: the block hash
+        :return: the totals, or `None` if there are no records of the block
+        """
+        self._update_counters()
+        return self._block_counters.get(block_hash)
+
+    def _update_counters(self):
+        """
+        Recalculates the running totals if records have been added to the collection other than through
+        `add_record`.
+        """
+        if self._counted_version != self.record_collection.version:
+            self._reset_counters()
+
+    def _reset_counters(self):
+        """
+        Calculates the running totals from the records in the collection.
+        """
+        self._block_counters = dict()   # type: Dict[str, _BlockCounters]
+        self._total_misses = 0
+        for record in self.record_collection.get_records_in_time_order():
+            self._count(record)
+        self._counted_version = self.record_collection.version
+
+
+class OnlineStatisticalBlockFileAnalysis(OnlineStatisticalBlockAnalysis, StatisticalBlockFileAnalysis):
+    """
+    Statistical analysis of block files that are put into a cache, which keeps running totals that are updated in
+    constant time as each record is added (see `OnlineStatisticalBlockAnalysis`). Totals of the hits and misses of
+    blocks in and not in the known files are kept, so proportions of them can be got in constant time.
+    """
+    def register_file(self, file: BlockFile):
+        self._update_counters()
+        # A block may be listed more than once in a file but is only counted once
+        for block_hash in dict.fromkeys(file.block_hashes):
+            if block_hash not in self.file_index:
+                counters = self._block_counters.get(block_hash)
+                if counters is not None:
+                    self._known_hits += counters.hits
+                    self._known_misses += counters.misses
+        super().register_file(file)
+
+    def known_file_block_hit_to_miss_proportion(self) -> float:
+        self._update_counters()
+        return self._known_hits / self._known_misses
+
+    def not_known_file_block_hit_to_miss_proportion(self) -> float:
+        self._update_counters()
+        return (self._total_hits - self._known_hits) / (self._total_misses - self._known_misses)
+
+    def _count(self, record: Record):
+        super()._count(record)
+        record_type = type(record)
+        if record_type == CacheHitRecord:
+            self._total_hits += 1
+            if record.block_hash in self.file_index:
+                self._known_hits += 1
+        elif record_type == CacheMissRecord and record.block_hash in self.file_index:
+            self._known_misses += 1
+
+    def _reset_counters(self):
+        self._total_hits = 0
+        self._known_hits = 0
+        self._known_misses = 0
+        super()._reset_counters()
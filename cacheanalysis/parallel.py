@@ -0,0 +1,176 @@
+import ctypes
+from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cacheanalysis.collections import BaseRecordCollection, RecordColumns, HIT_EVENT, MISS_EVENT, DELETE_EVENT
+from cacheanalysis.memoisation import memoised
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis, \
+    BlockStatistics
+
+# Columns shared with worker processes: (name, ctype, dtype)
+_SHARED_COLUMNS = (
+    ("block_ids", ctypes.c_int64, np.int64),
+    ("event_types", ctypes.c_int8, np.int8),
+    ("block_sizes", ctypes.c_int64, np.int64),
+    ("misses_before", ctypes.c_int64, np.int64),
+    ("shard_events", ctypes.c_int64, np.int64)
+)
+
+# Columns of the records being analysed, set in each worker process
+_worker_columns = None  # type: Optional[Dict[str, np.ndarray]]
+
+ShardStatistics = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def calculate_statistics_in_parallel(columns: RecordColumns, processes: int) \
+        -> Tuple[BlockStatistics, Dict[str, float]]:
+    """
+    Calculates the statistics of all blocks by sharding the blocks by id across a pool of processes, with one
+    shard per process. The event columns are put into shared memory that the processes inherit, rather than being
+    pickled to them, along with the positions of the events grouped by shard so that each process only reads the
+    events of its own shard.
+    :param columns: the columns of the records to analyse
+    :param processes: the number of processes to use
+    :return: tuple of the statistics of all blocks and the mean number of other block misses between reloads for
+    all blocks (see `StatisticalBlockAnalysis.all_mean_other_block_misses_between_reload`)
+    """
+    misses = columns.event_types == MISS_EVENT
+    # Number of misses (of any block) that occurred before each event
+    misses_before = np.cumsum(misses) - misses
+    # Positions of the events of each shard, in chronological order within each shard
+    shards = columns.block_ids % processes
+    shard_events = np.argsort(shards, kind="mergesort")
+    shard_offsets = np.zeros(processes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(shards, minlength=processes), out=shard_offsets[1:])
+    derived_columns = {"misses_before": misses_before, "shard_events": shard_events}
+    shared_columns = []
+    for name, ctype, dtype in _SHARED_COLUMNS:
+        column = derived_columns[name] if name in derived_columns else getattr(columns, name)
+        shared_column = RawArray(ctype, len(column))
+        if len(column) > 0:
+            np.frombuffer(shared_column, dtype=dtype)[:] = column
+        shared_columns.append(shared_column)
+
+    total_misses = int(misses.sum())
+    with Pool(processes, initializer=_initialise_worker, initargs=(shared_columns, )) as pool:
+        shard_statistics = pool.starmap(
+            _calculate_shard_statistics, [(int(shard_offsets[shard]), int(shard_offsets[shard + 1]), total_misses)
+                                          for shard in range(processes)])
+    return _merge_shard_statistics(columns.block_hashes, shard_statistics)
+
+
+def _initialise_worker(shared_columns: List[RawArray]):
+    """
+    Initialises a worker process with views of the shared columns.
+    :param shared_columns: the columns, in the order of `_SHARED_COLUMNS`
+    """
+    global _worker_columns
+    _worker_columns = {name: np.frombuffer(shared_column, dtype=dtype)
+                       for (name, _, dtype), shared_column in zip(_SHARED_COLUMNS, shared_columns)}
+
+
+def _calculate_shard_statistics(start: int, end: int, total_misses: int) -> ShardStatistics:
+    """
+    Calculates the statistics of the blocks in a shard (those with ids congruent to the shard modulo the number of
+    shards) from the columns shared with this worker.
+    :param start: the (inclusive) start of the shard's events in the shared event positions grouped by shard
+    :param end: the (exclusive) end of the shard's events in the shared event positions grouped by shard
+    :param total_misses: the total number of misses in the records
+    :return: tuple of the ids of the blocks in the shard, their event counts (with a column for each event type),
+    the bytes missed and the total number of other block misses between deletion and reload
+    """
+    in_shard = _worker_columns["shard_events"][start:end]
+    # Group the shard's events by block, keeping them in chronological order within each block
+    events = in_shard[np.argsort(_worker_columns["block_ids"][in_shard], kind="mergesort")]
+    block_ids = _worker_columns["block_ids"][events]
+    event_types = _worker_columns["event_types"][events]
+    shard_block_ids, block_indexes = np.unique(block_ids, return_inverse=True)
+    number_of_blocks = len(shard_block_ids)
+
+    counts = np.bincount(block_indexes * 3 + event_types, minlength=number_of_blocks * 3) \
+        .reshape((number_of_blocks, 3))
+    misses = event_types == MISS_EVENT
+    bytes_missed = np.bincount(block_indexes[misses], weights=_worker_columns["block_sizes"][events][misses],
+                               minlength=number_of_blocks).astype(np.int64)
+
+    # A deleted block is out of the cache until its next miss or delete; the number of other block misses in
+    # that time is the difference in the number of misses that occurred before the two
+    loads_and_deletes = event_types != HIT_EVENT
+    block_indexes = block_indexes[loads_and_deletes]
+    event_types = event_types[loads_and_deletes]
+    misses_before = _worker_columns["misses_before"][events][loads_and_deletes]
+    deletes = np.flatnonzero(event_types == DELETE_EVENT)
+    following = deletes + 1
+    has_following = following < len(block_indexes)
+    has_following[has_following] = block_indexes[following[has_following]] == block_indexes[deletes[has_following]]
+    misses_until = np.full(len(deletes), total_misses, dtype=np.int64)
+    misses_until[has_following] = misses_before[following[has_following]]
+    other_block_misses = np.bincount(block_indexes[deletes], weights=misses_until - misses_before[deletes],
+                                     minlength=number_of_blocks).astype(np.int64)
+    return shard_block_ids, counts, bytes_missed, other_block_misses
+
+
+def _merge_shard_statistics(block_hashes: List[str], shard_statistics: List[ShardStatistics]) \
+        -> Tuple[BlockStatistics, Dict[str, float]]:
+    """
+    Merges the statistics of each shard into the statistics of all blocks.
+    :param block_hashes: the hashes of all blocks, indexed by block id
+    :param shard_statistics: the statistics of each shard
+    :return: see `calculate_statistics_in_parallel`
+    """
+    number_of_blocks = len(block_hashes)
+    counts = np.zeros((number_of_blocks, 3), dtype=np.int64)
+    bytes_missed = np.zeros(number_of_blocks, dtype=np.int64)
+    other_block_misses = np.zeros(number_of_blocks, dtype=np.int64)
+    for shard_block_ids, shard_counts, shard_bytes_missed, shard_other_block_misses in shard_statistics:
+        counts[shard_block_ids] = shard_counts
+        bytes_missed[shard_block_ids] = shard_bytes_missed
+        other_block_misses[shard_block_ids] = shard_other_block_misses
+
+    hits, misses, deletes = counts[:, HIT_EVENT], counts[:, MISS_EVENT], counts[:, DELETE_EVENT]
+    mean_hits = np.divide(hits, misses, out=np.full(number_of_blocks, np.nan), where=misses > 0)
+    block_indexes = {block_hash: i for i, block_hash in enumerate(block_hashes)}
+    block_statistics = BlockStatistics(list(block_hashes), block_indexes, hits, misses, deletes, mean_hits,
+                                       bytes_missed)
+    reloaded = np.flatnonzero((misses >= 2) & (deletes > 0))
+    mean_other_block_misses = {block_hashes[i]: int(other_block_misses[i]) / int(deletes[i]) for i in reloaded}
+    return block_statistics, mean_other_block_misses
+
+
+class ParallelStatisticalBlockAnalysis(StatisticalBlockAnalysis):
+    """
+    Statistical analysis of blocks that are put into a cache, with the statistics of all blocks calculated in
+    parallel across a pool of processes.
+    """
+    def __init__(self, record_collection: BaseRecordCollection, processes: int=None):
+        """
+        Constructor.
+        :param record_collection: see `Analysis.__init__`
+        :param processes: the number of processes to use. Defaults to the number of CPUs
+        """
+        super().__init__(record_collection)
+        self.processes = processes if processes is not None else cpu_count()
+
+    def _calculate_block_statistics(self) -> BlockStatistics:
+        return self._get_parallel_statistics()[0]
+
+    def _calculate_mean_other_block_misses_between_reload(self) -> Dict[str, float]:
+        return self._get_parallel_statistics()[1]
+
+    @memoised()
+    def _get_parallel_statistics(self) -> Tuple[BlockStatistics, Dict[str, float]]:
+        """
+        Gets the statistics calculated in parallel, which are memoised until records are added to the collection.
+        :return: see `calculate_statistics_in_parallel`
+        """
+        return calculate_statistics_in_parallel(self.record_collection.columns, self.processes)
+
+
+class ParallelStatisticalBlockFileAnalysis(ParallelStatisticalBlockAnalysis, StatisticalBlockFileAnalysis):
+    """
+    Statistical analysis of block files that are put into a cache, with the statistics of all blocks calculated in
+    parallel across a pool of processes.
+    """
@@ -0,0 +1,276 @@
+"""
+Reconstruction of which blocks were resident in the cache, and how many bytes it held, at every moment of a trace.
+
+A block becomes resident when it is missed (loaded into the cache) and stops being resident when it is deleted
+(evicted). A miss of a block that is already resident (i.e. without a delete since its last miss) replaces it, so
+ends one interval of residency and starts another. Blocks that were resident before the first record (i.e. that are
+hit or deleted before ever being missed) have an unknown size and load time, so are left out.
+"""
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from cacheanalysis.collections import RecordColumns, HIT_EVENT, MISS_EVENT
+from cacheanalysis.timestamps import to_epoch_nanoseconds, Timestamp
+
+# End given to intervals of blocks that are still resident after the last event, when querying
+_END_OF_TIME = np.iinfo(np.int64).max
+
+ResidencyIntervals = namedtuple("ResidencyIntervals", ["block_hashes", "block_ids", "starts", "ends", "closed",
+                                                       "sizes"])
+ResidencyIntervals.__doc__ = """
+Intervals of time during which blocks were resident in the cache, held as parallel arrays sorted by start. Each
+interval is of the block in `block_hashes` with the id in `block_ids`, from its miss at `starts` to its delete (or
+next miss) at `ends`, both in nanoseconds since the epoch, and of the `sizes` (in bytes) given by the miss. Intervals
+that are not `closed` are of blocks still resident after the last event, and end at the time of the last event.
+"""
+
+
+class Occupancy(namedtuple("Occupancy", ["timestamps", "bytes", "blocks"])):
+    """
+    Number of bytes and number of blocks (the size of the working set) resident in the cache over time. Each changes
+    to `bytes` and `blocks` at the time (nanoseconds since the epoch) in `timestamps`, and stays the same until the
+    next change. Nothing is resident before the first.
+    """
+    __slots__ = ()
+
+    def at(self, timestamp: Timestamp) -> Tuple[int, int]:
+        """
+        Gets the occupancy of the cache at the given time (after all events at that time).
+        :param timestamp: the time
+        :return: tuple of the number of bytes and the number of blocks resident
+        """
+        i = int(np.searchsorted(self.timestamps, to_epoch_nanoseconds(timestamp), side="right")) - 1
+        if i < 0:
+            return 0, 0
+        return int(self.bytes[i]), int(self.blocks[i])
+
+    @property
+    def peak_bytes(self) -> int:
+        """
+        Gets the largest number of bytes that were resident in the cache at once.
+        :return: the peak number of bytes
+        """
+        return int(self.bytes.max()) if len(self.bytes) > 0 else 0
+
+
+class _IntervalIndex:
+    """
+    Index of intervals of integer positions, to find those that contain a position.
+
+    The index is an implicit centred interval tree. Each interval is put in the node of the tree with the highest bit
+    in which its first and last positions differ (the level of the node) and the bits above it (the prefix of the
+    node). Every interval in a node contains the centre of the node, so an interval in the node containing a
+    position either starts at or before it (if the position is before the centre) or ends at or after it (if not):
+    the intervals of each node are held sorted by their first and by their last positions, so those containing the
+    position are a prefix of one order. Only one node at each level can contain a position, so a query looks at one
+    node per level (of which there are at most 64), with the arrays of all nodes held together rather than as a tree
+    of objects.
+    """
+    def __init__(self, firsts: np.ndarray, lasts: np.ndarray):
+        """
+        Constructor.
+        :param firsts: the first positions of the intervals, which must not be negative
+        :param lasts: the last positions of the intervals (inclusive), which must not be before the first
+        """
+        # The exponent of a number is its bit length (and is exact for positions well within the precision of floats)
+        levels = np.frexp((firsts ^ lasts).astype(np.float64))[1].astype(np.int64)
+        prefixes = lasts >> levels
+        by_first = np.lexsort((firsts, prefixes, levels))
+        by_last = np.lexsort((-lasts, prefixes, levels))
+        self._intervals_by_first = by_first
+        self._intervals_by_last = by_last
+        self._sorted_firsts = firsts[by_first]
+        self._sorted_negated_lasts = -lasts[by_last]
+
+        # Nodes, in order of level then prefix
+        levels = levels[by_first]
+        prefixes = prefixes[by_first]
+        node_starts = np.flatnonzero(np.append(True, (levels[1:] != levels[:-1]) | (prefixes[1:] != prefixes[:-1]))) \
+            if len(by_first) > 0 else np.empty(0, dtype=np.int64)
+        self._node_offsets = np.append(node_starts, len(by_first))
+        self._node_prefixes = prefixes[node_starts]
+        node_levels = levels[node_starts]
+        self._level_offsets = np.searchsorted(
+            node_levels, np.arange((int(node_levels[-1]) if len(node_levels) > 0 else -1) + 2)).tolist()
+
+    def containing(self, position: int) -> np.ndarray:
+        """
+        Gets the intervals that contain the given position.
+        :param position: the position
+        :return: the indexes of the intervals, in ascending order
+        """
+        found = []
+        for level in range(len(self._level_offsets) - 1):
+            level_start, level_end = self._level_offsets[level], self._level_offsets[level + 1]
+            prefix = position >> level
+            node = level_start + int(np.searchsorted(self._node_prefixes[level_start:level_end], prefix))
+            if node == level_end or self._node_prefixes[node] != prefix:
+                continue
+            start, end = self._node_offsets[node], self._node_offsets[node + 1]
+            if level == 0:
+                # Intervals of a single position
+                found.append(self._intervals_by_first[start:end])
+            elif position < (prefix << level) + (1 << (level - 1)):
+                count = int(np.searchsorted(self._sorted_firsts[start:end], position, side="right"))
+                found.append(self._intervals_by_first[start:start + count])
+            else:
+                count = int(np.searchsorted(self._sorted_negated_lasts[start:end], -position, side="right"))
+                found.append(self._intervals_by_last[start:start + count])
+        return np.sort(np.concatenate(found)) if len(found) > 0 else np.empty(0, dtype=np.int64)
+
+
+class Residency:
+    """
+    Residency of blocks in the cache, with an index of the intervals during which they were resident, which is built
+    when first queried.
+
+    The intervals are indexed by the positions of their events among the events that they were reconstructed from,
+    rather than by time. A time is then in an interval if the last event at or before it is at or after the first
+    event of the interval and before the event that ends it. Intervals that start and end at the same time
+    therefore contain no time.
+    """
+    def __init__(self, intervals: ResidencyIntervals, occupancy: Occupancy, event_timestamps: np.ndarray,
+                 first_events: np.ndarray, last_events: np.ndarray):
+        """
+        Constructor.
+        :param intervals: the intervals during which blocks were resident, sorted by start
+        :param occupancy: the occupancy of the cache over time
+        :param event_timestamps: the timestamps of the events that the intervals were reconstructed from
+        :param first_events: the position of the first event (the miss) of each interval
+        :param last_events: the position of the last event before the end of each interval, or of the last event
+        for intervals that are not closed
+        """
+        self.intervals = intervals
+        self.occupancy = occupancy
+        self._event_timestamps = event_timestamps
+        self._first_events = first_events
+        self._last_events = last_events
+        self._query_ends = np.where(intervals.closed, intervals.ends, _END_OF_TIME)
+        self._index = None  # type: Optional[_IntervalIndex]
+        self._block_ids = None    # type: Optional[dict]
+        self._mean_lifetimes = None     # type: Optional[np.ndarray]
+
+    def intervals_overlapping(self, start: Timestamp, end: Timestamp) -> np.ndarray:
+        """
+        Gets the intervals during which blocks were resident at some point in the given time.
+        :param start: the start of the time (inclusive)
+        :param end: the end of the time (exclusive)
+        :return: the indexes of the intervals, in order of start
+        """
+        start = to_epoch_nanoseconds(start)
+        end = to_epoch_nanoseconds(end)
+        if end <= start:
+            return np.empty(0, dtype=np.int64)
+        # Intervals overlap the time if they contain its start or start within it (which, as the intervals are
+        # sorted by start, is a slice of them)
+        starting_within = np.arange(np.searchsorted(self.intervals.starts, start, side="right"),
+                                    np.searchsorted(self.intervals.starts, end, side="left"))
+        starting_within = starting_within[self._query_ends[starting_within] > self.intervals.starts[starting_within]]
+        last_event = int(np.searchsorted(self._event_timestamps, start, side="right")) - 1
+        if last_event < 0:
+            return starting_within
+        if self._index is None:
+            self._index = _IntervalIndex(self._first_events, self._last_events)
+        return np.concatenate((self._index.containing(last_event), starting_within))
+
+    def resident_at(self, timestamp: Timestamp) -> List[str]:
+        """
+        Gets the blocks that were resident in the cache at the given time (after all events at that time).
+        :param timestamp: the time
+        :return: the hashes of the blocks, in the order that they were loaded
+        """
+        timestamp = to_epoch_nanoseconds(timestamp)
+        block_hashes = self.intervals.block_hashes
+        return [block_hashes[block_id]
+                for block_id in self.intervals.block_ids[self.intervals_overlapping(timestamp, timestamp + 1)]]
+
+    def resident_during(self, start: Timestamp, end: Timestamp) -> List[str]:
+        """
+        Gets the blocks that were resident in the cache at some point in the given time.
+        :param start: the start of the time (inclusive)
+        :param end: the end of the time (exclusive)
+        :return: the hashes of the blocks, in the order that they were first loaded
+        """
+        block_ids = self.intervals.block_ids[self.intervals_overlapping(start, end)]
+        _, first = np.unique(block_ids, return_index=True)
+        return [self.intervals.block_hashes[block_id] for block_id in block_ids[np.sort(first)]]
+
+    def mean_lifetime(self, block_hash: str) -> Optional[float]:
+        """
+        Gets the mean time that the given block was resident for each time that it was loaded, counting only the
+        times that it stopped being resident before the last event. If it never did, `None` is returned.
+        :param block_hash: the block hash
+        :return: the mean lifetime, in nanoseconds
+        """
+        if self._block_ids is None:
+            self._block_ids = {known_block_hash: i
+                               for i, known_block_hash in enumerate(self.intervals.block_hashes)}
+        block_id = self._block_ids.get(block_hash)
+        if block_id is None:
+            return None
+        mean_lifetime = self.mean_lifetimes()[block_id]
+        return None if np.isnan(mean_lifetime) else float(mean_lifetime)
+
+    def mean_lifetimes(self) -> np.ndarray:
+        """
+        Gets the mean lifetime of every block (see `mean_lifetime`).
+        :return: the mean lifetime of each block in nanoseconds, indexed by block id, which is NaN for blocks that
+        never stopped being resident
+        """
+        if self._mean_lifetimes is None:
+            intervals = self.intervals
+            number_of_blocks = len(intervals.block_hashes)
+            closed = intervals.closed
+            lifetimes = np.bincount(intervals.block_ids[closed], weights=(intervals.ends - intervals.starts)[closed],
+                                    minlength=number_of_blocks)
+            counts = np.bincount(intervals.block_ids[closed], minlength=number_of_blocks)
+            self._mean_lifetimes = np.divide(lifetimes, counts, out=np.full(number_of_blocks, np.nan),
+                                             where=counts > 0)
+        return self._mean_lifetimes
+
+
+def reconstruct_residency(columns: RecordColumns) -> Residency:
+    """
+    Reconstructs the residency of blocks in the cache from the given events, in one vectorised sweep over them.
+    :param columns: the columns of events
+    :return: the residency
+    """
+    timestamps = columns.timestamps
+    number_of_events = len(timestamps)
+    # Group the misses and deletes by block, keeping them in chronological order within each block, so that the
+    # event following a miss of a block (if any) is the one that ends its residency
+    loads_and_deletes = np.flatnonzero(columns.event_types != HIT_EVENT)
+    events = loads_and_deletes[np.argsort(columns.block_ids[loads_and_deletes], kind="mergesort")]
+    block_ids = columns.block_ids[events]
+    has_following = np.zeros(len(events), dtype=bool)
+    has_following[:-1] = block_ids[1:] == block_ids[:-1]
+    misses = np.flatnonzero(columns.event_types[events] == MISS_EVENT)
+    # Sort the intervals by the position of the miss that starts them, which is their chronological order
+    misses = misses[np.argsort(events[misses], kind="mergesort")]
+
+    start_events = events[misses]
+    closed = has_following[misses]
+    end_events = np.full(len(misses), number_of_events - 1, dtype=np.int64)
+    end_events[closed] = events[misses[closed] + 1]
+    sizes = columns.block_sizes[start_events].astype(np.int64)
+    intervals = ResidencyIntervals(columns.block_hashes, block_ids[misses].astype(np.int64),
+                                   timestamps[start_events].astype(np.int64),
+                                   timestamps[end_events].astype(np.int64), closed, sizes)
+
+    # Each event starts and ends at most one interval, so the changes in occupancy can be assigned by position
+    byte_changes = np.zeros(number_of_events, dtype=np.int64)
+    block_changes = np.zeros(number_of_events, dtype=np.int64)
+    byte_changes[start_events] += sizes
+    block_changes[start_events] += 1
+    byte_changes[end_events[closed]] -= sizes[closed]
+    block_changes[end_events[closed]] -= 1
+    changes = np.flatnonzero((byte_changes != 0) | (block_changes != 0))
+    # Only the occupancy after the last change at each time is kept
+    changes = changes[np.append(timestamps[changes][1:] != timestamps[changes][:-1], True)] \
+        if len(changes) > 0 else changes
+    occupancy = Occupancy(timestamps[changes].astype(np.int64), np.cumsum(byte_changes)[changes],
+                          np.cumsum(block_changes)[changes])
+    last_events = end_events - closed
+    return Residency(intervals, occupancy, timestamps, start_events, last_events)
@@ -1,27 +1,173 @@
+import argparse
 import json
 import sys
 
-from cacheanalysis.collections import RecordCollection
+from cacheanalysis.access_patterns import AccessPatterns
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection
+from cacheanalysis.instrumentation import instrumentation, stage, PROFILE_ALL
 from cacheanalysis.json_converters import RecordJSONDecoder, \
     BlockFileJSONDecoder
+from cacheanalysis.sketches import BlockSketches
+from cacheanalysis.trace_files import load_trace
 
 # PYTHONPATH=cache-usage-simulator/ python3 cache-usage-simulator/cacheusagesimulator/run_as_service.py
 # PYTHONPATH=keep-cache-testing/ python2 keep-cache-testing/keepcachetest/run.py | PYTHONPATH=cache-analysis/ python3 cache-analysis/cacheanalysis/run_with_data.py
+# Streaming (one record per line, references in a separate JSON file):
+# ... | PYTHONPATH=cache-analysis/ python3 cache-analysis/cacheanalysis/run_with_data.py --stream --references references.json
+# From a binary trace file (see `cacheanalysis.trace_files`):
+# PYTHONPATH=cache-analysis/ python3 cache-analysis/cacheanalysis/run_with_data.py --trace data.trace
 from cacheanalysis.visual_analysis import VisualBlockFileAnalysis
 
-if __name__ == "__main__":
-    with sys.stdin as input:
-        json_as_string = input.read()
 
-    json_as_dict = json.loads(json_as_string)
-    records = RecordJSONDecoder().decode_parsed(json_as_dict["records"])
-    reference_files = BlockFileJSONDecoder().decode_parsed(json_as_dict["references"])
+def _parse_arguments(argv):
+    """
+    Parses the command line arguments.
+    :param argv: the arguments to parse
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Analyses records of how blocks are put into a cache")
+    parser.add_argument("--stream", action="store_true",
+                        help="read records from stdin as newline-delimited JSON (one record per line), "
+                             "adding them to the collection as they arrive")
+    parser.add_argument("--references", metavar="PATH",
+                        help="JSON file containing the list of reference files (required with --stream)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="hold records in compact columns rather than as record objects")
+    parser.add_argument("--sketch", action="store_true",
+                        help="summarise the records approximately in constant memory, rather than holding them, "
+                             "and print the summary (requires --stream)")
+    parser.add_argument("--access-patterns", action="store_true",
+                        help="print the sequential scans of reference files, how often blocks are followed by the "
+                             "next block of their files and the blocks most often accessed together")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="load records and reference files from a binary trace file rather than from stdin")
+    parser.add_argument("--output", metavar="PATH",
+                        help="render the visualisation to an image file (e.g. .png or .svg) rather than showing "
+                             "it, so no display is needed")
+    parser.add_argument("--density", action="store_true",
+                        help="show cache misses against cache hits as the density of blocks, which is faster to "
+                             "render for large traces (by default, density is shown if there are many blocks)")
+    parser.add_argument("--report", action="store_true",
+                        help="print a report of the time taken, and memory used, by each stage of the analysis to "
+                             "stderr")
+    parser.add_argument("--report-json", metavar="PATH",
+                        help="write the report of each stage of the analysis (see --report) to a JSON file")
+    parser.add_argument("--profile", metavar="METHOD", nargs="+", default=(),
+                        help="profile the given analysis methods (e.g. block_statistics), or all of them if "
+                             "\"%s\" is given, and include the profile in the report" % PROFILE_ALL)
+    arguments = parser.parse_args(argv)
+    if arguments.stream and arguments.references is None:
+        parser.error("--references is required when using --stream")
+    if arguments.stream and arguments.trace is not None:
+        parser.error("--stream cannot be used with --trace")
+    if arguments.sketch and not arguments.stream:
+        parser.error("--sketch requires --stream")
+    return arguments
+
+
+def main(argv=None):
+    arguments = _parse_arguments(argv)
+    if arguments.report or arguments.report_json is not None or len(arguments.profile) > 0:
+        instrumentation.enable(arguments.profile)
+    try:
+        _analyse(arguments)
+    finally:
+        if instrumentation.enabled:
+            _write_report(arguments)
+
+
+def _analyse(arguments):
+    """
+    Analyses the records as directed by the command line arguments.
+    :param arguments: the parsed arguments
+    """
+    record_collection_type = ColumnarRecordCollection if arguments.columnar else RecordCollection
+
+    if arguments.sketch:
+        sketches = BlockSketches()
+        access_patterns = AccessPatterns() if arguments.access_patterns else None
+        with open(arguments.references, "r") as references_file:
+            for file in BlockFileJSONDecoder().decode_parsed(json.load(references_file)):
+                sketches.register_file(file)
+                if access_patterns is not None:
+                    access_patterns.register_file(file)
+        with sys.stdin as input, stage("sketch") as sketch_stage:
+            for record in RecordJSONDecoder().decode_lines(input):
+                sketches.add_record(record)
+                if access_patterns is not None:
+                    access_patterns.add_record(record)
+                sketch_stage.add_items(1)
+        print(sketches.report())
+        if access_patterns is not None:
+            print(access_patterns.report())
+        return
+
+    if arguments.trace is not None:
+        with stage("load trace") as load_stage:
+            record_collection, reference_files = load_trace(arguments.trace)
+            load_stage.add_items(len(record_collection))
+        first_record = next(iter(record_collection))
+    elif arguments.stream:
+        record_collection = record_collection_type()
+        first_record = None
+        with sys.stdin as input, stage("decode and collect") as decode_stage:
+            for record in RecordJSONDecoder().decode_lines(input):
+                if first_record is None:
+                    first_record = record
+                record_collection.add_record(record)
+            decode_stage.add_items(len(record_collection))
+        with open(arguments.references, "r") as references_file:
+            reference_files = BlockFileJSONDecoder().decode_parsed(json.load(references_file))
+    else:
+        with stage("read"):
+            with sys.stdin as input:
+                json_as_string = input.read()
 
-    record_collection = RecordCollection(records)
-    analysis = VisualBlockFileAnalysis(record_collection)
-    for file in reference_files:
-        analysis.register_file(file)
+        with stage("parse JSON") as parse_stage:
+            json_as_dict = json.loads(json_as_string)
+            parse_stage.add_items(len(json_as_dict["records"]))
+        # Decoding reports the time spent parsing timestamps separately from building records or columns
+        if arguments.columnar:
+            # Records are decoded straight into columns, without creating record objects
+            record_collection = RecordJSONDecoder().decode_to_collection(json_as_dict["records"])
+            records = None
+        else:
+            records = RecordJSONDecoder().decode_parsed(json_as_dict["records"])
+        with stage("decode references") as references_stage:
+            reference_files = BlockFileJSONDecoder().decode_parsed(json_as_dict["references"])
+            references_stage.add_items(len(reference_files))
+        if records is not None:
+            first_record = records[0]
+            with stage("collect") as collect_stage:
+                record_collection = RecordCollection(records)
+                collect_stage.add_items(len(records))
+        else:
+            first_record = next(iter(record_collection))
 
-    print(analysis.statistical_analysis.total_block_hits(records[0].block_hash))
+    with stage("register files") as register_stage:
+        analysis = VisualBlockFileAnalysis(record_collection)
+        for file in reference_files:
+            analysis.register_file(file)
+        register_stage.add_items(len(reference_files))
 
-    analysis.visualise()
+    print(analysis.statistical_analysis.total_block_hits(first_record.block_hash))
+    if arguments.access_patterns:
+        print(analysis.statistical_analysis.access_patterns().report())
+
+    analysis.visualise(output_path=arguments.output, density=True if arguments.density else None)
+
+
+def _write_report(arguments):
+    """
+    Writes the report of the instrumented stages of the analysis, as directed by the command line arguments.
+    :param arguments: the parsed arguments
+    """
+    if arguments.report or (arguments.report_json is None and len(arguments.profile) > 0):
+        print(instrumentation.format_report(), file=sys.stderr)
+    if arguments.report_json is not None:
+        with open(arguments.report_json, "w") as file:
+            json.dump(instrumentation.report(), file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
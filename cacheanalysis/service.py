@@ -0,0 +1,585 @@
+"""
+Long-running service that ingests streams of records from many cache nodes concurrently, over TCP or Unix sockets,
+and answers queries about them.
+
+Clients send newline-delimited JSON, where each line is one of:
+- a record, as decoded by `RecordJSONDecoder` (e.g. `{"type": "get", "hash": "...", "timestamp": "..."}`);
+- a block file to register: `{"file": {"name": "...", "block_hashes": ["...", ...]}}`, which is not answered;
+- a query: `{"query": "<name>", "arguments": [...]}`, which is answered with a line holding either
+  `{"result": ...}` or `{"error": "..."}`. The queries are `QUERIES` and "status".
+Lines that cannot be decoded (including malformed block files) are counted and otherwise ignored, so only queries
+are ever answered.
+
+Records are decoded in batches in an executor, off the event loop, then queued to be added to the analysis. The
+queue is bounded, so producers that send records faster than they can be added stop being read from (and so are
+slowed by the transport's flow control) rather than filling memory. Records, files and queries from a connection
+are handled in the order that they were sent, so a query is answered after the records sent before it have been
+merged (see below).
+
+The records of each connection are expected to be in chronological order, but those of different connections
+arrive interleaved however the network delivers them. As the online analysis requires records in chronological
+order, records are held back until every connection that is sending records has sent records at least as late (see
+`RecordMerger`), and queries are answered from the records released so far, so that a query does not release
+records that a slower connection has yet to catch up with. Records that arrive after later ones have been added
+(e.g. from a connection that was idle) are late: they are held and added to the collection together, before the
+next query or when enough of them are held, so that the analysis recalculates its totals in chronological order
+once per batch of late records rather than once per record.
+
+Usage:
+    python -m cacheanalysis.service serve (--tcp HOST:PORT | --unix PATH) [--references PATH]
+    python -m cacheanalysis.service produce (--tcp HOST:PORT | --unix PATH) [--records N]
+"""
+import argparse
+import asyncio
+import heapq
+import json
+from concurrent.futures import Executor
+from itertools import count
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.json_converters import RecordJSONDecoder, RecordJSONEncoder, BlockFileJSONDecoder
+from cacheanalysis.models import Record, BlockFile
+from cacheanalysis.online_analysis import OnlineStatisticalBlockFileAnalysis
+from cacheanalysis.timestamps import to_epoch_nanoseconds
+
+# Queries that can be made of the analysis, which are answered in constant time
+QUERIES = frozenset([
+    "total_block_hits",
+    "total_block_misses",
+    "mean_block_hits",
+    "mean_other_block_misses_between_reload",
+    "known_file_block_hit_to_miss_proportion",
+    "not_known_file_block_hit_to_miss_proportion"
+])
+
+# Maximum number of bytes read from a connection at once
+_READ_SIZE = 64 * 1024
+
+_RECORDS = 0
+_FILE = 1
+_QUERY = 2
+_CLOSED = 3
+
+
+class ServiceError(Exception):
+    """
+    Error returned by the service in answer to a query.
+    """
+
+
+def decode_batch(lines: Sequence[bytes]) -> Tuple[List[Record], int]:
+    """
+    Decodes a batch of lines that each hold a record.
+    :param lines: the lines
+    :return: tuple of the decoded records and the number of lines that could not be decoded
+    """
+    decoder = RecordJSONDecoder()
+    records = []
+    invalid_lines = 0
+    for line in lines:
+        try:
+            records.append(decoder.decode_parsed(json.loads(line.decode("utf-8"))))
+        except (ValueError, KeyError, TypeError):
+            invalid_lines += 1
+    return records, invalid_lines
+
+
+def _parse_message(line: bytes) -> Optional[dict]:
+    """
+    Parses a line that may hold a message other than a record.
+    :param line: the line
+    :return: the message, or `None` if the line does not hold an object
+    """
+    try:
+        message = json.loads(line.decode("utf-8"))
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+class RecordMerger:
+    """
+    Merges streams of records, each in chronological order, from many producers into a single stream in
+    chronological order. Records are held until every producer that has sent records has sent records at least as
+    late (the watermark), or until more than the maximum number of records are held, in which case the earliest are
+    released.
+    """
+    def __init__(self, max_held_records: int=100000):
+        """
+        Constructor.
+        :param max_held_records: the maximum number of records to hold
+        """
+        self.max_held_records = max_held_records
+        self._latest = dict()  # type: Dict[Hashable, int]
+        self._held = []     # type: List[Tuple[int, int, Record]]
+        self._sequence = count()
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def add(self, producer: Hashable, records: Iterable[Record]) -> List[Record]:
+        """
+        Adds records from the given producer.
+        :param producer: the producer
+        :param records: the records, in chronological order
+        :return: the records that are released, in chronological order
+        """
+        latest = self._latest.get(producer)
+        for record in records:
+            timestamp = to_epoch_nanoseconds(record.timestamp)
+            # Records at the same time are released in the order that they were added
+            heapq.heappush(self._held, (timestamp, next(self._sequence), record))
+            if latest is None or timestamp > latest:
+                latest = timestamp
+        if latest is not None:
+            self._latest[producer] = latest
+        return self._release(min(self._latest.values()) if len(self._latest) > 0 else None)
+
+    def remove(self, producer: Hashable) -> List[Record]:
+        """
+        Removes a producer that will send no more records.
+        :param producer: the producer
+        :return: the records that are released, in chronological order
+        """
+        self._latest.pop(producer, None)
+        return self._release(min(self._latest.values()) if len(self._latest) > 0 else None)
+
+    def flush(self) -> List[Record]:
+        """
+        Releases all held records.
+        :return: the records, in chronological order
+        """
+        return self._release(None)
+
+    def _release(self, watermark: Optional[int]) -> List[Record]:
+        """
+        Releases the records at or before the given watermark, and the earliest records beyond the maximum number
+        to hold.
+        :param watermark: the watermark, in nanoseconds since the epoch, or `None` to release all records
+        :return: the records, in chronological order
+        """
+        held = self._held
+        released = []
+        while len(held) > 0 and (watermark is None or held[0][0] <= watermark
+                                 or len(held) > self.max_held_records):
+            released.append(heapq.heappop(held)[2])
+        return released
+
+
+class AnalysisService:
+    """
+    Service that adds the records that clients send to an analysis and answers their queries of it.
+    """
+    def __init__(self, analysis: OnlineStatisticalBlockFileAnalysis=None, batch_size: int=1000,
+                 max_queued_batches: int=64, executor: Executor=None, max_late_records: int=100000):
+        """
+        Constructor.
+        :param analysis: the analysis to add records to, or `None` to analyse a new `RecordCollection`
+        :param batch_size: the maximum number of lines of records to decode at once
+        :param max_queued_batches: the maximum number of decoded batches (and other messages) that can wait to be
+        added to the analysis before connections stop being read from
+        :param executor: the executor to decode records in (see `decode_batch`), or `None` for the event loop's
+        default executor
+        :param max_late_records: the maximum number of late records to hold before adding them to the analysis,
+        which then recalculates its totals
+        """
+        self.analysis = analysis if analysis is not None \
+            else OnlineStatisticalBlockFileAnalysis(RecordCollection())
+        self.batch_size = batch_size
+        self.max_queued_batches = max_queued_batches
+        self.executor = executor
+        self.max_late_records = max_late_records
+        self.records_added = 0
+        self.invalid_lines = 0
+        self.connections = 0
+        self.merger = RecordMerger(batch_size * max_queued_batches)
+        self._latest_added = None   # type: Optional[int]
+        self._late_records = []     # type: List[Record]
+        self._connection_ids = count()
+        self._closed_connections = []   # type: List[int]
+        self._servers = []  # type: List[asyncio.AbstractServer]
+        self._queue = None  # type: Optional[asyncio.Queue]
+        self._consumer = None   # type: Optional[asyncio.Future]
+
+    async def start_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        """
+        Starts accepting connections over TCP.
+        :param host: the host to listen on
+        :param port: the port to listen on, or 0 to use any free port
+        :return: the server
+        """
+        self._start_consumer()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        Starts accepting connections over a Unix socket.
+        :param path: the path of the socket
+        :return: the server
+        """
+        self._start_consumer()
+        server = await asyncio.start_unix_server(self.handle_connection, path)
+        self._servers.append(server)
+        return server
+
+    async def stop(self):
+        """
+        Stops accepting connections and adding records. Records that are queued are not added.
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        if self._consumer is not None:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Handles the lines sent over a connection until it is closed.
+        :param reader: the connection's reader
+        :param writer: the connection's writer
+        """
+        self.connections += 1
+        connection_id = next(self._connection_ids)
+        # Data is read in chunks rather than by line, so that the lines that have arrived are handled together
+        partial_line = b""
+        try:
+            while True:
+                data = await reader.read(_READ_SIZE)
+                if len(data) == 0:
+                    await self._handle_lines(connection_id, [partial_line], writer)
+                    break
+                lines = (partial_line + data).split(b"\n")
+                partial_line = lines.pop()
+                await self._handle_lines(connection_id, lines, writer)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            # The connection no longer holds back the records of others once its queued records have been added.
+            # The queue is not waited on, as a closed connection is not subject to backpressure
+            self._closed_connections.append(connection_id)
+            if self._queue is not None and not self._queue.full():
+                self._queue.put_nowait((_CLOSED, None, None))
+
+    def answer(self, query: str, arguments: Sequence=()) -> Any:
+        """
+        Answers a query of the analysis.
+        :param query: the name of the query (one of `QUERIES`, or "status")
+        :param arguments: the arguments of the query
+        :return: the answer
+        :raises ValueError: if the query is not known
+        """
+        if query == "status":
+            return {"records": self.records_added, "invalid_lines": self.invalid_lines,
+                    "connections": self.connections, "queued": self._queue.qsize(), "held": len(self.merger),
+                    "late": len(self._late_records)}
+        if query not in QUERIES:
+            raise ValueError("Unknown query: %s" % query)
+        return getattr(self.analysis, query)(*arguments)
+
+    async def _handle_lines(self, connection_id: int, lines: Iterable[bytes], writer: asyncio.StreamWriter):
+        """
+        Handles lines sent over a connection, in order.
+        :param connection_id: the id of the connection
+        :param lines: the lines
+        :param writer: the connection's writer, to send responses with
+        """
+        batch = []  # type: List[bytes]
+        for line in lines:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            # Records are by far the most common lines, so they are only parsed when the batch is decoded
+            message = None
+            if b'"query"' in line or b'"file"' in line:
+                message = _parse_message(line)
+            if message is None or "type" in message or ("file" not in message and "query" not in message):
+                # Lines that are neither files nor queries are decoded as records (or counted as invalid)
+                batch.append(line)
+                if len(batch) >= self.batch_size:
+                    await self._put_batch(connection_id, batch)
+                    batch = []
+                continue
+            if len(batch) > 0:
+                await self._put_batch(connection_id, batch)
+                batch = []
+            response = await self._handle_message(message)
+            if response is not None:
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        if len(batch) > 0:
+            await self._put_batch(connection_id, batch)
+
+    async def _handle_message(self, message: dict) -> Optional[dict]:
+        """
+        Handles a message that registers a file or makes a query. Only queries are answered.
+        :param message: the message
+        :return: the response to send, if any
+        """
+        if "file" in message:
+            try:
+                if not isinstance(message["file"], dict):
+                    raise TypeError("Block file is not an object")
+                file = BlockFileJSONDecoder().decode_parsed(message["file"])
+            except (ValueError, KeyError, TypeError):
+                # The client does not wait for a response, so malformed files are counted like invalid records
+                self.invalid_lines += 1
+                return None
+            await self._queue.put((_FILE, file, None))
+            return None
+        try:
+            future = asyncio.get_event_loop().create_future()
+            await self._queue.put((_QUERY, (message["query"], message.get("arguments", [])), future))
+            return {"result": await future}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"error": "%s: %s" % (type(e).__name__, e)}
+
+    async def _put_batch(self, connection_id: int, batch: List[bytes]):
+        """
+        Decodes the given batch of lines of records and queues the records to be added, waiting if the queue is
+        full.
+        :param connection_id: the id of the connection that the lines were sent over
+        :param batch: the lines
+        """
+        records, invalid_lines = await asyncio.get_event_loop().run_in_executor(self.executor, decode_batch, batch)
+        self.invalid_lines += invalid_lines
+        await self._queue.put((_RECORDS, (connection_id, records), None))
+
+    def _start_consumer(self):
+        """
+        Starts adding queued messages to the analysis, if not already started.
+        """
+        if self._consumer is None:
+            # The queue is created here so that it belongs to the running event loop
+            self._queue = asyncio.Queue(self.max_queued_batches)
+            self._consumer = asyncio.ensure_future(self._consume())
+
+    async def _consume(self):
+        """
+        Adds queued records and files to the analysis and answers queued queries, in the order they were queued.
+        Records are merged into chronological order before they are added, and queries are answered from the
+        records released by the merger, including any late records.
+        """
+        while True:
+            message_type, value, future = await self._queue.get()
+            if message_type == _RECORDS:
+                self._add_records(self.merger.add(*value))
+            elif message_type == _CLOSED:
+                pass
+            elif message_type == _FILE:
+                self.analysis.register_file(value)
+            elif not future.cancelled():
+                if value[0] != "status":
+                    self._add_late_records()
+                try:
+                    future.set_result(self.answer(*value))
+                except Exception as e:
+                    future.set_exception(e)
+            # All records of connections that were closed before the queue emptied have been added
+            if self._queue.empty():
+                while len(self._closed_connections) > 0:
+                    self._add_records(self.merger.remove(self._closed_connections.pop()))
+                if self.connections == 0:
+                    self._add_late_records()
+
+    def _add_records(self, records: Iterable[Record]):
+        """
+        Adds records to the analysis. Records that are earlier than those already added are late, so are held to
+        be added together (see `_add_late_records`).
+        :param records: the records, in chronological order
+        """
+        for record in records:
+            timestamp = to_epoch_nanoseconds(record.timestamp)
+            if self._latest_added is not None and timestamp < self._latest_added:
+                self._late_records.append(record)
+            else:
+                self.analysis.add_record(record)
+                self._latest_added = timestamp
+                self.records_added += 1
+        if len(self._late_records) >= self.max_late_records:
+            self._add_late_records()
+
+    def _add_late_records(self):
+        """
+        Adds the held late records to the collection directly, so that the analysis recalculates its totals in
+        chronological order (once, for all of them) when next queried.
+        """
+        for record in self._late_records:
+            self.analysis.record_collection.add_record(record)
+        self.records_added += len(self._late_records)
+        self._late_records.clear()
+
+
+class ServiceClient:
+    """
+    Client of an `AnalysisService`.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Constructor.
+        :param reader: the reader of the connection to the service
+        :param writer: the writer of the connection to the service
+        """
+        self._reader = reader
+        self._writer = writer
+        self._encoder = RecordJSONEncoder()
+
+    @classmethod
+    async def connect_tcp(cls, host: str, port: int) -> "ServiceClient":
+        """
+        Connects to a service over TCP.
+        :param host: the host of the service
+        :param port: the port of the service
+        :return: the client
+        """
+        return cls(*(await asyncio.open_connection(host, port)))
+
+    @classmethod
+    async def connect_unix(cls, path: str) -> "ServiceClient":
+        """
+        Connects to a service over a Unix socket.
+        :param path: the path of the socket
+        :return: the client
+        """
+        return cls(*(await asyncio.open_unix_connection(path)))
+
+    async def send_records(self, records: Iterable[Record]):
+        """
+        Sends records to the service, waiting if the service is not keeping up.
+        :param records: the records
+        """
+        for i, record in enumerate(records, 1):
+            self._writer.write(self._encoder.encode(record).encode("utf-8") + b"\n")
+            # Wait for the service to read what has been sent, if it is behind, every so often
+            if i % 1000 == 0:
+                await self._writer.drain()
+        await self._writer.drain()
+
+    async def register_file(self, file: BlockFile):
+        """
+        Registers a block file with the service.
+        :param file: the block file
+        """
+        self._writer.write(json.dumps({"file": {"name": file.name, "block_hashes": list(file.block_hashes)}})
+                           .encode("utf-8") + b"\n")
+        await self._writer.drain()
+
+    async def query(self, query: str, *arguments) -> Any:
+        """
+        Queries the service, after the records sent before the query have been added.
+        :param query: the name of the query
+        :param arguments: the arguments of the query
+        :return: the answer
+        :raises ServiceError: if the service could not answer the query
+        """
+        self._writer.write(json.dumps({"query": query, "arguments": arguments}).encode("utf-8") + b"\n")
+        await self._writer.drain()
+        response = json.loads((await self._reader.readline()).decode("utf-8"))
+        if "error" in response:
+            raise ServiceError(response["error"])
+        return response["result"]
+
+    def close(self):
+        """
+        Closes the connection to the service.
+        """
+        self._writer.close()
+
+
+async def produce_records(client: ServiceClient, records: Iterable[Record], files: Iterable[BlockFile]=()) -> dict:
+    """
+    Fake producer of records, which sends the given files and records to the service, then gets its status.
+    :param client: the client of the service
+    :param records: the records to send
+    :param files: the block files to register before sending the records
+    :return: the status of the service after the records have been added
+    """
+    for file in files:
+        await client.register_file(file)
+    await client.send_records(records)
+    return await client.query("status")
+
+
+def _parse_arguments(argv):
+    """
+    Parses the command line arguments.
+    :param argv: the arguments to parse
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Service that ingests and analyses streams of records")
+    parser.add_argument("command", choices=("serve", "produce"),
+                        help="run the service, or send a synthetic trace to it as a fake producer")
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--tcp", metavar="HOST:PORT", help="address to listen on or connect to over TCP")
+    address.add_argument("--unix", metavar="PATH", help="path of the Unix socket to listen on or connect to")
+    parser.add_argument("--references", metavar="PATH",
+                        help="JSON file containing the list of reference files to register when serving")
+    parser.add_argument("--records", metavar="N", type=int, default=100000,
+                        help="number of synthetic records to produce")
+    return parser.parse_args(argv)
+
+
+async def _produce(arguments):
+    """
+    Sends a synthetic trace to the service as a fake producer.
+    :param arguments: the parsed command line arguments
+    """
+    # Imported here as only the fake producer needs synthetic traces
+    from cacheanalysis.benchmarks.synthetic_traces import generate_trace
+    from cacheanalysis.collections import ColumnarRecordCollection
+    trace = generate_trace(arguments.records)
+    if arguments.tcp is not None:
+        host, port = arguments.tcp.rsplit(":", 1)
+        client = await ServiceClient.connect_tcp(host, int(port))
+    else:
+        client = await ServiceClient.connect_unix(arguments.unix)
+    try:
+        status = await produce_records(client, ColumnarRecordCollection.from_columns(trace.columns),
+                                       trace.reference_files)
+        print(json.dumps(status))
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    arguments = _parse_arguments(argv)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        if arguments.command == "produce":
+            loop.run_until_complete(_produce(arguments))
+            return
+        service = AnalysisService()
+        if arguments.references is not None:
+            with open(arguments.references, "r") as references_file:
+                for file in BlockFileJSONDecoder().decode_parsed(json.load(references_file)):
+                    service.analysis.register_file(file)
+        if arguments.tcp is not None:
+            host, port = arguments.tcp.rsplit(":", 1)
+            loop.run_until_complete(service.start_tcp(host, int(port)))
+        else:
+            loop.run_until_complete(service.start_unix(arguments.unix))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(service.stop())
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
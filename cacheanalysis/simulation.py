@@ -0,0 +1,355 @@
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict, namedtuple
+from heapq import heappush, heappop, heapify
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from cacheanalysis.collections import BaseRecordCollection, DELETE_EVENT, MISS_EVENT
+
+Accesses = namedtuple("Accesses", ["block_hashes", "block_ids", "block_sizes"])
+Accesses.__doc__ = """
+Stream of block accesses, in chronological order. `block_ids` index into `block_hashes` and `block_sizes` gives the
+size of the block accessed.
+"""
+
+
+class SimulationResult(namedtuple("SimulationResult", [
+        "policy", "capacity", "accesses", "hits", "bytes_accessed", "bytes_hit", "evictions"])):
+    """
+    Result of replaying a stream of accesses through a cache policy.
+    """
+    __slots__ = ()
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        Gets the proportion of accesses that were hits.
+        :return: the hit ratio
+        """
+        return self.hits / self.accesses if self.accesses > 0 else 0.0
+
+    @property
+    def byte_hit_ratio(self) -> float:
+        """
+        Gets the proportion of bytes accessed that were served by hits.
+        :return: the byte hit ratio
+        """
+        return self.bytes_hit / self.bytes_accessed if self.bytes_accessed > 0 else 0.0
+
+
+class CachePolicy(metaclass=ABCMeta):
+    """
+    Policy that decides which blocks are kept in a cache of limited size.
+    """
+    name = None     # type: str
+
+    def __init__(self, capacity: int):
+        """
+        Constructor.
+        :param capacity: the size of the cache, in bytes
+        """
+        self.capacity = capacity
+        self.used = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def access(self, block: int, size: int) -> bool:
+        """
+        Accesses the given block, loading it into the cache if it is not already there. Blocks larger than the
+        cache are never loaded.
+        :param block: the id of the block
+        :param size: the size of the block, in bytes
+        :return: whether the access was a hit
+        """
+
+
+class LRUPolicy(CachePolicy):
+    """
+    Least recently used: evicts the block that was accessed longest ago.
+    """
+    name = "LRU"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._cache = OrderedDict()     # type: Dict[int, int]
+
+    def access(self, block: int, size: int) -> bool:
+        cache = self._cache
+        if block in cache:
+            cache.move_to_end(block)
+            return True
+        if size > self.capacity:
+            return False
+        while self.used + size > self.capacity:
+            self.used -= cache.popitem(last=False)[1]
+            self.evictions += 1
+        cache[block] = size
+        self.used += size
+        return False
+
+
+class FIFOPolicy(CachePolicy):
+    """
+    First in, first out: evicts the block that was loaded longest ago, regardless of use.
+    """
+    name = "FIFO"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._cache = OrderedDict()     # type: Dict[int, int]
+
+    def access(self, block: int, size: int) -> bool:
+        cache = self._cache
+        if block in cache:
+            return True
+        if size > self.capacity:
+            return False
+        while self.used + size > self.capacity:
+            self.used -= cache.popitem(last=False)[1]
+            self.evictions += 1
+        cache[block] = size
+        self.used += size
+        return False
+
+
+class LFUPolicy(CachePolicy):
+    """
+    Least frequently used: evicts the block that has been accessed the fewest times since it was loaded, with ties
+    broken by evicting the least recently used.
+
+    Blocks are kept in a heap ordered by (accesses, time of last access). Entries are not updated in place: a new
+    entry is pushed on each access and entries that are out of date are discarded when they reach the top.
+    """
+    name = "LFU"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._cache = dict()    # type: Dict[int, Tuple[int, int, int]]
+        self._sizes = dict()    # type: Dict[int, int]
+        self._heap = []     # type: List[Tuple[int, int, int]]
+        self._time = 0
+
+    def access(self, block: int, size: int) -> bool:
+        self._time += 1
+        cache = self._cache
+        entry = cache.get(block)
+        if entry is not None:
+            entry = (entry[0] + 1, self._time, block)
+            cache[block] = entry
+            heappush(self._heap, entry)
+            # Stop stale entries from accumulating
+            if len(self._heap) > 2 * len(cache) + 64:
+                self._heap = list(cache.values())
+                heapify(self._heap)
+            return True
+        if size > self.capacity:
+            return False
+        while self.used + size > self.capacity:
+            evicted = heappop(self._heap)
+            if cache.get(evicted[2]) is evicted:
+                del cache[evicted[2]]
+                self.used -= self._sizes.pop(evicted[2])
+                self.evictions += 1
+        entry = (1, self._time, block)
+        cache[block] = entry
+        self._sizes[block] = size
+        heappush(self._heap, entry)
+        self.used += size
+        return False
+
+
+class ARCPolicy(CachePolicy):
+    """
+    Adaptive replacement cache (Megiddo and Modha): balances recency and frequency by splitting the cache between
+    blocks seen once recently (T1) and blocks seen at least twice (T2), adapting the target size of T1 using ghost
+    lists of recently evicted blocks (B1 and B2). Sizes are accounted in bytes rather than in blocks.
+    """
+    name = "ARC"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._t1, self._t2, self._b1, self._b2 = (OrderedDict() for _ in range(4))
+        self._t1_bytes = 0
+        self._b1_bytes = 0
+        self._b2_bytes = 0
+        self._target_t1_bytes = 0
+
+    def access(self, block: int, size: int) -> bool:
+        if block in self._t2:
+            self._t2.move_to_end(block)
+            return True
+        if block in self._t1:
+            size = self._t1.pop(block)
+            self._t1_bytes -= size
+            self._t2[block] = size
+            return True
+        if size > self.capacity:
+            return False
+
+        if block in self._b1:
+            self._b1_bytes -= self._b1.pop(block)
+            self._target_t1_bytes = min(
+                self.capacity, self._target_t1_bytes + size * max(_ratio(self._b2_bytes, self._b1_bytes), 1))
+            self._replace(size, False)
+            self._t2[block] = size
+        elif block in self._b2:
+            self._b2_bytes -= self._b2.pop(block)
+            self._target_t1_bytes = max(
+                0, self._target_t1_bytes - size * max(_ratio(self._b1_bytes, self._b2_bytes), 1))
+            self._replace(size, True)
+            self._t2[block] = size
+        else:
+            self._replace(size, False)
+            self._t1[block] = size
+            self._t1_bytes += size
+        self.used += size
+        self._trim_ghosts()
+        return False
+
+    def _replace(self, size: int, in_b2: bool):
+        """
+        Evicts blocks from T1 or T2 into their ghost lists until the given number of bytes will fit.
+        :param size: the number of bytes required
+        :param in_b2: whether the block that is being loaded was found in B2
+        """
+        while self.used + size > self.capacity:
+            if len(self._t1) > 0 and (len(self._t2) == 0 or self._t1_bytes > self._target_t1_bytes
+                                      or (in_b2 and self._t1_bytes >= self._target_t1_bytes)):
+                evicted, evicted_size = self._t1.popitem(last=False)
+                self._t1_bytes -= evicted_size
+                self._b1[evicted] = evicted_size
+                self._b1_bytes += evicted_size
+            else:
+                evicted, evicted_size = self._t2.popitem(last=False)
+                self._b2[evicted] = evicted_size
+                self._b2_bytes += evicted_size
+            self.used -= evicted_size
+            self.evictions += 1
+
+    def _trim_ghosts(self):
+        """
+        Discards the oldest blocks from the ghost lists so that T1 and B1 together do not exceed the capacity and
+        all lists together do not exceed twice the capacity.
+        """
+        while self._t1_bytes + self._b1_bytes > self.capacity and len(self._b1) > 0:
+            self._b1_bytes -= self._b1.popitem(last=False)[1]
+        while self.used + self._b1_bytes + self._b2_bytes > 2 * self.capacity and len(self._b2) > 0:
+            self._b2_bytes -= self._b2.popitem(last=False)[1]
+
+
+class TwoQueuePolicy(CachePolicy):
+    """
+    2Q (Johnson and Shasha): blocks are first loaded into a FIFO queue (A1in) and are only promoted to the main LRU
+    queue (Am) if they are accessed again after being evicted from it, whilst they are remembered in a ghost queue
+    (A1out). This stops blocks that are only accessed once from flushing the main queue.
+    """
+    name = "2Q"
+
+    def __init__(self, capacity: int, in_proportion: float=0.25, out_proportion: float=0.5):
+        """
+        Constructor.
+        :param capacity: see `CachePolicy.__init__`
+        :param in_proportion: the proportion of the capacity that A1in is allowed to exceed before it is evicted from
+        :param out_proportion: the number of bytes of blocks that A1out remembers, as a proportion of the capacity
+        """
+        super().__init__(capacity)
+        self._in_capacity = in_proportion * capacity
+        self._out_capacity = out_proportion * capacity
+        self._a1_in, self._a1_out, self._am = (OrderedDict() for _ in range(3))
+        self._a1_in_bytes = 0
+        self._a1_out_bytes = 0
+
+    def access(self, block: int, size: int) -> bool:
+        if block in self._am:
+            self._am.move_to_end(block)
+            return True
+        if block in self._a1_in:
+            return True
+        if size > self.capacity:
+            return False
+
+        if block in self._a1_out:
+            self._a1_out_bytes -= self._a1_out.pop(block)
+            self._reclaim(size)
+            self._am[block] = size
+        else:
+            self._reclaim(size)
+            self._a1_in[block] = size
+            self._a1_in_bytes += size
+        self.used += size
+        return False
+
+    def _reclaim(self, size: int):
+        """
+        Evicts blocks until the given number of bytes will fit.
+        :param size: the number of bytes required
+        """
+        while self.used + size > self.capacity:
+            if len(self._a1_in) > 0 and (self._a1_in_bytes > self._in_capacity or len(self._am) == 0):
+                evicted, evicted_size = self._a1_in.popitem(last=False)
+                self._a1_in_bytes -= evicted_size
+                self._a1_out[evicted] = evicted_size
+                self._a1_out_bytes += evicted_size
+                while self._a1_out_bytes > self._out_capacity and len(self._a1_out) > 0:
+                    self._a1_out_bytes -= self._a1_out.popitem(last=False)[1]
+            else:
+                evicted_size = self._am.popitem(last=False)[1]
+            self.used -= evicted_size
+            self.evictions += 1
+
+
+POLICIES = {policy.name: policy for policy in (LRUPolicy, FIFOPolicy, LFUPolicy, ARCPolicy, TwoQueuePolicy)}
+
+
+def get_accesses(record_collection: BaseRecordCollection) -> Accesses:
+    """
+    Gets the stream of block accesses (hits and misses) from the given records. Blocks are sized by the largest
+    size they were missed with; blocks that were never missed are given the mean size of those that were.
+    :param record_collection: the records
+    :return: the accesses
+    """
+    columns = record_collection.columns
+    block_sizes = np.zeros(len(columns.block_hashes), dtype=np.int64)
+    misses = columns.event_types == MISS_EVENT
+    np.maximum.at(block_sizes, columns.block_ids[misses], columns.block_sizes[misses])
+    missed = np.zeros(len(columns.block_hashes), dtype=bool)
+    missed[columns.block_ids[misses]] = True
+    if np.any(missed):
+        block_sizes[~missed] = int(block_sizes[missed].mean())
+
+    block_ids = columns.block_ids[columns.event_types != DELETE_EVENT]
+    return Accesses(columns.block_hashes, block_ids, block_sizes[block_ids])
+
+
+def replay(accesses: Accesses, policy: CachePolicy) -> SimulationResult:
+    """
+    Replays the given accesses through the given cache policy.
+    :param accesses: the accesses to replay
+    :param policy: the cache policy, which should not have been used before
+    :return: the result of the replay
+    """
+    access = policy.access
+    hits = 0
+    bytes_hit = 0
+    for block, size in zip(accesses.block_ids.tolist(), accesses.block_sizes.tolist()):
+        if access(block, size):
+            hits += 1
+            bytes_hit += size
+    return SimulationResult(policy.name, policy.capacity, len(accesses.block_ids), hits,
+                            int(accesses.block_sizes.sum()), bytes_hit, policy.evictions)
+
+
+def simulate(record_collection: BaseRecordCollection, policies: Iterable[CachePolicy]) -> List[SimulationResult]:
+    """
+    Simulates how caches using each of the given policies would have performed on the accesses in the given records.
+    :param record_collection: the records
+    :param policies: the cache policies to simulate, which should not have been used before
+    :return: the result of each simulation, in the same order as the policies
+    """
+    accesses = get_accesses(record_collection)
+    return [replay(accesses, policy) for policy in policies]
+
+
+def _ratio(numerator: int, denominator: int) -> float:
+    return numerator / denominator if denominator > 0 else 1.0
@@ -0,0 +1,298 @@
+"""
+Sketches that summarise streams of records in constant memory, giving approximate answers to questions such as which
+blocks are accessed the most and how many distinct blocks were accessed.
+
+Items are hashed with Python's `hash`, so sketches can only be merged or compared within a single process.
+"""
+import math
+import sys
+from collections import defaultdict
+from heapq import heapify, heappop, heappush
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from tabulate import tabulate
+
+from cacheanalysis.models import Record, CacheHitRecord, CacheMissRecord, BlockFile
+from cacheanalysis.timestamps import to_epoch_nanoseconds, to_nanoseconds, Duration
+
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+def _hash(item: Hashable) -> int:
+    """
+    Hashes the given item to an unsigned 64-bit integer.
+    :param item: the item
+    :return: the hash
+    """
+    value = hash(item) & _HASH_MASK
+    if sys.hash_info.width < _HASH_BITS:
+        value = (hash((item, 1)) & 0xffffffff) << 32 | (value & 0xffffffff)
+    # Finalise (as in SplitMix64) so that all bits depend on all bits of the hash
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & _HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & _HASH_MASK
+    return value ^ (value >> 31)
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch (Cormode and Muthukrishnan): estimates how much has been counted for any item, never
+    underestimating and overestimating by at most e / width of the total count with probability 1 - e^-depth.
+    """
+    def __init__(self, width: int=2048, depth: int=4):
+        """
+        Constructor.
+        :param width: the number of counters in each row
+        :param depth: the number of rows, each of which uses a different hash of the items
+        """
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._counters = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def add(self, item: Hashable, count: int=1):
+        """
+        Adds the given count to the given item.
+        :param item: the item
+        :param count: the amount to add
+        """
+        self._counters[self._rows, self._get_columns(item)] += count
+        self.total += count
+
+    def estimate(self, item: Hashable) -> int:
+        """
+        Estimates the total count of the given item.
+        :param item: the item
+        :return: the estimated count, which is at least the true count
+        """
+        return int(self._counters[self._rows, self._get_columns(item)].min())
+
+    def _get_columns(self, item: Hashable) -> List[int]:
+        """
+        Gets the counter of the given item in each row, using double hashing.
+        :param item: the item
+        :return: the column of the counter in each row
+        """
+        value = _hash(item)
+        first, second = value & 0xffffffff, (value >> 32) | 1
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+
+class SpaceSaving:
+    """
+    Space-Saving (Metwally et al.): keeps the items with the largest counts, using a fixed number of counters. When
+    a new item arrives and all counters are in use, the item with the smallest count is replaced and the new item
+    inherits its count, which is recorded as the possible error in the new item's count. Any item whose true count
+    is more than total / capacity is guaranteed to be kept.
+
+    Items are kept in a heap ordered by count. Entries are not updated in place: a new entry is pushed each time
+    an item is counted and entries that are out of date are discarded when they reach the top.
+    """
+    def __init__(self, capacity: int=1000):
+        """
+        Constructor.
+        :param capacity: the number of items to keep counts of
+        """
+        self.capacity = capacity
+        self.total = 0
+        self._counts = dict()   # type: Dict[Hashable, Tuple[int, int]]
+        self._heap = []     # type: List[Tuple[int, int, Hashable]]
+        self._added = 0
+
+    def add(self, item: Hashable, count: int=1):
+        """
+        Adds the given count to the given item.
+        :param item: the item
+        :param count: the amount to add
+        """
+        self.total += count
+        self._added += 1
+        counts = self._counts
+        entry = counts.get(item)
+        if entry is not None:
+            entry = (entry[0] + count, entry[1])
+        elif len(counts) < self.capacity:
+            entry = (count, 0)
+        else:
+            minimum = self._pop_minimum()
+            del counts[minimum[2]]
+            entry = (minimum[0] + count, minimum[0])
+        counts[item] = entry
+        # The order in which entries were added breaks ties, so that items are never compared
+        heappush(self._heap, (entry[0], self._added, item))
+        # Stop stale entries from accumulating
+        if len(self._heap) > 2 * len(counts) + 64:
+            self._heap = [(count, self._added + i, item) for i, (item, (count, _)) in enumerate(counts.items(), 1)]
+            self._added += len(counts)
+            heapify(self._heap)
+
+    def top(self, k: int=None) -> List[Tuple[Hashable, int, int]]:
+        """
+        Gets the items with the largest counts.
+        :param k: the number of items to get, or `None` to get all that are kept
+        :return: list of (item, estimated count, maximum overestimate of the count), in descending order of count
+        """
+        items = sorted(((item, count, error) for item, (count, error) in self._counts.items()),
+                       key=lambda entry: entry[1], reverse=True)
+        return items if k is None else items[:k]
+
+    def _pop_minimum(self) -> Tuple[int, int, Hashable]:
+        """
+        Removes and returns the (up to date) entry with the smallest count from the heap.
+        :return: the entry
+        """
+        while True:
+            entry = heappop(self._heap)
+            current = self._counts.get(entry[2])
+            if current is not None and current[0] == entry[0]:
+                return entry
+
+
+class HyperLogLog:
+    """
+    HyperLogLog (Flajolet et al.): estimates the number of distinct items seen, with a standard error of about
+    1.04 / sqrt(2^precision), using 2^precision one-byte registers.
+    """
+    def __init__(self, precision: int=12):
+        """
+        Constructor.
+        :param precision: the number of bits of each hash used to choose a register, in [4, 16]
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("Precision must be in [4, 16]: %d" % precision)
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, item: Hashable):
+        """
+        Adds the given item.
+        :param item: the item
+        """
+        value = _hash(item)
+        register = value >> (_HASH_BITS - self.precision)
+        remainder = value & ((1 << (_HASH_BITS - self.precision)) - 1)
+        # Position of the first set bit in the remaining bits
+        rank = _HASH_BITS - self.precision - remainder.bit_length() + 1
+        if rank > self._registers[register]:
+            self._registers[register] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        """
+        Merges another sketch of the same precision into this one, so that it counts the union of the items.
+        :param other: the other sketch
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precisions: %d and %d"
+                             % (self.precision, other.precision))
+        self._registers = bytearray(np.maximum(np.frombuffer(self._registers, dtype=np.uint8),
+                                               np.frombuffer(other._registers, dtype=np.uint8)).tobytes())
+
+    def count(self) -> int:
+        """
+        Estimates the number of distinct items that have been added.
+        :return: the estimate
+        """
+        registers = np.frombuffer(self._registers, dtype=np.uint8)
+        number_of_registers = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / number_of_registers)
+        estimate = alpha * number_of_registers ** 2 / float(np.sum(np.power(2.0, -registers.astype(np.float64))))
+        empty = int(np.count_nonzero(registers == 0))
+        # Linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * number_of_registers and empty > 0:
+            estimate = number_of_registers * math.log(number_of_registers / empty)
+        return int(round(estimate))
+
+
+class BlockSketches:
+    """
+    Approximate summary of a stream of records, held in constant memory (aside from the block files that are
+    registered and a fixed-size sketch for each window of time): the blocks with the most accesses (hits and
+    misses) and the most bytes missed, estimates of the accesses of any block, and the number of distinct blocks
+    and files accessed overall and in each window of time.
+    """
+    def __init__(self, capacity: int=1000, precision: int=12, window: Optional[Duration]=None):
+        """
+        Constructor.
+        :param capacity: the number of blocks that the most accessed blocks, and the blocks with the most bytes
+        missed, are kept from
+        :param precision: the precision of the distinct counts (see `HyperLogLog.__init__`)
+        :param window: the width of the windows of time to count distinct blocks in. If `None`, distinct blocks
+        are only counted overall
+        """
+        self.precision = precision
+        self.window = None if window is None else to_nanoseconds(window)
+        self.accesses = SpaceSaving(capacity)
+        self.bytes_missed = SpaceSaving(capacity)
+        self.access_counts = CountMinSketch()
+        self.distinct_blocks = HyperLogLog(precision)
+        self.distinct_files = HyperLogLog(precision)
+        self._window_distinct_blocks = []   # type: List[Tuple[int, HyperLogLog]]
+        self._block_files = defaultdict(set)    # type: Dict[str, Set[str]]
+
+    def register_file(self, file: BlockFile):
+        """
+        Registers a block file, so that accesses to its blocks are counted as accesses to it.
+        :param file: the block file
+        """
+        for block_hash in file.block_hashes:
+            self._block_files[block_hash].add(file.name)
+
+    def add_record(self, record: Record):
+        """
+        Adds a record to the summary.
+        :param record: the record, which should not have occurred before any of the records already added if
+        distinct blocks are counted in windows
+        """
+        record_type = type(record)
+        if record_type == CacheMissRecord:
+            self.bytes_missed.add(record.block_hash, record.block_size)
+        elif record_type != CacheHitRecord:
+            return
+        self.accesses.add(record.block_hash)
+        self.access_counts.add(record.block_hash)
+        self.distinct_blocks.add(record.block_hash)
+        for name in self._block_files.get(record.block_hash, ()):
+            self.distinct_files.add(name)
+        if self.window is not None:
+            timestamp = to_epoch_nanoseconds(record.timestamp)
+            start = timestamp - timestamp % self.window
+            if len(self._window_distinct_blocks) == 0 or self._window_distinct_blocks[-1][0] != start:
+                self._window_distinct_blocks.append((start, HyperLogLog(self.precision)))
+            self._window_distinct_blocks[-1][1].add(record.block_hash)
+
+    def add_records(self, records: Iterable[Record]):
+        """
+        Adds records to the summary.
+        :param records: the records
+        """
+        for record in records:
+            self.add_record(record)
+
+    def distinct_blocks_in_windows(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gets the estimated number of distinct blocks accessed in each window of time that contains accesses.
+        :return: tuple of the start of each window (in nanoseconds since the epoch) and its estimated number of
+        distinct blocks
+        """
+        return (np.array([start for start, _ in self._window_distinct_blocks], dtype=np.int64),
+                np.array([sketch.count() for _, sketch in self._window_distinct_blocks], dtype=np.int64))
+
+    def report(self, k: int=20) -> str:
+        """
+        Gets a report of the most accessed blocks and the blocks with the most bytes missed, with the number of
+        distinct blocks and files accessed.
+        :param k: the number of blocks to list in each table
+        :return: the report
+        """
+        return "\n".join([
+            "Blocks sorted by number of accesses (hits + misses)",
+            tabulate([[block_hash, count, error] for block_hash, count, error in self.accesses.top(k)],
+                     headers=("Block", "Accesses", "Maximum overestimate")),
+            "Blocks sorted by number of bytes missed",
+            tabulate([[block_hash, count, error] for block_hash, count, error in self.bytes_missed.top(k)],
+                     headers=("Block", "Bytes missed", "Maximum overestimate")),
+            "Distinct blocks accessed (estimated): %d" % self.distinct_blocks.count(),
+            "Distinct known files accessed (estimated): %d" % self.distinct_files.count()
+        ])
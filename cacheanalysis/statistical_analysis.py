@@ -1,9 +1,36 @@
-from typing import Optional
+from collections import defaultdict, namedtuple
+from typing import Optional, Dict, List, Tuple
 
-from operator import attrgetter
+import numpy as np
 
+from cacheanalysis.access_patterns import AccessPatterns
 from cacheanalysis.analysis import BlockAnalysis, BlockFileAnalysis
-from cacheanalysis.models import CacheMissRecord
+from cacheanalysis.collections import BlockEventCounts, RecordColumns, HIT_EVENT, MISS_EVENT, DELETE_EVENT
+from cacheanalysis.instrumentation import timed
+from cacheanalysis.memoisation import memoised
+from cacheanalysis.miss_ratio_curves import MissRatioCurve, lru_miss_ratio_curves
+from cacheanalysis.models import CacheMissRecord, CacheDeleteRecord
+from cacheanalysis.residency import Residency, reconstruct_residency
+from cacheanalysis.simulation import get_accesses
+from cacheanalysis.time_series import TimeSeries, windowed_metrics_of_columns
+from cacheanalysis.timestamps import Duration, Timestamp
+
+BlockStatistics = namedtuple("BlockStatistics", [
+    "block_hashes", "block_indexes", "hits", "misses", "deletes", "mean_hits", "bytes_missed"])
+BlockStatistics.__doc__ = """
+Statistics about all blocks, held as arrays that are indexed in the same order as `block_hashes`.
+`block_indexes` maps each block hash to its index. `mean_hits` is NaN for blocks that have not been missed.
+"""
+FileStatistics = namedtuple("FileStatistics", [
+    "files", "blocks", "hits", "misses", "hit_ratios", "resident_fractions", "bytes_missed", "bytes_refetched"])
+FileStatistics.__doc__ = """
+Statistics about all registered block files, held as arrays that are indexed in the same order as `files` (i.e. by
+file id in `BlockFileAnalysis.file_index`). `blocks` is the number of distinct blocks in each file. Events are
+counted towards every file that contains the block involved. `hit_ratios` is the proportion of accesses to blocks in
+the file that were hits (NaN if none were accessed), `resident_fractions` is the proportion of the blocks in the
+file that are in the cache after the last record and `bytes_refetched` is the number of bytes missed after the
+first miss of each block.
+"""
 
 
 class StatisticalBlockAnalysis(BlockAnalysis):
@@ -17,7 +44,9 @@ class StatisticalBlockAnalysis(BlockAnalysis):
         :param block_hash: the block hash
         :return: the total number of times the block was missed
         """
-        return len(self.record_collection.get_block_misses(block_hash))
+        statistics = self.block_statistics()
+        index = statistics.block_indexes.get(block_hash)
+        return 0 if index is None else int(statistics.misses[index])
 
     def total_block_hits(self, block_hash: str) -> int:
         """
@@ -26,7 +55,9 @@ class StatisticalBlockAnalysis(BlockAnalysis):
         :param block_hash: the block hash
         :return: the total number of times the block was hit
         """
-        return len(self.record_collection.get_block_hits(block_hash))
+        statistics = self.block_statistics()
+        index = statistics.block_indexes.get(block_hash)
+        return 0 if index is None else int(statistics.hits[index])
 
     def mean_block_hits(self, block_hash: str) -> Optional[float]:
         """
@@ -35,11 +66,83 @@ class StatisticalBlockAnalysis(BlockAnalysis):
         :param block_hash: the block hash
         :return: the mean number of accesses
         """
-        misses = self.record_collection.get_block_misses(block_hash)
-        hits = self.record_collection.get_block_hits(block_hash)
-        if len(misses) == 0:
+        statistics = self.block_statistics()
+        index = statistics.block_indexes.get(block_hash)
+        if index is None or statistics.misses[index] == 0:
             return None
-        return len(hits)/len(misses)
+        return int(statistics.hits[index]) / int(statistics.misses[index])
+
+    @timed()
+    @memoised()
+    def block_statistics(self) -> BlockStatistics:
+        """
+        Gets the number of hits, misses and deletes, the mean number of hits and the total number of bytes
+        missed for all blocks at once. The statistics are computed from the collection's columns in one pass
+        and are memoised until records are added to the collection. The statistics of single blocks (e.g.
+        `total_block_hits`) are got from them, so the two always agree.
+        :return: the statistics of all blocks
+        """
+        return self._calculate_block_statistics()
+
+    def _calculate_block_statistics(self) -> BlockStatistics:
+        """
+        Calculates the statistics of all blocks.
+        :return: see `block_statistics`
+        """
+        return block_statistics_of_event_counts(self.record_collection.get_block_event_counts())
+
+    @timed()
+    @memoised()
+    def lru_miss_ratio_curves(self, sampling_rate: float=1.0) -> Tuple[MissRatioCurve, MissRatioCurve]:
+        """
+        Gets the miss ratio curves of an LRU cache replaying the accesses (hits and misses) in the records,
+        i.e. what the proportion of misses would have been for every cache size. See
+        `miss_ratio_curves.lru_miss_ratio_curves`.
+        :param sampling_rate: the proportion of blocks to sample when computing the curves
+        :return: a tuple containing the curve of the proportion of accesses that miss against capacity in
+        blocks, and the curve of the proportion of bytes that miss against capacity in bytes
+        """
+        return lru_miss_ratio_curves(get_accesses(self.record_collection), sampling_rate)
+
+    @timed()
+    @memoised()
+    def windowed_metrics(self, width: Duration, step: Duration=None) -> TimeSeries:
+        """
+        Gets the number of hits, misses and deletes, and the bytes missed, in windows of time over the records
+        (e.g. per minute or hour, or sliding hour-long windows every minute). See `time_series.windowed_metrics`.
+        :param width: the width of each window, as a `timedelta` or in nanoseconds
+        :param step: the time between the starts of consecutive windows. If `None`, windows do not overlap
+        :return: the metrics of each window
+        """
+        return windowed_metrics_of_columns(self.record_collection.columns, width, step)
+
+    @timed()
+    @memoised()
+    def residency(self) -> Residency:
+        """
+        Gets the intervals during which each block was resident in the cache and the occupancy of the cache over
+        time, with an index of the intervals to query which blocks were resident when. See
+        `residency.reconstruct_residency`. The result is memoised until records are added to the collection.
+        :return: the residency of blocks
+        """
+        return reconstruct_residency(self.record_collection.columns)
+
+    def blocks_resident_at(self, timestamp: Timestamp) -> List[str]:
+        """
+        Gets the blocks that were resident in the cache at the given time (see `Residency.resident_at`).
+        :param timestamp: the time
+        :return: the hashes of the blocks
+        """
+        return self.residency().resident_at(timestamp)
+
+    def mean_block_lifetime(self, block_hash: str) -> Optional[float]:
+        """
+        Gets the mean time that the given block was resident in the cache each time that it was loaded (see
+        `Residency.mean_lifetime`). If it was never deleted or reloaded once loaded, `None` is returned.
+        :param block_hash: the block hash
+        :return: the mean lifetime, in nanoseconds
+        """
+        return self.residency().mean_lifetime(block_hash)
 
     def mean_other_block_misses_between_reload(self, block_hash: str) -> Optional[float]:
         """
@@ -49,57 +152,193 @@ class StatisticalBlockAnalysis(BlockAnalysis):
         :param block_hash: the block hash
         :return: the mean number of other block loads between reloading
         """
-        misses = self.record_collection.get_block_misses(block_hash)
-        deletes = self.record_collection.get_block_deletes(block_hash)
-        if len(misses) < 2 or len(deletes) == 0:
-            return None
-        # sort all records into chronological order
-        records = sorted(
-            [record for record in self.record_collection],
-            key=attrgetter("timestamp")
-        )
-        block_in_cache = True  # don't include data before the block is added for the first time
-        other_block_misses = []
+        return self.all_mean_other_block_misses_between_reload().get(block_hash)
+
+    @timed()
+    @memoised()
+    def all_mean_other_block_misses_between_reload(self) -> Dict[str, float]:
+        """
+        Gets the mean number of other block misses that took place between when each block was deleted
+        from the cache and then reloaded (see `mean_other_block_misses_between_reload`). The result is
+        memoised until records are added to the collection.
+        :return: the mean number of other block loads between reloading, indexed by block hash. Blocks
+        for which the mean is undefined are not included
+        """
+        return self._calculate_mean_other_block_misses_between_reload()
+
+    def _calculate_mean_other_block_misses_between_reload(self) -> Dict[str, float]:
+        """
+        Calculates the mean number of other block misses between reloads for all blocks in a single
+        chronological sweep of the records. A running count of all misses is kept and, for each block
+        that is out of the cache, the value of the count when it was deleted: the number of other block
+        misses before it is reloaded is then the difference between the two.
+        :return: see `all_mean_other_block_misses_between_reload`
+        """
+        records = self.record_collection.get_records_in_time_order()
+        total_misses = 0
+        block_misses = defaultdict(int)     # type: Dict[str, int]
+        block_deletes = defaultdict(int)    # type: Dict[str, int]
+        total_other_block_misses = defaultdict(int)     # type: Dict[str, int]
+        misses_when_deleted = dict()    # type: Dict[str, int]
         for record in records:
-            if record in misses:
-                block_in_cache = True
-            elif record in deletes:
-                block_in_cache = False
-                other_block_misses.append(0)
-            elif type(record) == CacheMissRecord and not block_in_cache:
-                other_block_misses[-1] += 1
-        return sum(other_block_misses) / len(other_block_misses)
+            record_type = type(record)
+            if record_type == CacheMissRecord:
+                misses_when_deleted_from_cache = misses_when_deleted.pop(record.block_hash, None)
+                if misses_when_deleted_from_cache is not None:
+                    total_other_block_misses[record.block_hash] += total_misses - misses_when_deleted_from_cache
+                block_misses[record.block_hash] += 1
+                total_misses += 1
+            elif record_type == CacheDeleteRecord:
+                # Only the most recent delete is counted from if a block is deleted again before reloading
+                misses_when_deleted_from_cache = misses_when_deleted.get(record.block_hash)
+                if misses_when_deleted_from_cache is not None:
+                    total_other_block_misses[record.block_hash] += total_misses - misses_when_deleted_from_cache
+                misses_when_deleted[record.block_hash] = total_misses
+                block_deletes[record.block_hash] += 1
+        # Blocks that were never reloaded count all the misses until the end of the records
+        for block_hash, misses_when_deleted_from_cache in misses_when_deleted.items():
+            total_other_block_misses[block_hash] += total_misses - misses_when_deleted_from_cache
+
+        return {block_hash: total_other_block_misses[block_hash] / deletes
+                for block_hash, deletes in block_deletes.items() if block_misses[block_hash] >= 2}
 
 
 class StatisticalBlockFileAnalysis(StatisticalBlockAnalysis, BlockFileAnalysis):
     """
     Statistical analysis of block files that are put into a cache.
     """
+    @timed()
+    @memoised(stateful=True)
     def known_file_block_hit_to_miss_proportion(self) -> float:
         """
         Gets the proportion of hits to misses for the blocks in all of the known
         files.
         :return: the ratio of hits to misses
         """
-        hits = 0
-        misses = 0
-        for block_hash in self._known_blocks:
-            hits += self.total_block_hits(block_hash)
-            misses += self.total_block_misses(block_hash)
-        return hits / misses
+        statistics = self.block_statistics()
+        known = self._get_known_block_mask(statistics)
+        return int(statistics.hits[known].sum()) / int(statistics.misses[known].sum())
 
+    @timed()
+    @memoised(stateful=True)
     def not_known_file_block_hit_to_miss_proportion(self) -> float:
         """
         Gets the proportion of hits to misses for the blocks not in the known
         files.
         :return: the ratio of hits to misses
         """
-        hits = 0
-        misses = 0
-        for block_hash in self.block_hashes:
-            if block_hash not in self._known_blocks:
-                hits += self.total_block_hits(block_hash)
-                misses += self.total_block_misses(block_hash)
-        return hits / misses
+        statistics = self.block_statistics()
+        not_known = ~self._get_known_block_mask(statistics)
+        return int(statistics.hits[not_known].sum()) / int(statistics.misses[not_known].sum())
+
+    def _get_known_block_mask(self, statistics: BlockStatistics) -> np.ndarray:
+        """
+        Gets a mask that selects the blocks in the given statistics that are in the known files.
+        :param statistics: the block statistics
+        :return: the mask
+        """
+        known = np.zeros(len(statistics.block_hashes), dtype=bool)
+        known[[statistics.block_indexes[block_hash] for block_hash in self.file_index.block_hashes
+               if block_hash in statistics.block_indexes]] = True
+        return known
+
+    @timed()
+    @memoised(stateful=True)
+    def file_statistics(self) -> FileStatistics:
+        """
+        Gets the number of hits and misses, hit ratio, fraction resident in the cache and bytes missed and
+        re-fetched for all registered files at once. The statistics are computed in bulk from the statistics of
+        all blocks and the membership of the file index, and are memoised until records are added or files are
+        registered.
+        :return: the statistics of all files
+        """
+        return self._calculate_file_statistics()
+
+    def _calculate_file_statistics(self) -> FileStatistics:
+        """
+        Calculates the statistics of all registered files.
+        :return: see `file_statistics`
+        """
+        file_index = self.file_index
+        statistics = self.block_statistics()
+        columns = self.record_collection.columns
+        resident, first_bytes_missed = _calculate_block_residency(columns)
+        column_block_ids = {block_hash: i for i, block_hash in enumerate(columns.block_hashes)}
+
+        # Index of each block in the file index into the block statistics and the columns (or the extra last
+        # element, which is zero, if the block has no records)
+        statistics_indexes = np.array([statistics.block_indexes.get(block_hash, -1)
+                                       for block_hash in file_index.block_hashes], dtype=np.int64)
+        column_indexes = np.array([column_block_ids.get(block_hash, -1)
+                                   for block_hash in file_index.block_hashes], dtype=np.int64)
+
+        def sum_over_files(block_values: np.ndarray, indexes: np.ndarray) -> np.ndarray:
+            return file_index.sum_over_files(np.append(block_values, 0)[indexes]).astype(np.int64)
+
+        blocks = np.diff(file_index.file_offsets)
+        hits = sum_over_files(statistics.hits, statistics_indexes)
+        misses = sum_over_files(statistics.misses, statistics_indexes)
+        bytes_missed = sum_over_files(statistics.bytes_missed, statistics_indexes)
+        accesses = hits + misses
+        hit_ratios = np.divide(hits, accesses, out=np.full(len(accesses), np.nan), where=accesses > 0)
+        resident_fractions = np.divide(sum_over_files(resident, column_indexes), blocks,
+                                       out=np.zeros(len(blocks)), where=blocks > 0)
+        bytes_refetched = bytes_missed - sum_over_files(first_bytes_missed, column_indexes)
+        return FileStatistics(list(file_index.files), blocks, hits, misses, hit_ratios, resident_fractions,
+                              bytes_missed, bytes_refetched)
+
+    @timed()
+    def access_patterns(self, window: int=16, minimum_scan_length: int=4, capacity: int=1000) -> AccessPatterns:
+        """
+        Detects sequential scans of the registered files, how often accessing a block of a file is followed by
+        accessing its next block and which blocks are most often accessed together, by streaming the records in
+        chronological order through `access_patterns.AccessPatterns`. The result is not memoised, as the caller
+        may go on to add records to it.
+        :param window: see `AccessPatterns.__init__`
+        :param minimum_scan_length: see `AccessPatterns.__init__`
+        :param capacity: see `AccessPatterns.__init__`
+        :return: new access patterns, owned by the caller
+        """
+        access_patterns = AccessPatterns(window, minimum_scan_length, capacity)
+        for file in self.file_index.files:
+            access_patterns.register_file(file)
+        access_patterns.add_columns(self.record_collection.columns)
+        return access_patterns
+
+
+def block_statistics_of_event_counts(event_counts: BlockEventCounts) -> BlockStatistics:
+    """
+    Gets the statistics of all blocks from the number of events involving each of them.
+    :param event_counts: the event counts, e.g. from `BaseRecordCollection.get_block_event_counts`
+    :return: see `StatisticalBlockAnalysis.block_statistics`
+    """
+    hits = event_counts.counts[:, HIT_EVENT]
+    misses = event_counts.counts[:, MISS_EVENT]
+    deletes = event_counts.counts[:, DELETE_EVENT]
+    mean_hits = np.divide(hits, misses, out=np.full(len(hits), np.nan), where=misses > 0)
+    block_indexes = {block_hash: i for i, block_hash in enumerate(event_counts.block_hashes)}
+    return BlockStatistics(event_counts.block_hashes, block_indexes, hits, misses, deletes, mean_hits,
+                           event_counts.bytes_missed)
+
+
+def _calculate_block_residency(columns: RecordColumns) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates whether each block is in the cache after the last event and the number of bytes of its first miss.
+    A block is in the cache if its last hit or miss was after its last delete.
+    :param columns: the columns of events
+    :return: tuple of whether each block is resident and the bytes of its first miss (zero if never missed), both
+    indexed by block id in the columns
+    """
+    number_of_blocks = len(columns.block_hashes)
+    positions = np.arange(len(columns.block_ids))
+    last_access = np.full(number_of_blocks, -1, dtype=np.int64)
+    last_delete = np.full(number_of_blocks, -1, dtype=np.int64)
+    deletes = columns.event_types == DELETE_EVENT
+    np.maximum.at(last_access, columns.block_ids[~deletes], positions[~deletes])
+    np.maximum.at(last_delete, columns.block_ids[deletes], positions[deletes])
 
-    # TODO: Anything else interesting to know about block file access patterns
+    first_bytes_missed = np.zeros(number_of_blocks, dtype=np.int64)
+    misses = np.flatnonzero(columns.event_types == MISS_EVENT)
+    missed_blocks, first_misses = np.unique(columns.block_ids[misses], return_index=True)
+    first_bytes_missed[missed_blocks] = columns.block_sizes[misses[first_misses]]
+    return last_access > last_delete, first_bytes_missed
@@ -0,0 +1,119 @@
+import unittest
+
+import numpy as np
+
+from cacheanalysis.access_patterns import AccessPatterns
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+
+_SIZE = 10
+
+
+def _create_records(block_hashes, miss_every: int=2):
+    """
+    Creates records of accesses to the given blocks, in order.
+    :param block_hashes: the hashes of the blocks accessed
+    :param miss_every: every this many accesses are misses, with the rest being hits
+    :return: the records
+    """
+    return [CacheMissRecord(block_hash, timestamp, _SIZE) if timestamp % miss_every == 0
+            else CacheHitRecord(block_hash, timestamp) for timestamp, block_hash in enumerate(block_hashes)]
+
+
+class TestAccessPatterns(unittest.TestCase):
+    """
+    Unit tests for `AccessPatterns`.
+    """
+    def setUp(self):
+        self.file = BlockFile("file", ["a0", "a1", "a2", "a3", "a4", "a5"])
+        self.other_file = BlockFile("other", ["b0", "b1", "b2"])
+        self.access_patterns = AccessPatterns(window=2, minimum_scan_length=3)
+        self.access_patterns.register_file(self.file)
+        self.access_patterns.register_file(self.other_file)
+
+    def test_sequential_scan(self):
+        self.access_patterns.add_records(_create_records(["a0", "x", "a1", "a2", "y", "z", "a3", "a4", "a5"]))
+        patterns = self.access_patterns.file_access_patterns()
+        self.assertEqual([self.file, self.other_file], patterns.files)
+        np.testing.assert_array_equal([6, 0], patterns.accesses)
+        # The scan is broken (by two other accesses) after the third block
+        np.testing.assert_array_equal([2, 0], patterns.scans)
+        np.testing.assert_array_equal([6, 0], patterns.scan_accesses)
+
+    def test_interleaved_scans(self):
+        self.access_patterns.add_records(_create_records(["a0", "b0", "a1", "b1", "a2", "b2"]))
+        patterns = self.access_patterns.file_access_patterns()
+        np.testing.assert_array_equal([1, 1], patterns.scans)
+        np.testing.assert_array_equal([3, 3], patterns.scan_accesses)
+
+    def test_short_run_is_not_scan(self):
+        self.access_patterns.add_records(_create_records(["a0", "a1", "x", "a3", "a4"]))
+        np.testing.assert_array_equal([0, 0], self.access_patterns.file_access_patterns().scans)
+
+    def test_follow_probabilities(self):
+        self.access_patterns.add_records(_create_records(["a0", "x", "a1", "a3", "x", "y", "a4", "b2", "x", "y"]))
+        patterns = self.access_patterns.file_access_patterns()
+        # a0 is followed by a1, a1 is not followed by a2, a3 is not followed by a4 within the window and b2 is the
+        # last block of its file
+        np.testing.assert_array_equal([4, 0], patterns.follow_opportunities)
+        np.testing.assert_array_equal([1, 0], patterns.follows)
+        np.testing.assert_array_equal([0.25, np.nan], patterns.follow_probabilities)
+
+    def test_opportunities_in_last_window_are_not_counted(self):
+        self.access_patterns.add_records(_create_records(["a0", "a1", "a2"]))
+        patterns = self.access_patterns.file_access_patterns()
+        np.testing.assert_array_equal([2, 0], patterns.follow_opportunities)
+        np.testing.assert_array_equal([2, 0], patterns.follows)
+
+    def test_block_at_consecutive_positions_does_not_follow_itself(self):
+        access_patterns = AccessPatterns(window=2, minimum_scan_length=2)
+        access_patterns.register_file(BlockFile("repeated", ["a", "a", "b"]))
+        access_patterns.add_records(_create_records(["a", "x", "y"]))
+        patterns = access_patterns.file_access_patterns()
+        np.testing.assert_array_equal([0], patterns.follows)
+        np.testing.assert_array_equal([0], patterns.scans)
+
+    def test_co_accessed_blocks(self):
+        access_patterns = AccessPatterns(window=1)
+        access_patterns.add_records(_create_records(["a", "b", "a", "b", "c", "c"]))
+        self.assertEqual([(("a", "b"), 3, 0), (("b", "c"), 1, 0)], access_patterns.co_accessed_blocks())
+        self.assertEqual([(("a", "b"), 3, 0)], access_patterns.co_accessed_blocks(1))
+
+    def test_deletes_are_not_accesses(self):
+        self.access_patterns.add_records([CacheMissRecord("a0", 0, _SIZE), CacheDeleteRecord("a0", 1),
+                                          CacheDeleteRecord("a1", 2)])
+        self.assertEqual(1, self.access_patterns.total_accesses)
+        np.testing.assert_array_equal([1, 0], self.access_patterns.file_access_patterns().accesses)
+
+    def test_add_columns_matches_add_records(self):
+        records = _create_records(["a0", "x", "a1", "a2", "b0", "a3", "b1", "x", "b2", "a0"], miss_every=3)
+        records.insert(4, CacheDeleteRecord("a1", 3))
+        self.access_patterns.add_records(records)
+        access_patterns = AccessPatterns(window=2, minimum_scan_length=3)
+        access_patterns.register_file(self.file)
+        access_patterns.register_file(self.other_file)
+        access_patterns.add_columns(ColumnarRecordCollection(records).columns)
+        for expected, actual in zip(self.access_patterns.file_access_patterns()[1:],
+                                    access_patterns.file_access_patterns()[1:]):
+            np.testing.assert_array_equal(expected, actual)
+        self.assertEqual(self.access_patterns.co_accessed_blocks(), access_patterns.co_accessed_blocks())
+
+    def test_register_file_again(self):
+        self.access_patterns.register_file(self.file)
+        self.access_patterns.add_records(_create_records(["a0"]))
+        self.assertEqual(2, len(self.access_patterns.files))
+        np.testing.assert_array_equal([1, 0], self.access_patterns.file_access_patterns().accesses)
+
+    def test_window_must_be_positive(self):
+        self.assertRaises(ValueError, AccessPatterns, 0)
+
+    def test_report(self):
+        self.access_patterns.add_records(_create_records(["a0", "a1", "a2", "b0", "b1"]))
+        report = self.access_patterns.report()
+        self.assertIn("Files sorted by number of sequential scans", report)
+        self.assertIn("Accesses in sequential scans: 3 of 5", report)
+        self.assertIn("Next block followed: 3 of 3 opportunities", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
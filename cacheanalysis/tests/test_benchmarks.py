@@ -0,0 +1,73 @@
+import unittest
+from collections import Counter
+
+from cacheanalysis.benchmarks.pipeline import compare_results
+from cacheanalysis.benchmarks.synthetic_traces import generate_trace, to_json_dict
+from cacheanalysis.collections import HIT_EVENT, MISS_EVENT, DELETE_EVENT, NO_BLOCK_SIZE
+from cacheanalysis.json_converters import RecordJSONDecoder
+
+
+class TestGenerateTrace(unittest.TestCase):
+    """
+    Unit tests for `generate_trace`.
+    """
+    def setUp(self):
+        self.trace = generate_trace(5000, number_of_blocks=300, cache_capacity=50)
+
+    def test_number_of_records(self):
+        self.assertEqual(5000, len(self.trace.columns.block_ids))
+
+    def test_blocks_are_each_in_one_file(self):
+        counts = Counter(block_hash for file in self.trace.files for block_hash in file.block_hashes)
+        self.assertEqual(set(self.trace.columns.block_hashes), set(counts.keys()))
+        self.assertEqual({1}, set(counts.values()))
+
+    def test_events_follow_cache(self):
+        cached = set()
+        columns = self.trace.columns
+        for block_id, event_type, block_size in zip(columns.block_ids.tolist(), columns.event_types.tolist(),
+                                                    columns.block_sizes.tolist()):
+            if event_type == HIT_EVENT:
+                self.assertIn(block_id, cached)
+            elif event_type == MISS_EVENT:
+                self.assertNotIn(block_id, cached)
+                self.assertGreater(block_size, 0)
+                cached.add(block_id)
+            else:
+                self.assertEqual(DELETE_EVENT, event_type)
+                cached.remove(block_id)
+            if event_type != MISS_EVENT:
+                self.assertEqual(NO_BLOCK_SIZE, block_size)
+            self.assertLessEqual(len(cached), 51)
+
+    def test_timestamps_are_in_order(self):
+        timestamps = self.trace.columns.timestamps
+        self.assertTrue((timestamps[1:] >= timestamps[:-1]).all())
+
+    def test_same_seed_gives_same_trace(self):
+        other = generate_trace(5000, number_of_blocks=300, cache_capacity=50)
+        self.assertEqual(self.trace.columns.block_ids.tolist(), other.columns.block_ids.tolist())
+        self.assertEqual(self.trace.reference_files, other.reference_files)
+
+    def test_to_json_dict_decodes(self):
+        json_as_dict = to_json_dict(self.trace)
+        records = RecordJSONDecoder(epoch_nanoseconds=True).decode_parsed(json_as_dict["records"])
+        self.assertEqual(5000, len(records))
+        self.assertEqual(self.trace.columns.block_hashes[int(self.trace.columns.block_ids[0])], records[0].block_hash)
+        self.assertEqual(len(self.trace.reference_files), len(json_as_dict["references"]))
+
+
+class TestCompareResults(unittest.TestCase):
+    """
+    Unit tests for `compare_results`.
+    """
+    def test_compare_results(self):
+        baseline = {"results": {"10": {"decode": {"seconds": 1.0}, "plot": {"seconds": 2.0}}}}
+        current = {"results": {"10": {"decode": {"seconds": 1.5}, "plot": {"seconds": 1.0}, "other": {"seconds": 1}},
+                               "20": {"decode": {"seconds": 1.0}}}}
+        self.assertEqual([[10, "decode", 1.0, 1.5, 0.5, "slower"], [10, "plot", 2.0, 1.0, -0.5, "faster"]],
+                         compare_results(baseline, current))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
+import timeit
 import unittest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
 
-from cacheanalysis.collections import RecordCollection
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection, HIT_EVENT, MISS_EVENT, \
+    DELETE_EVENT, NO_BLOCK_SIZE
 from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
 
 _BLOCK_HASH_1 = "123"
@@ -15,6 +18,8 @@ class TestRecordCollection(unittest.TestCase):
     """
     Unit tests for `RecordCollection`.
     """
+    record_collection_type = RecordCollection
+
     def setUp(self):
         self.records = [
             CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
@@ -25,20 +30,34 @@ class TestRecordCollection(unittest.TestCase):
             CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=4)),
             CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=5))
         ]
-        self.record_collection = RecordCollection()
+        self.record_collection = self.record_collection_type()
         for record in self.records:
             self.record_collection.add_record(record)
 
     def test_contains_without_records(self):
-        self.assertCountEqual([], RecordCollection())
-        self.assertNotIn(self.records[0], RecordCollection())
+        self.assertCountEqual([], self.record_collection_type())
+        self.assertNotIn(self.records[0], self.record_collection_type())
 
     def test_contains_with_records(self):
         self.assertCountEqual(self.records, self.record_collection)
         self.assertIn(self.records[0], self.record_collection)
 
+    def test_contains_is_constant_time(self):
+        small_collection = self._create_hot_block_collection(100)
+        large_collection = self._create_hot_block_collection(100000)
+        record = self.records[0]
+        small_collection.add_record(record)
+        large_collection.add_record(record)
+        self.assertIn(record, small_collection)
+        self.assertIn(record, large_collection)
+
+        def time_contains(collection):
+            return min(timeit.repeat(lambda: record in collection, number=100, repeat=5))
+        # With a linear scan of the block's records, the large collection takes ~1000 times longer
+        self.assertLess(time_contains(large_collection), 10 * time_contains(small_collection))
+
     def test_iterate_without_records(self):
-        self.assertCountEqual(set(), set(RecordCollection()))
+        self.assertCountEqual(set(), set(self.record_collection_type()))
 
     def test_iterate_with_records(self):
         self.assertCountEqual(set(self.records), set(self.record_collection))
@@ -52,6 +71,146 @@ class TestRecordCollection(unittest.TestCase):
     def test_get_block_deletes(self):
         self.assertEqual(1, len(self.record_collection.get_block_deletes(_BLOCK_HASH_1)))
 
+    def test_repeated_events_are_all_kept(self):
+        record_collection = self.record_collection_type([
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP)
+        ])
+        self.assertEqual(3, len(record_collection))
+        self.assertEqual(3, len(list(record_collection)))
+        self.assertEqual([CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP)] * 2,
+                         list(record_collection.get_block_hits(_BLOCK_HASH_1)))
+        self.assertEqual(3, len(record_collection.get_records_in_time_order()))
+        self.assertEqual(3, len(record_collection.get_block_records_in_time_order(_BLOCK_HASH_1)))
+        self.assertEqual([[2, 1, 0]], record_collection.get_block_event_counts().counts.tolist())
+        self.assertEqual(3, len(record_collection.columns.block_ids))
+
+    def test_get_block_records_when_not_loaded(self):
+        self.assertEqual(0, len(self.record_collection.get_block_hits(_BLOCK_HASH_3)))
+
+    def test_get_records_in_time_order(self):
+        self.assertEqual(sorted(self.records, key=attrgetter("timestamp")),
+                         list(self.record_collection.get_records_in_time_order()))
+
+    def test_get_records_in_time_order_in_window(self):
+        records = self.record_collection.get_records_in_time_order(
+            _TIMESTAMP + timedelta(days=1), _TIMESTAMP + timedelta(days=4))
+        self.assertEqual(self.records[2:5], list(records))
+
+    def test_get_records_in_time_order_after_adding_record(self):
+        self.record_collection.get_records_in_time_order()
+        record = CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(hours=1))
+        self.record_collection.add_record(record)
+        self.assertEqual(record, self.record_collection.get_records_in_time_order()[2])
+
+    def test_get_block_records_in_time_order(self):
+        self.assertEqual([self.records[0]] + self.records[2:],
+                         list(self.record_collection.get_block_records_in_time_order(_BLOCK_HASH_1)))
+        self.assertEqual([], list(self.record_collection.get_block_records_in_time_order(_BLOCK_HASH_3)))
+
+    def test_get_block_records_in_time_order_in_window(self):
+        records = self.record_collection.get_block_records_in_time_order(
+            _BLOCK_HASH_1, start=_TIMESTAMP + timedelta(days=4))
+        self.assertEqual(self.records[5:], list(records))
+        records = self.record_collection.get_block_records_in_time_order(
+            _BLOCK_HASH_1, end=_TIMESTAMP + timedelta(days=1))
+        self.assertEqual(self.records[0:1], list(records))
+
+    def test_get_block_records_in_time_order_after_adding_record(self):
+        self.record_collection.get_block_records_in_time_order(_BLOCK_HASH_2)
+        record = CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(hours=1))
+        self.record_collection.add_record(record)
+        self.assertEqual(record, self.record_collection.get_block_records_in_time_order(_BLOCK_HASH_2)[-1])
+
+    def test_get_block_event_counts(self):
+        event_counts = self.record_collection.get_block_event_counts()
+        index = list(event_counts.block_hashes).index(_BLOCK_HASH_1)
+        self.assertEqual([3, 2, 1], list(event_counts.counts[index, [HIT_EVENT, MISS_EVENT, DELETE_EVENT]]))
+        self.assertEqual(2 * _SIZE, event_counts.bytes_missed[index])
+
+    def test_columns(self):
+        columns = self.record_collection.columns
+        self.assertEqual(len(self.records), len(columns.block_ids))
+        self.assertTrue(all(columns.timestamps[1:] >= columns.timestamps[:-1]))
+        self.assertEqual(_BLOCK_HASH_1, columns.block_hashes[columns.block_ids[0]])
+        self.assertEqual(MISS_EVENT, columns.event_types[0])
+        self.assertEqual(_SIZE, columns.block_sizes[0])
+        self.assertEqual(NO_BLOCK_SIZE, columns.block_sizes[-1])
+
+    def test_len(self):
+        self.assertEqual(len(self.records), len(self.record_collection))
+
+    def test_block_hashes(self):
+        self.assertCountEqual([_BLOCK_HASH_1, _BLOCK_HASH_2], self.record_collection.block_hashes)
+
+    def _create_hot_block_collection(self, number_of_hits: int):
+        record_collection = self.record_collection_type()
+        for i in range(number_of_hits):
+            record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(seconds=i, days=10)))
+        return record_collection
+
+
+class TestColumnarRecordCollection(TestRecordCollection):
+    """
+    Unit tests for `ColumnarRecordCollection`.
+    """
+    record_collection_type = ColumnarRecordCollection
+
+    def test_contains_with_records(self):
+        super().test_contains_with_records()
+        self.assertNotIn(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE + 1), self.record_collection)
+        self.assertNotIn(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP), self.record_collection)
+
+    def test_iterate_with_records(self):
+        self.assertEqual(sorted(self.records, key=attrgetter("timestamp")), list(self.record_collection))
+
+    def test_add_record_after_retrieval(self):
+        self.assertEqual(2, len(self.record_collection.get_block_misses(_BLOCK_HASH_1)))
+        self.record_collection.add_record(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP - timedelta(days=1), _SIZE))
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP))
+        self.assertEqual(3, len(self.record_collection.get_block_misses(_BLOCK_HASH_1)))
+        self.assertEqual(1, len(self.record_collection.get_block_hits(_BLOCK_HASH_3)))
+        self.assertEqual(_TIMESTAMP - timedelta(days=1), next(iter(self.record_collection)).timestamp)
+
+    def test_add_records_out_of_order_between_retrievals(self):
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=2)))
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=6)))
+        self.assertEqual(9, len(self.record_collection.columns.timestamps))
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=7)))
+        self.assertEqual(sorted(self.records + [CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=2)),
+                                                CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=6)),
+                                                CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=7))],
+                                key=attrgetter("timestamp")),
+                         list(self.record_collection))
+
+    def test_add_records_from_columns(self):
+        record_collection = ColumnarRecordCollection.from_columns(self.record_collection.columns,
+                                                                  datetime_timestamps=True)
+        record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP - timedelta(days=1)))
+        self.assertEqual(len(self.records) + 1, len(record_collection))
+        self.assertEqual(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP - timedelta(days=1)), next(iter(record_collection)))
+        self.assertEqual(len(self.records), len(self.record_collection.columns.timestamps))
+
+    def test_alternating_adds_and_retrievals_are_amortised_constant_time(self):
+        def time_adds_and_retrievals(number_of_records):
+            record_collection = ColumnarRecordCollection()
+            start = timeit.default_timer()
+            for i in range(number_of_records):
+                record_collection.add_record(CacheHitRecord(_BLOCK_HASH_1, i))
+                record_collection.columns
+            return timeit.default_timer() - start
+        # If the columns were copied on every retrieval, 10 times as many records would take ~100 times longer
+        self.assertLess(time_adds_and_retrievals(20000), 30 * time_adds_and_retrievals(2000))
+
+    def test_add_record_with_other_type_of_timestamp(self):
+        self.assertRaises(ValueError, self.record_collection.add_record, CacheHitRecord(_BLOCK_HASH_1, 0))
+        self.assertRaises(ValueError, self.record_collection.add_record,
+                          CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP.replace(tzinfo=timezone.utc)))
+        record_collection = ColumnarRecordCollection([CacheHitRecord(_BLOCK_HASH_1, 0)])
+        self.assertRaises(ValueError, record_collection.add_record, CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP))
+        self.assertEqual(1, len(record_collection))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from cacheanalysis.file_index import BlockFileIndex
+from cacheanalysis.models import BlockFile
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+
+
+class TestBlockFileIndex(unittest.TestCase):
+    """
+    Unit tests for `BlockFileIndex`.
+    """
+    def setUp(self):
+        self.file_1 = BlockFile("file_1", [_BLOCK_HASH_1, _BLOCK_HASH_2])
+        self.file_2 = BlockFile("file_2", [_BLOCK_HASH_2, _BLOCK_HASH_3, _BLOCK_HASH_2])
+        self.index = BlockFileIndex()
+        self.index.add_file(self.file_1)
+        self.index.add_file(self.file_2)
+
+    def test_contains(self):
+        self.assertIn(_BLOCK_HASH_3, self.index)
+        self.assertNotIn("other", self.index)
+
+    def test_add_file_again(self):
+        self.index.add_file(BlockFile("file_1", [_BLOCK_HASH_1, _BLOCK_HASH_2]))
+        self.assertEqual(2, len(self.index))
+
+    def test_ids(self):
+        self.assertEqual(1, self.index.get_file_id(self.file_2))
+        self.assertEqual(2, self.index.get_block_id(_BLOCK_HASH_3))
+        self.assertIsNone(self.index.get_block_id("other"))
+
+    def test_file_membership(self):
+        np.testing.assert_array_equal([0, 2, 4], self.index.file_offsets)
+        np.testing.assert_array_equal([0, 1, 1, 2], self.index.file_block_ids)
+
+    def test_block_membership(self):
+        np.testing.assert_array_equal([0, 1, 3, 4], self.index.block_offsets)
+        np.testing.assert_array_equal([0, 0, 1, 1], self.index.block_file_ids)
+
+    def test_get_files(self):
+        self.assertEqual([self.file_1, self.file_2], self.index.get_files(_BLOCK_HASH_2))
+        self.assertEqual([], self.index.get_files("other"))
+
+    def test_get_files_after_adding_file(self):
+        self.index.get_files(_BLOCK_HASH_1)
+        file_3 = BlockFile("file_3", [_BLOCK_HASH_1])
+        self.index.add_file(file_3)
+        self.assertEqual([self.file_1, file_3], self.index.get_files(_BLOCK_HASH_1))
+
+    def test_sum_over_files(self):
+        np.testing.assert_array_equal([3, 5], self.index.sum_over_files(np.array([1, 2, 3])))
+
+
+if __name__ == "__main__":
+    unittest.main()
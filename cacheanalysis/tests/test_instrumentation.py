@@ -0,0 +1,123 @@
+import unittest
+
+from cacheanalysis.instrumentation import Instrumentation, instrumentation, timed, stage, increment, PROFILE_ALL
+from cacheanalysis.json_converters import RecordJSONDecoder
+from cacheanalysis.timestamps import TimestampParser
+
+
+class _Timed:
+    """
+    Class with a timed method.
+    """
+    @timed()
+    def calculate(self, value: int) -> int:
+        return value * 2
+
+    @timed("named stage")
+    def calculate_named(self) -> int:
+        return self.calculate(1)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Unit tests for `Instrumentation`.
+    """
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+
+    def test_stage_when_disabled(self):
+        with self.instrumentation.stage("stage") as timed_stage:
+            timed_stage.add_items(10)
+        self.assertEqual(0, len(self.instrumentation.stages))
+
+    def test_stage(self):
+        self.instrumentation.enable()
+        for _ in range(2):
+            with self.instrumentation.stage("stage") as timed_stage:
+                timed_stage.add_items(10)
+        report = self.instrumentation.report()
+        self.assertEqual(["stage"], [stage["name"] for stage in report["stages"]])
+        self.assertEqual(2, report["stages"][0]["calls"])
+        self.assertEqual(20, report["stages"][0]["items"])
+        self.assertGreater(report["stages"][0]["peak_memory"], 0)
+
+    def test_increment(self):
+        self.instrumentation.increment("counter")
+        self.instrumentation.enable()
+        self.instrumentation.increment("counter")
+        self.instrumentation.increment("counter", 2)
+        self.assertEqual({"counter": 3}, self.instrumentation.report()["counters"])
+
+    def test_call_profiled(self):
+        self.instrumentation.enable(profile=["calculate"])
+        self.assertEqual(4, self.instrumentation.call("Class.calculate", lambda value: value * 2, (2, )))
+        self.assertIsNotNone(self.instrumentation.report()["profile"])
+
+    def test_report_without_profile(self):
+        self.instrumentation.enable()
+        self.assertIsNone(self.instrumentation.report()["profile"])
+
+    def test_reset(self):
+        self.instrumentation.enable()
+        with self.instrumentation.stage("stage"):
+            pass
+        self.instrumentation.reset()
+        self.assertEqual([], self.instrumentation.report()["stages"])
+
+    def test_format_report(self):
+        self.instrumentation.enable()
+        with self.instrumentation.stage("decode"):
+            pass
+        self.instrumentation.increment("counter")
+        report = self.instrumentation.format_report()
+        self.assertIn("decode", report)
+        self.assertIn("counter", report)
+
+
+class TestInstrumentationOfFunctions(unittest.TestCase):
+    """
+    Tests the module-level instrumentation of functions.
+    """
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_timed_when_disabled(self):
+        self.assertEqual(4, _Timed().calculate(2))
+        self.assertEqual(0, len(instrumentation.stages))
+
+    def test_timed(self):
+        instrumentation.enable(profile=[PROFILE_ALL])
+        self.assertEqual(2, _Timed().calculate_named())
+        report = instrumentation.report()
+        self.assertEqual(["named stage", "_Timed.calculate"], [stage["name"] for stage in report["stages"]])
+        self.assertIn("calculate", report["profile"])
+
+    def test_stage_and_increment(self):
+        instrumentation.enable()
+        with stage("stage"):
+            increment("counter")
+        self.assertEqual(1, instrumentation.stages["stage"].calls)
+        self.assertEqual(1, instrumentation.counters["counter"])
+
+    def test_timestamps_parsed_by_dateutil_counted(self):
+        instrumentation.enable()
+        parser = TimestampParser()
+        parser.parse("2016-01-01T00:00:00Z")
+        parser.parse("1 January 2016")
+        self.assertEqual(1, instrumentation.counters["timestamps parsed by dateutil"])
+
+    def test_decoding_stages(self):
+        instrumentation.enable()
+        records_as_json = [{"type": "put", "hash": "123", "timestamp": "2000-01-01T00:00:00Z", "size": 10},
+                           {"type": "get", "hash": "123", "timestamp": "2000-01-02T00:00:00Z"}]
+        RecordJSONDecoder().decode_parsed(records_as_json)
+        self.assertEqual(2, instrumentation.stages["parse timestamps"].items)
+        self.assertEqual(2, instrumentation.stages["create records"].items)
+        RecordJSONDecoder().decode_to_columns(records_as_json)
+        self.assertEqual(4, instrumentation.stages["parse timestamps"].items)
+        self.assertEqual(2, instrumentation.stages["build columns"].items)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import io
+import json
+import unittest
+from datetime import datetime, timezone
+
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.json_converters import RecordJSONDecoder, RecordJSONEncoder, BlockFileJSONDecoder
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_SIZE = 10
+
+_RECORDS_AS_LINES = """\
+{"type": "put", "hash": "%(hash_1)s", "timestamp": "2000-01-01T00:00:00", "size": %(size)d}
+{"type": "get", "hash": "%(hash_1)s", "timestamp": "2000-01-02T00:00:00"}
+
+{"type": "delete", "hash": "%(hash_1)s", "timestamp": "2000-01-03T00:00:00"}
+{"type": "put", "hash": "%(hash_2)s", "timestamp": "2000-01-04T00:00:00", "size": %(size)d}
+""" % {"hash_1": _BLOCK_HASH_1, "hash_2": _BLOCK_HASH_2, "size": _SIZE}
+
+
+class TestRecordJSONDecoder(unittest.TestCase):
+    """
+    Unit tests for `RecordJSONDecoder`.
+    """
+    def setUp(self):
+        self.decoder = RecordJSONDecoder()
+
+    def test_decode_lines_when_empty(self):
+        self.assertEqual([], list(self.decoder.decode_lines(io.StringIO(""))))
+
+    def test_decode_lines(self):
+        records = list(self.decoder.decode_lines(io.StringIO(_RECORDS_AS_LINES)))
+        self.assertEqual([CacheMissRecord, CacheHitRecord, CacheDeleteRecord, CacheMissRecord],
+                         [type(record) for record in records])
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_1, _BLOCK_HASH_1, _BLOCK_HASH_2],
+                         [record.block_hash for record in records])
+        self.assertEqual(_SIZE, records[0].block_size)
+
+    def test_decode_to_collection(self):
+        records_as_json = [json.loads(line) for line in _RECORDS_AS_LINES.splitlines() if len(line) > 0]
+        record_collection = self.decoder.decode_to_collection(records_as_json)
+        expected = ColumnarRecordCollection(self.decoder.decode_parsed(records_as_json))
+        self.assertEqual(list(expected), list(record_collection))
+        self.assertEqual(expected.timestamp_type, record_collection.timestamp_type)
+
+    def test_decode_to_collection_from_bytes(self):
+        records_as_json = "[%s]" % ",".join(line for line in _RECORDS_AS_LINES.splitlines() if len(line) > 0)
+        self.assertEqual(4, len(self.decoder.decode_to_collection(records_as_json.encode("utf-8"))))
+
+    def test_decode_to_collection_with_time_zones(self):
+        records_as_json = [
+            {"type": "get", "hash": _BLOCK_HASH_1, "timestamp": "2000-01-01T02:00:00+01:00"},
+            {"type": "get", "hash": _BLOCK_HASH_2, "timestamp": "2000-01-01T00:30:00Z"}
+        ]
+        record_collection = self.decoder.decode_to_collection(records_as_json)
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_1], [record.block_hash for record in record_collection])
+        self.assertEqual(datetime(2000, 1, 1, 1, tzinfo=timezone.utc), list(record_collection)[1].timestamp)
+
+    def test_decode_to_columns_sorts_by_time(self):
+        columns = RecordJSONDecoder(epoch_nanoseconds=True).decode_to_columns([
+            {"type": "get", "hash": _BLOCK_HASH_1, "timestamp": "2000-01-02T00:00:00"},
+            {"type": "put", "hash": _BLOCK_HASH_2, "timestamp": "2000-01-01T00:00:00", "size": _SIZE}
+        ])
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2], columns.block_hashes)
+        self.assertEqual([1, 0], columns.block_ids.tolist())
+        self.assertEqual([_SIZE, -1], columns.block_sizes.tolist())
+
+    def test_decode_to_columns_when_empty(self):
+        self.assertEqual(0, len(self.decoder.decode_to_columns([]).timestamps))
+
+    def test_decode_lines_is_lazy(self):
+        lines = iter(_RECORDS_AS_LINES.splitlines())
+        records = self.decoder.decode_lines(lines)
+        self.assertIsInstance(next(records), CacheMissRecord)
+        self.assertEqual(4, len(list(lines)))
+
+
+class TestBlockFileJSONDecoder(unittest.TestCase):
+    """
+    Unit tests for `BlockFileJSONDecoder`.
+    """
+    def test_decode_parsed(self):
+        self.assertEqual(BlockFile("file", [_BLOCK_HASH_1]), BlockFileJSONDecoder().decode_parsed(
+            {"name": "file", "block_hashes": [_BLOCK_HASH_1]}))
+
+    def test_decode_parsed_list(self):
+        self.assertEqual([BlockFile("file", [_BLOCK_HASH_1]), BlockFile("other", [])],
+                         BlockFileJSONDecoder().decode_parsed([{"name": "file", "block_hashes": [_BLOCK_HASH_1]},
+                                                               {"name": "other", "block_hashes": []}]))
+
+    def test_decode(self):
+        self.assertEqual([BlockFile("file", [_BLOCK_HASH_1])],
+                         BlockFileJSONDecoder().decode('[{"name": "file", "block_hashes": ["%s"]}]' % _BLOCK_HASH_1))
+
+
+class TestRecordJSONEncoder(unittest.TestCase):
+    """
+    Unit tests for `RecordJSONEncoder`.
+    """
+    def test_encode_decodes_to_same_records(self):
+        records = [
+            CacheMissRecord(_BLOCK_HASH_1, datetime(2000, 1, 1), _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, datetime(2000, 1, 2, microsecond=5)),
+            CacheDeleteRecord(_BLOCK_HASH_2, datetime(2000, 1, 3))
+        ]
+        self.assertEqual(records, RecordJSONDecoder().decode(json.dumps(records, cls=RecordJSONEncoder)))
+
+    def test_encode_epoch_nanoseconds(self):
+        record = CacheHitRecord(_BLOCK_HASH_1, 946684800 * 10 ** 9)
+        self.assertEqual(
+            {"type": "get", "hash": _BLOCK_HASH_1, "timestamp": "2000-01-01T00:00:00Z"},
+            json.loads(json.dumps(record, cls=RecordJSONEncoder)))
+        self.assertEqual([record], RecordJSONDecoder(epoch_nanoseconds=True).decode(
+            json.dumps([record], cls=RecordJSONEncoder)))
+
+
+if __name__ == "__main__":
+    unittest.main()
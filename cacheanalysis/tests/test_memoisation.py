@@ -0,0 +1,147 @@
+import unittest
+from datetime import timedelta
+
+from cacheanalysis.analysis import Analysis
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.memoisation import ResultCache, memoised, get_result_cache
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, BlockFile
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis
+from cacheanalysis.tests.test_statistical_analysis import _BLOCK_HASH_1, _BLOCK_HASH_2, _TIMESTAMP, _SIZE
+
+
+class _CountingAnalysis(Analysis):
+    """
+    Analysis that counts the number of times its results are calculated.
+    """
+    def __init__(self, record_collection):
+        super().__init__(record_collection)
+        self.calculations = 0
+
+    @memoised()
+    def number_of_records(self, offset: int=0):
+        self.calculations += 1
+        return self._count_records() + offset
+
+    @memoised()
+    def number_of_records_of_blocks(self, block_hashes):
+        self.calculations += 1
+        return sum(1 for record in self.record_collection if record.block_hash in block_hashes)
+
+    def _count_records(self):
+        return len(self.record_collection)
+
+
+class _DoubleCountingAnalysis(_CountingAnalysis):
+    """
+    Analysis that calculates its results differently to the analysis that it extends.
+    """
+    def _count_records(self):
+        return 2 * len(self.record_collection)
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Unit tests for `ResultCache`.
+    """
+    def test_get_or_calculate(self):
+        cache = ResultCache()
+        self.assertEqual(1, cache.get_or_calculate("key", 0, lambda: 1))
+        self.assertEqual(1, cache.get_or_calculate("key", 0, lambda: 2))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_get_or_calculate_with_new_version(self):
+        cache = ResultCache()
+        cache.get_or_calculate("key", 0, lambda: 1)
+        self.assertEqual(2, cache.get_or_calculate("key", 1, lambda: 2))
+        self.assertEqual(1, len(cache))
+
+    def test_least_recently_used_discarded(self):
+        cache = ResultCache(max_size=2)
+        cache.get_or_calculate("first", 0, lambda: 1)
+        cache.get_or_calculate("second", 0, lambda: 2)
+        cache.get_or_calculate("first", 0, lambda: 1)
+        cache.get_or_calculate("third", 0, lambda: 3)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get_or_calculate("first", 0, lambda: 4))
+        self.assertEqual(5, cache.get_or_calculate("second", 0, lambda: 5))
+
+
+class TestMemoised(unittest.TestCase):
+    """
+    Unit tests for `memoised`.
+    """
+    def setUp(self):
+        self.record_collection = RecordCollection()
+        self.record_collection.add_record(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE))
+        self.analysis = _CountingAnalysis(self.record_collection)
+
+    def test_result_memoised(self):
+        self.assertEqual(1, self.analysis.number_of_records())
+        self.assertEqual(1, self.analysis.number_of_records())
+        self.assertEqual(1, self.analysis.calculations)
+
+    def test_results_of_different_arguments(self):
+        self.assertEqual(1, self.analysis.number_of_records())
+        self.assertEqual(3, self.analysis.number_of_records(offset=2))
+        self.assertEqual(3, self.analysis.number_of_records(offset=2))
+        self.assertEqual(2, self.analysis.calculations)
+
+    def test_result_shared_between_analyses_of_collection(self):
+        other_analysis = _CountingAnalysis(self.record_collection)
+        self.analysis.number_of_records()
+        other_analysis.number_of_records()
+        self.assertEqual(0, other_analysis.calculations)
+
+    def test_result_not_shared_between_types_of_analysis(self):
+        other_analysis = _DoubleCountingAnalysis(self.record_collection)
+        self.assertEqual(1, self.analysis.number_of_records())
+        self.assertEqual(2, other_analysis.number_of_records())
+        self.assertEqual(1, self.analysis.number_of_records())
+
+    def test_result_recalculated_when_record_added(self):
+        self.analysis.number_of_records()
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1)))
+        self.assertEqual(2, self.analysis.number_of_records())
+        self.assertEqual(2, self.analysis.calculations)
+
+    def test_unhashable_arguments_not_memoised(self):
+        self.assertEqual(1, self.analysis.number_of_records_of_blocks([_BLOCK_HASH_1]))
+        self.assertEqual(1, self.analysis.number_of_records_of_blocks([_BLOCK_HASH_1]))
+        self.assertEqual(2, self.analysis.calculations)
+        self.assertEqual(0, len(get_result_cache(self.record_collection)))
+
+
+class TestMemoisedStatisticalAnalysis(unittest.TestCase):
+    """
+    Tests the memoisation of the results of statistical analyses.
+    """
+    def setUp(self):
+        self.record_collection = RecordCollection()
+        self.record_collection.add_record(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE))
+        self.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1)))
+        self.record_collection.add_record(CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(hours=2), _SIZE))
+
+    def test_block_statistics_shared_between_analyses(self):
+        statistics = StatisticalBlockAnalysis(self.record_collection).block_statistics()
+        self.assertIs(statistics, StatisticalBlockAnalysis(self.record_collection).block_statistics())
+
+    def test_file_statistics_recalculated_when_file_registered(self):
+        analysis = StatisticalBlockFileAnalysis(self.record_collection)
+        analysis.register_file(BlockFile("file", [_BLOCK_HASH_1]))
+        self.assertEqual(1.0, analysis.known_file_block_hit_to_miss_proportion())
+        self.assertEqual(1, len(analysis.file_statistics().files))
+        analysis.register_file(BlockFile("other", [_BLOCK_HASH_2]))
+        self.assertEqual(0.5, analysis.known_file_block_hit_to_miss_proportion())
+        self.assertEqual(2, len(analysis.file_statistics().files))
+
+    def test_file_statistics_not_shared_between_analyses_with_different_files(self):
+        analysis = StatisticalBlockFileAnalysis(self.record_collection)
+        analysis.register_file(BlockFile("file", [_BLOCK_HASH_1]))
+        other_analysis = StatisticalBlockFileAnalysis(self.record_collection)
+        other_analysis.register_file(BlockFile("other", [_BLOCK_HASH_2]))
+        self.assertEqual(1.0, analysis.known_file_block_hit_to_miss_proportion())
+        self.assertEqual(0.0, other_analysis.known_file_block_hit_to_miss_proportion())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import random
+import unittest
+
+import numpy as np
+
+from cacheanalysis.miss_ratio_curves import lru_miss_ratio_curves, miss_ratio_at
+from cacheanalysis.simulation import Accesses, LRUPolicy, replay
+
+_SIZE = 10
+
+
+def _create_accesses(block_ids, block_sizes=None):
+    block_ids = np.array(block_ids, dtype=np.int64)
+    if block_sizes is None:
+        block_sizes = np.full(len(block_ids), _SIZE, dtype=np.int64)
+    return Accesses(["block-%d" % i for i in range(max(block_ids.tolist(), default=-1) + 1)], block_ids,
+                    np.array(block_sizes, dtype=np.int64))
+
+
+class TestLRUMissRatioCurves(unittest.TestCase):
+    """
+    Unit tests for `lru_miss_ratio_curves`.
+    """
+    def setUp(self):
+        generator = random.Random(0)
+        self.block_ids = [int(generator.paretovariate(0.8)) % 500 for _ in range(5000)]
+        self.accesses = _create_accesses(self.block_ids, [_SIZE * (1 + block_id % 5) for block_id in self.block_ids])
+
+    def test_curves_when_no_accesses(self):
+        object_curve, byte_curve = lru_miss_ratio_curves(_create_accesses([]))
+        self.assertEqual(0, len(object_curve.capacities))
+        self.assertEqual(1.0, miss_ratio_at(byte_curve, 100))
+
+    def test_object_curve(self):
+        object_curve, _ = lru_miss_ratio_curves(_create_accesses([0, 1, 0, 2, 1, 0]))
+        # Stack distances: cold, cold, 1, cold, 2, 2
+        self.assertEqual(1.0, miss_ratio_at(object_curve, 1))
+        self.assertEqual(5 / 6, miss_ratio_at(object_curve, 2))
+        self.assertEqual(3 / 6, miss_ratio_at(object_curve, 3))
+        self.assertEqual(3 / 6, miss_ratio_at(object_curve, 100))
+
+    def test_object_curve_matches_simulation(self):
+        object_curve, _ = lru_miss_ratio_curves(_create_accesses(self.block_ids))
+        for capacity in (1, 2, 10, 50, 200, 1000):
+            result = replay(_create_accesses(self.block_ids), LRUPolicy(capacity * _SIZE))
+            self.assertAlmostEqual(1 - result.hit_ratio, miss_ratio_at(object_curve, capacity))
+
+    def test_byte_curve_matches_simulation(self):
+        _, byte_curve = lru_miss_ratio_curves(self.accesses)
+        # The simulator never loads blocks larger than the cache, so start from the largest block
+        for capacity in (5 * _SIZE, 100 * _SIZE, 1000 * _SIZE):
+            result = replay(self.accesses, LRUPolicy(capacity))
+            self.assertAlmostEqual(1 - result.byte_hit_ratio, miss_ratio_at(byte_curve, capacity))
+
+    def test_sampled_curve_approximates_curve(self):
+        generator = random.Random(1)
+        block_ids = [generator.randrange(2000) for _ in range(20000)]
+        object_curve, _ = lru_miss_ratio_curves(_create_accesses(block_ids))
+        sampled_object_curve, _ = lru_miss_ratio_curves(_create_accesses(block_ids), sampling_rate=0.25)
+        for capacity in (200, 1000, 1800):
+            self.assertAlmostEqual(miss_ratio_at(object_curve, capacity),
+                                   miss_ratio_at(sampled_object_curve, capacity), delta=0.05)
+
+    def test_invalid_sampling_rate(self):
+        self.assertRaises(ValueError, lru_miss_ratio_curves, self.accesses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime
+
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+
+
+class TestRecord(unittest.TestCase):
+    """
+    Unit tests for `Record` and its subclasses.
+    """
+    def test_equal_when_same_event(self):
+        self.assertEqual(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP), CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP))
+        self.assertEqual(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+                         CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE))
+        self.assertEqual(hash(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE)),
+                         hash(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE)))
+
+    def test_not_equal_when_different_event(self):
+        self.assertNotEqual(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP), CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP))
+        self.assertNotEqual(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP), CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP))
+        self.assertNotEqual(CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+                            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE + 1))
+
+    def test_immutable(self):
+        record = CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE)
+        self.assertRaises(AttributeError, setattr, record, "block_size", _SIZE + 1)
+        self.assertRaises(AttributeError, setattr, record, "other", 1)
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_block_hashes_interned(self):
+        block_hash = "".join([_BLOCK_HASH_1, _BLOCK_HASH_2])
+        other_block_hash = "".join([_BLOCK_HASH_1, _BLOCK_HASH_2])
+        self.assertIsNot(block_hash, other_block_hash)
+        self.assertIs(CacheHitRecord(block_hash, _TIMESTAMP).block_hash,
+                      CacheDeleteRecord(other_block_hash, _TIMESTAMP).block_hash)
+
+
+class TestBlockFile(unittest.TestCase):
+    """
+    Unit tests for `BlockFile`.
+    """
+    def test_equal_when_same_file(self):
+        self.assertEqual(BlockFile("file", [_BLOCK_HASH_1, _BLOCK_HASH_2]),
+                         BlockFile("file", (_BLOCK_HASH_1, _BLOCK_HASH_2)))
+        self.assertEqual(1, len({BlockFile("file", [_BLOCK_HASH_1]), BlockFile("file", [_BLOCK_HASH_1])}))
+
+    def test_not_equal_when_different_file(self):
+        self.assertNotEqual(BlockFile("file", [_BLOCK_HASH_1]), BlockFile("other", [_BLOCK_HASH_1]))
+        self.assertNotEqual(BlockFile("file", [_BLOCK_HASH_1]), BlockFile("file", [_BLOCK_HASH_2]))
+
+    def test_immutable(self):
+        self.assertRaises(AttributeError, setattr, BlockFile("file", []), "name", "other")
+
+
+if __name__ == "__main__":
+    unittest.main()
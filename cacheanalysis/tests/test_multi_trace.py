@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
+from cacheanalysis.multi_trace import merge_records, merge_traces, merge_columns, summarise_trace, \
+    summarise_traces, combine_summaries, compare_block_hit_ratios, format_summaries, load_sources, main
+from cacheanalysis.trace_files import write_trace
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_SIZE = 10
+
+
+class TestMergingTraces(unittest.TestCase):
+    """
+    Unit tests for merging traces.
+    """
+    def setUp(self):
+        self.records_a = [
+            CacheMissRecord(_BLOCK_HASH_1, 1, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, 3),
+            CacheDeleteRecord(_BLOCK_HASH_1, 5)
+        ]
+        self.records_b = [
+            CacheMissRecord(_BLOCK_HASH_2, 2, _SIZE * 2),
+            CacheMissRecord(_BLOCK_HASH_1, 3, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_2, 6)
+        ]
+        self.records_c = [
+            CacheMissRecord(_BLOCK_HASH_3, 0, _SIZE * 3),
+            CacheHitRecord(_BLOCK_HASH_3, 4)
+        ]
+        self.record_collections = OrderedDict([
+            ("a", ColumnarRecordCollection(self.records_a)),
+            ("b", RecordCollection(self.records_b)),
+            ("c", ColumnarRecordCollection(self.records_c))
+        ])
+        self.expected = [
+            ("c", self.records_c[0]), ("a", self.records_a[0]), ("b", self.records_b[0]), ("a", self.records_a[1]),
+            ("b", self.records_b[1]), ("c", self.records_c[1]), ("a", self.records_a[2]), ("b", self.records_b[2])
+        ]
+
+    def test_merge_records(self):
+        self.assertEqual(self.expected, list(merge_records(self.record_collections)))
+
+    def test_merge_traces(self):
+        merged = merge_traces(self.record_collections)
+        self.assertEqual(["a", "b", "c"], merged.sources)
+        self.assertEqual([record for _, record in self.expected], list(merged.record_collection))
+        self.assertEqual([merged.sources.index(tag) for tag, _ in self.expected], merged.source_ids.tolist())
+
+    def test_merge_traces_unites_blocks(self):
+        merged = merge_traces(self.record_collections)
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3], merged.record_collection.columns.block_hashes)
+        self.assertEqual(3, len(merged.record_collection.get_block_misses(_BLOCK_HASH_1)) +
+                         len(merged.record_collection.get_block_hits(_BLOCK_HASH_1)))
+
+    def test_merge_columns_of_many_traces(self):
+        random_state = np.random.RandomState(0)
+        collections = [ColumnarRecordCollection(
+            CacheHitRecord(str(block), int(timestamp))
+            for block, timestamp in zip(random_state.randint(0, 20, size), np.sort(random_state.randint(0, 100, size))))
+            for size in (50, 0, 7, 100, 1, 30)]
+        columns, source_ids = merge_columns([collection.columns for collection in collections])
+        self.assertTrue(np.all(np.diff(columns.timestamps) >= 0))
+        for source_id, collection in enumerate(collections):
+            in_source = source_ids == source_id
+            self.assertEqual(collection.columns.timestamps.tolist(), columns.timestamps[in_source].tolist())
+            self.assertEqual([collection.columns.block_hashes[block_id] for block_id in collection.columns.block_ids],
+                             [columns.block_hashes[block_id] for block_id in columns.block_ids[in_source]])
+        # Events at the same time are in the order of their traces
+        same_time = np.flatnonzero(np.diff(columns.timestamps) == 0)
+        self.assertTrue(np.all(source_ids[same_time] <= source_ids[same_time + 1]))
+
+    def test_merge_nothing(self):
+        merged = merge_traces(OrderedDict())
+        self.assertEqual(0, len(merged.record_collection))
+        self.assertEqual(0, len(merged.source_ids))
+
+
+class TestTraceSummaries(unittest.TestCase):
+    """
+    Unit tests for summarising and comparing traces.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.run_a = ColumnarRecordCollection([
+            CacheMissRecord(_BLOCK_HASH_1, 1, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, 2),
+            CacheHitRecord(_BLOCK_HASH_1, 3),
+            CacheMissRecord(_BLOCK_HASH_2, 4, _SIZE * 2),
+            CacheDeleteRecord(_BLOCK_HASH_2, 5)
+        ])
+        self.run_b = RecordCollection([
+            CacheMissRecord(_BLOCK_HASH_1, 2, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, 3),
+            CacheMissRecord(_BLOCK_HASH_3, 4, _SIZE * 3),
+            CacheHitRecord(_BLOCK_HASH_3, 10)
+        ])
+        self.path = os.path.join(self.directory, "run_b.trace")
+        write_trace(self.path, self.run_b)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_summarise_trace(self):
+        summary = summarise_trace(self.run_a)
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2], summary.event_counts.block_hashes)
+        self.assertEqual([[2, 1, 0], [0, 1, 1]], summary.event_counts.counts.tolist())
+        self.assertEqual([_SIZE, _SIZE * 2], summary.event_counts.bytes_missed.tolist())
+        self.assertEqual((1, 5), (summary.start, summary.end))
+
+    def test_summarise_empty_trace(self):
+        summary = summarise_trace(ColumnarRecordCollection())
+        self.assertEqual((None, None), (summary.start, summary.end))
+        self.assertEqual(0, len(summary.event_counts.block_hashes))
+
+    def test_summarise_traces_in_parallel(self):
+        sources = OrderedDict([("a", self.run_a), ("b", self.path)])
+        serial = summarise_traces(sources, processes=1)
+        parallel = summarise_traces(sources, processes=2)
+        self.assertEqual(["a", "b"], list(parallel.keys()))
+        for tag in sources:
+            self.assertEqual(serial[tag].event_counts.block_hashes, parallel[tag].event_counts.block_hashes)
+            np.testing.assert_array_equal(serial[tag].event_counts.counts, parallel[tag].event_counts.counts)
+            self.assertEqual((serial[tag].start, serial[tag].end), (parallel[tag].start, parallel[tag].end))
+        np.testing.assert_array_equal(summarise_trace(self.run_b).event_counts.counts, serial["b"].event_counts.counts)
+
+    def test_combined_summaries_match_summary_of_merged_trace(self):
+        combined = combine_summaries([summarise_trace(self.run_a), summarise_trace(self.run_b)])
+        merged = summarise_trace(merge_traces(OrderedDict([("a", self.run_a), ("b", self.run_b)])).record_collection)
+        self.assertEqual(merged.event_counts.block_hashes, combined.event_counts.block_hashes)
+        np.testing.assert_array_equal(merged.event_counts.counts, combined.event_counts.counts)
+        np.testing.assert_array_equal(merged.event_counts.bytes_missed, combined.event_counts.bytes_missed)
+        self.assertEqual((1, 10), (combined.start, combined.end))
+
+    def test_compare_block_hit_ratios(self):
+        comparison = compare_block_hit_ratios(summarise_trace(self.run_a), summarise_trace(self.run_b))
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3], comparison.block_hashes)
+        np.testing.assert_array_equal([2 / 3, 0.0, np.nan], comparison.hit_ratios_a)
+        np.testing.assert_array_equal([0.5, np.nan, 0.5], comparison.hit_ratios_b)
+        np.testing.assert_array_almost_equal([0.5 - 2 / 3, np.nan, np.nan], comparison.differences)
+
+    def test_format_summaries(self):
+        table = format_summaries(OrderedDict([("a", summarise_trace(self.run_a)), ("b", summarise_trace(self.run_b))]))
+        self.assertEqual(["a", "b", "(all)"], [line.split()[0] for line in table.splitlines()[2:]])
+
+    def test_load_sources(self):
+        record_collections = load_sources(OrderedDict([("a", self.run_a), ("b", self.path)]))
+        self.assertIs(self.run_a, record_collections["a"])
+        self.assertEqual(list(self.run_b.get_records_in_time_order()), list(record_collections["b"]))
+
+    def test_main(self):
+        path_a = os.path.join(self.directory, "run_a.trace")
+        write_trace(path_a, self.run_a)
+        main(["a=%s" % path_a, "b=%s" % self.path, "--compare", "a", "b", "--processes", "1"])
@@ -0,0 +1,95 @@
+import random
+import unittest
+from datetime import timedelta
+
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+from cacheanalysis.online_analysis import OnlineStatisticalBlockAnalysis, OnlineStatisticalBlockFileAnalysis
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis
+from cacheanalysis.tests import test_statistical_analysis
+from cacheanalysis.tests.test_statistical_analysis import _BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3, _TIMESTAMP, \
+    _SIZE
+
+
+class TestOnlineStatisticalBlockAnalysis(test_statistical_analysis.TestStatisticalBlockAnalysis):
+    """
+    Unit tests for `OnlineStatisticalBlockAnalysis`.
+    """
+    analysis_type = OnlineStatisticalBlockAnalysis
+
+    def test_add_record(self):
+        self.analysis.add_record(CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        self.assertEqual(1, self.analysis.total_block_hits(_BLOCK_HASH_2))
+        self.assertEqual(1, self.analysis.mean_block_hits(_BLOCK_HASH_2))
+        self.assertEqual(len(self.records) + 1, len(self.analysis.record_collection))
+
+    def test_add_record_reloading_block(self):
+        self.analysis.add_record(CacheDeleteRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        self.assertIsNone(self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_2))
+        self.analysis.add_record(CacheMissRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=12), _SIZE))
+        self.analysis.add_record(CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=13), _SIZE))
+        self.assertEqual(1, self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_2))
+
+    def test_block_still_deleted_counts_misses_since_deletion(self):
+        self.assertEqual(0, self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_3))
+        self.analysis.add_record(CacheDeleteRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=11)))
+        self.analysis.add_record(CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=12), _SIZE))
+        self.assertEqual(0.5, self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_3))
+
+    def test_matches_batch_analysis(self):
+        generator = random.Random(0)
+        record_collection = RecordCollection()
+        online_analysis = self.analysis_type(RecordCollection())
+        for i in range(1000):
+            block_hash = str(generator.randrange(50))
+            record_type = generator.choice((CacheHitRecord, CacheMissRecord, CacheDeleteRecord))
+            timestamp = _TIMESTAMP + timedelta(seconds=i)
+            record = CacheMissRecord(block_hash, timestamp, generator.randrange(1, 100)) \
+                if record_type == CacheMissRecord else record_type(block_hash, timestamp)
+            record_collection.add_record(record)
+            online_analysis.add_record(record)
+        batch_analysis = StatisticalBlockAnalysis(record_collection)
+        self.assertEqual(batch_analysis.all_mean_other_block_misses_between_reload(),
+                         online_analysis.all_mean_other_block_misses_between_reload())
+        for block_hash in record_collection.block_hashes:
+            self.assertEqual(batch_analysis.mean_block_hits(block_hash), online_analysis.mean_block_hits(block_hash))
+
+
+class TestOnlineStatisticalBlockFileAnalysis(test_statistical_analysis.TestStatisticalBlockFileAnalysis):
+    """
+    Unit tests for `OnlineStatisticalBlockFileAnalysis`.
+    """
+    analysis_type = OnlineStatisticalBlockFileAnalysis
+
+    def test_add_record_in_known_file(self):
+        self.analysis.add_record(CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        self.assertEqual(4/4, self.analysis.known_file_block_hit_to_miss_proportion())
+
+    def test_add_record_not_in_known_file(self):
+        self.analysis.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=11)))
+        self.assertEqual(1/2, self.analysis.not_known_file_block_hit_to_miss_proportion())
+
+    def test_register_file_after_adding_records(self):
+        self.analysis.register_file(BlockFile("other", [_BLOCK_HASH_3, _BLOCK_HASH_1]))
+        self.assertEqual(3/6, self.analysis.known_file_block_hit_to_miss_proportion())
+        self.assertRaises(ZeroDivisionError, self.analysis.not_known_file_block_hit_to_miss_proportion)
+
+    def test_register_file_with_repeated_blocks_matches_batch_analysis(self):
+        block_file = BlockFile("repeated", [_BLOCK_HASH_3, _BLOCK_HASH_3, "unknown"])
+        self.analysis.register_file(block_file)
+        batch_analysis = StatisticalBlockFileAnalysis(self.analysis.record_collection)
+        batch_analysis.register_file(BlockFile("blockfile", [_BLOCK_HASH_1, _BLOCK_HASH_2]))
+        batch_analysis.register_file(block_file)
+        self.assertEqual(batch_analysis.known_file_block_hit_to_miss_proportion(),
+                         self.analysis.known_file_block_hit_to_miss_proportion())
+
+    def test_record_added_directly_to_collection(self):
+        self.analysis.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=11)))
+        batch_analysis = StatisticalBlockFileAnalysis(self.analysis.record_collection)
+        batch_analysis.register_file(BlockFile("blockfile", [_BLOCK_HASH_1, _BLOCK_HASH_2]))
+        self.assertEqual(batch_analysis.not_known_file_block_hit_to_miss_proportion(),
+                         self.analysis.not_known_file_block_hit_to_miss_proportion())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import unittest
+from functools import partial
+
+import numpy as np
+
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
+from cacheanalysis.parallel import ParallelStatisticalBlockAnalysis, ParallelStatisticalBlockFileAnalysis
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis
+from cacheanalysis.tests import test_statistical_analysis
+
+_PROCESSES = 2
+
+
+class TestParallelStatisticalBlockAnalysis(test_statistical_analysis.TestStatisticalBlockAnalysis):
+    """
+    Unit tests for `ParallelStatisticalBlockAnalysis`.
+    """
+    analysis_type = partial(ParallelStatisticalBlockAnalysis, processes=_PROCESSES)
+
+    def test_matches_serial_analysis(self):
+        random.seed(0)
+        record_collection = ColumnarRecordCollection()
+        for timestamp in range(2000):
+            block_hash = str(random.randrange(100))
+            record_type = random.choice((CacheHitRecord, CacheMissRecord, CacheDeleteRecord))
+            if record_type == CacheMissRecord:
+                record_collection.add_record(CacheMissRecord(block_hash, timestamp, random.randrange(1, 100)))
+            else:
+                record_collection.add_record(record_type(block_hash, timestamp))
+        parallel_analysis = ParallelStatisticalBlockAnalysis(record_collection, processes=_PROCESSES)
+        serial_analysis = StatisticalBlockAnalysis(record_collection)
+
+        parallel_statistics = parallel_analysis.block_statistics()
+        serial_statistics = serial_analysis.block_statistics()
+        self.assertEqual(serial_statistics.block_hashes, parallel_statistics.block_hashes)
+        for field in ("hits", "misses", "deletes", "mean_hits", "bytes_missed"):
+            np.testing.assert_array_equal(getattr(serial_statistics, field), getattr(parallel_statistics, field))
+        self.assertEqual(serial_analysis.all_mean_other_block_misses_between_reload(),
+                         parallel_analysis.all_mean_other_block_misses_between_reload())
+
+
+class TestParallelStatisticalBlockAnalysisWithColumnarRecords(TestParallelStatisticalBlockAnalysis):
+    """
+    Unit tests for `ParallelStatisticalBlockAnalysis` over a `ColumnarRecordCollection`.
+    """
+    record_collection_type = ColumnarRecordCollection
+
+
+class TestParallelStatisticalBlockFileAnalysis(test_statistical_analysis.TestStatisticalBlockFileAnalysis):
+    """
+    Unit tests for `ParallelStatisticalBlockFileAnalysis`.
+    """
+    analysis_type = partial(ParallelStatisticalBlockFileAnalysis, processes=_PROCESSES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
+from cacheanalysis.residency import reconstruct_residency
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_SIZE = 10
+
+
+class TestResidency(unittest.TestCase):
+    """
+    Unit tests for `reconstruct_residency` and `Residency`.
+    """
+    def setUp(self):
+        self.records = [
+            CacheHitRecord(_BLOCK_HASH_3, 0),
+            CacheMissRecord(_BLOCK_HASH_1, 10, _SIZE),
+            CacheMissRecord(_BLOCK_HASH_2, 20, _SIZE * 2),
+            CacheHitRecord(_BLOCK_HASH_1, 25),
+            CacheDeleteRecord(_BLOCK_HASH_3, 30),
+            CacheDeleteRecord(_BLOCK_HASH_1, 40),
+            CacheDeleteRecord(_BLOCK_HASH_1, 45),
+            CacheMissRecord(_BLOCK_HASH_1, 50, _SIZE),
+            CacheMissRecord(_BLOCK_HASH_2, 60, _SIZE * 3),
+            CacheMissRecord(_BLOCK_HASH_3, 70, _SIZE * 4),
+            CacheDeleteRecord(_BLOCK_HASH_1, 70)
+        ]
+        self.residency = reconstruct_residency(ColumnarRecordCollection(self.records).columns)
+
+    def test_intervals(self):
+        intervals = self.residency.intervals
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3],
+                         [intervals.block_hashes[block_id] for block_id in intervals.block_ids])
+        self.assertEqual([10, 20, 50, 60, 70], intervals.starts.tolist())
+        self.assertEqual([40, 60, 70, 70, 70], intervals.ends.tolist())
+        self.assertEqual([True, True, True, False, False], intervals.closed.tolist())
+        self.assertEqual([_SIZE, _SIZE * 2, _SIZE, _SIZE * 3, _SIZE * 4], intervals.sizes.tolist())
+
+    def test_occupancy(self):
+        occupancy = self.residency.occupancy
+        self.assertEqual([10, 20, 40, 50, 60, 70], occupancy.timestamps.tolist())
+        self.assertEqual([_SIZE, _SIZE * 3, _SIZE * 2, _SIZE * 3, _SIZE * 4, _SIZE * 7], occupancy.bytes.tolist())
+        self.assertEqual([1, 2, 1, 2, 2, 2], occupancy.blocks.tolist())
+        self.assertEqual(_SIZE * 7, occupancy.peak_bytes)
+
+    def test_occupancy_at(self):
+        occupancy = self.residency.occupancy
+        self.assertEqual((0, 0), occupancy.at(5))
+        self.assertEqual((_SIZE, 1), occupancy.at(10))
+        self.assertEqual((_SIZE * 2, 1), occupancy.at(45))
+        self.assertEqual((_SIZE * 7, 2), occupancy.at(1000))
+
+    def test_resident_at(self):
+        self.assertEqual([], self.residency.resident_at(0))
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2], self.residency.resident_at(30))
+        self.assertEqual([_BLOCK_HASH_2], self.residency.resident_at(40))
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_3], self.residency.resident_at(70))
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_3], self.residency.resident_at(1000))
+
+    def test_resident_during(self):
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3], self.residency.resident_during(0, 100))
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_1], self.residency.resident_during(40, 55))
+        self.assertEqual([], self.residency.resident_during(0, 10))
+        self.assertEqual([], self.residency.resident_during(30, 30))
+
+    def test_mean_lifetime(self):
+        self.assertEqual(25, self.residency.mean_lifetime(_BLOCK_HASH_1))
+        self.assertEqual(40, self.residency.mean_lifetime(_BLOCK_HASH_2))
+        self.assertIsNone(self.residency.mean_lifetime(_BLOCK_HASH_3))
+        self.assertIsNone(self.residency.mean_lifetime("other"))
+
+    def test_no_records(self):
+        residency = reconstruct_residency(ColumnarRecordCollection().columns)
+        self.assertEqual(0, len(residency.intervals.starts))
+        self.assertEqual(0, residency.occupancy.peak_bytes)
+        self.assertEqual([], residency.resident_at(0))
+
+    def test_index_matches_scan_of_intervals(self):
+        random_state = np.random.RandomState(0)
+        record_collection = ColumnarRecordCollection()
+        for event in range(20000):
+            # Several events at each time, so that some blocks are deleted at the time that they are loaded
+            timestamp = event // 3
+            block_hash = str(random_state.randint(500))
+            event_type = random_state.randint(3)
+            if event_type == 0:
+                record_collection.add_record(CacheMissRecord(block_hash, timestamp, int(random_state.randint(1, 100))))
+            elif event_type == 1:
+                record_collection.add_record(CacheHitRecord(block_hash, timestamp))
+            else:
+                record_collection.add_record(CacheDeleteRecord(block_hash, timestamp))
+        residency = reconstruct_residency(record_collection.columns)
+        intervals = residency.intervals
+        ends = np.where(intervals.closed, intervals.ends, np.iinfo(np.int64).max)
+        for start, end in [(0, 1), (1000, 1001), (1234, 2000), (6666, 6667), (7000, 8000)]:
+            expected = np.flatnonzero((intervals.starts < end) & (ends > start) & (ends > intervals.starts))
+            np.testing.assert_array_equal(expected, residency.intervals_overlapping(start, end))
+        for timestamp in (100, 1000, 3333, 6666):
+            resident = residency.resident_at(timestamp)
+            self.assertEqual(len(resident), residency.occupancy.at(timestamp)[1])
+            self.assertEqual(len(resident), len(set(resident)))
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+from cacheanalysis.benchmarks.synthetic_traces import generate_trace
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+from cacheanalysis.online_analysis import OnlineStatisticalBlockFileAnalysis
+from cacheanalysis.service import AnalysisService, ServiceClient, ServiceError, RecordMerger, produce_records, \
+    decode_batch
+from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis
+from cacheanalysis.tests.test_statistical_analysis import _BLOCK_HASH_1, _BLOCK_HASH_2, _TIMESTAMP, _SIZE
+
+
+class _ResetCountingAnalysis(OnlineStatisticalBlockFileAnalysis):
+    """
+    Online analysis that counts how many times it has recalculated its totals from the whole collection.
+    """
+    def _reset_counters(self):
+        self.resets = getattr(self, "resets", -1) + 1
+        super()._reset_counters()
+
+
+class TestDecodeBatch(unittest.TestCase):
+    """
+    Unit tests for `decode_batch`.
+    """
+    def test_decode_batch(self):
+        records, invalid_lines = decode_batch([
+            b'{"type": "put", "hash": "123", "timestamp": "2000-01-01T00:00:00", "size": 10}',
+            b'{"type": "other"}',
+            b'not json'
+        ])
+        self.assertEqual([CacheMissRecord("123", _TIMESTAMP, 10)], records)
+        self.assertEqual(2, invalid_lines)
+
+
+class TestRecordMerger(unittest.TestCase):
+    """
+    Unit tests for `RecordMerger`.
+    """
+    def setUp(self):
+        self.merger = RecordMerger()
+
+    def test_records_held_until_watermark(self):
+        records = [CacheHitRecord(_BLOCK_HASH_1, timestamp) for timestamp in range(6)]
+        self.assertEqual(records[0:1], self.merger.add("a", records[0:1]))
+        self.assertEqual([], self.merger.add("b", [records[2], records[4]]))
+        self.assertEqual(records[1:4], self.merger.add("a", [records[1], records[3]]))
+        self.assertEqual(1, len(self.merger))
+        self.assertEqual([records[4]], self.merger.remove("a"))
+        self.assertEqual([records[5]], self.merger.add("b", [records[5]]))
+
+    def test_flush(self):
+        records = [CacheHitRecord(_BLOCK_HASH_1, timestamp) for timestamp in range(3)]
+        self.merger.add("a", records[0:1])
+        self.merger.add("b", records[1:])
+        self.assertEqual(records[1:], self.merger.flush())
+        self.assertEqual(0, len(self.merger))
+
+    def test_earliest_released_when_too_many_held(self):
+        merger = RecordMerger(max_held_records=2)
+        records = [CacheHitRecord(_BLOCK_HASH_1, timestamp) for timestamp in range(5)]
+        merger.add("a", records[0:1])
+        self.assertEqual(records[1:3], merger.add("b", records[1:]))
+        self.assertEqual(2, len(merger))
+
+
+class TestAnalysisService(unittest.TestCase):
+    """
+    Unit tests for `AnalysisService`.
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.service = AnalysisService(batch_size=10, max_queued_batches=2)
+        server = self.loop.run_until_complete(self.service.start_tcp("127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1)),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=2)),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(hours=3), _SIZE),
+            CacheDeleteRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(hours=4))
+        ]
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.service.stop())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def _connect(self) -> ServiceClient:
+        return self._run(ServiceClient.connect_tcp("127.0.0.1", self.port))
+
+    def _wait_for_records(self, client: ServiceClient, number_of_records: int) -> dict:
+        """
+        Waits for the given number of records to have been added, e.g. once closed connections stop holding back
+        the records of others.
+        :param client: the client to query the status with
+        :param number_of_records: the number of records
+        :return: the status
+        """
+        for _ in range(100):
+            status = self._run(client.query("status"))
+            if status["records"] >= number_of_records:
+                return status
+            self._run(asyncio.sleep(0.01))
+        return status
+
+    def test_query(self):
+        client = self._connect()
+        self._run(client.send_records(self.records))
+        self.assertEqual(2, self._run(client.query("total_block_hits", _BLOCK_HASH_1)))
+        self.assertEqual(2, self._run(client.query("mean_block_hits", _BLOCK_HASH_1)))
+        self.assertEqual(0, self._run(client.query("total_block_hits", _BLOCK_HASH_2)))
+        client.close()
+
+    def test_status(self):
+        client = self._connect()
+        self._run(client.send_records(self.records))
+        status = self._run(client.query("status"))
+        self.assertEqual(len(self.records), status["records"])
+        self.assertEqual(1, status["connections"])
+        client.close()
+
+    def test_unknown_query(self):
+        client = self._connect()
+        self.assertRaises(ServiceError, self._run, client.query("block_statistics"))
+        client.close()
+
+    def test_query_failing(self):
+        client = self._connect()
+        self.assertRaises(ServiceError, self._run, client.query("known_file_block_hit_to_miss_proportion"))
+        client.close()
+
+    def test_register_file(self):
+        client = self._connect()
+        self._run(client.register_file(BlockFile("file", [_BLOCK_HASH_1])))
+        self._run(client.send_records(self.records))
+        self.assertEqual(2.0, self._run(client.query("known_file_block_hit_to_miss_proportion")))
+        client.close()
+
+    def test_malformed_file_not_answered(self):
+        client = self._connect()
+        client._writer.write(b'{"file": "file"}\n{"file": {"name": "file"}}\n{"file": [], "other": 1}\n')
+        status = self._run(client.query("status"))
+        self.assertEqual(3, status["invalid_lines"])
+        self._run(client.send_records(self.records))
+        self.assertEqual(2, self._run(client.query("total_block_hits", _BLOCK_HASH_1)))
+        client.close()
+
+    def test_producers_with_interleaved_timestamps(self):
+        block_hash_3 = "789"
+        records_a = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=10), _SIZE),
+            CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=15)),
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=40), _SIZE)
+        ]
+        records_b = [
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(seconds=20), _SIZE),
+            CacheMissRecord(block_hash_3, _TIMESTAMP + timedelta(seconds=30), _SIZE)
+        ]
+        client_a, client_b = self._connect(), self._connect()
+        self._run(client_a.send_records(records_a))
+        self._run(client_a.query("status"))
+        self._run(client_b.send_records(records_b))
+        expected = StatisticalBlockAnalysis(RecordCollection(records_a + records_b))
+        self.assertEqual(2.0, expected.mean_other_block_misses_between_reload(_BLOCK_HASH_1))
+        self.assertEqual(2.0, self._run(client_b.query("mean_other_block_misses_between_reload", _BLOCK_HASH_1)))
+        client_a.close()
+        client_b.close()
+
+    def test_producers_in_step_do_not_recalculate(self):
+        self._run(self.service.stop())
+        self.service = AnalysisService(_ResetCountingAnalysis(RecordCollection()), batch_size=10,
+                                       max_queued_batches=2)
+        server = self._run(self.service.start_tcp("127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        records = [CacheHitRecord(str(i % 7), _TIMESTAMP + timedelta(seconds=i)) for i in range(200)]
+        client_a, client_b = self._connect(), self._connect()
+        self._run(client_a.send_records(records[0:1]))
+        self._run(client_b.send_records(records[1:2]))
+        for start in range(2, len(records), 10):
+            # Each producer queries once it has sent its records, before the other has caught up with them
+            self._run(client_a.send_records(records[start:start + 10:2]))
+            self._run(client_a.query("total_block_hits", "0"))
+            self._run(client_b.send_records(records[start + 1:start + 10:2]))
+            self._run(client_b.query("total_block_hits", "1"))
+        status = self._run(client_a.query("status"))
+        self.assertEqual(len(records), status["records"] + status["held"])
+        self.assertEqual(0, status["late"])
+        self.assertEqual(0, self.service.analysis.resets)
+        client_a.close()
+        client_b.close()
+
+    def test_invalid_lines_counted(self):
+        client = self._connect()
+        client._writer.write(b'{"type": "other"}\nnot json\n\n')
+        self.assertEqual(2, self._run(client.query("status"))["invalid_lines"])
+        client.close()
+
+    def test_concurrent_producers(self):
+        trace = generate_trace(3000, number_of_blocks=200)
+        records = list(ColumnarRecordCollection.from_columns(trace.columns, datetime_timestamps=True))
+        clients = [self._connect() for _ in range(3)]
+        self._run(asyncio.gather(*[produce_records(client, records[i::3]) for i, client in enumerate(clients)]))
+        # The latest records are held until the other producers catch up with them, or close
+        for client in clients:
+            client.close()
+        clients = [self._connect() for _ in range(3)]
+        status = self._wait_for_records(clients[0], len(records))
+        self.assertEqual(len(records), status["records"])
+        self.assertEqual(0, status["held"])
+        self.assertEqual(0, status["invalid_lines"])
+        expected = StatisticalBlockAnalysis(RecordCollection(records))
+        for block_hash in trace.columns.block_hashes[:20]:
+            self.assertEqual(expected.total_block_hits(block_hash),
+                             self._run(clients[1].query("total_block_hits", block_hash)))
+            mean_other_block_misses = self._run(clients[2].query("mean_other_block_misses_between_reload",
+                                                                 block_hash))
+            if expected.mean_other_block_misses_between_reload(block_hash) is None:
+                self.assertIsNone(mean_other_block_misses)
+            else:
+                self.assertAlmostEqual(expected.mean_other_block_misses_between_reload(block_hash),
+                                       mean_other_block_misses)
+        for client in clients:
+            client.close()
+
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "service.sock")
+            self._run(self.service.start_unix(path))
+            client = self._run(ServiceClient.connect_unix(path))
+            self._run(client.send_records(self.records))
+            self.assertEqual(1, self._run(client.query("total_block_misses", _BLOCK_HASH_2)))
+            client.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
+from cacheanalysis.simulation import LRUPolicy, FIFOPolicy, LFUPolicy, ARCPolicy, TwoQueuePolicy, get_accesses, \
+    simulate, POLICIES
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+
+
+def _access_all(policy, blocks, size=_SIZE):
+    return [policy.access(block, size) for block in blocks]
+
+
+class TestPolicies(unittest.TestCase):
+    """
+    Unit tests for the cache policies.
+    """
+    def test_lru(self):
+        self.assertEqual([False, False, True, False, False, True],
+                         _access_all(LRUPolicy(2 * _SIZE), [1, 2, 1, 3, 2, 3]))
+
+    def test_fifo(self):
+        self.assertEqual([False, False, True, False, True, False],
+                         _access_all(FIFOPolicy(2 * _SIZE), [1, 2, 1, 3, 3, 1]))
+
+    def test_lfu(self):
+        policy = LFUPolicy(2 * _SIZE)
+        self.assertEqual([False, True, False, False, True, False, True],
+                         _access_all(policy, [1, 1, 2, 3, 1, 2, 1]))
+        self.assertEqual(2, policy.evictions)
+
+    def test_block_larger_than_capacity_not_loaded(self):
+        for policy_type in POLICIES.values():
+            policy = policy_type(_SIZE)
+            self.assertEqual([False, False], _access_all(policy, [1, 1], _SIZE + 1), policy_type.name)
+            self.assertEqual(0, policy.used)
+
+    def test_capacity_never_exceeded(self):
+        generator = random.Random(0)
+        for policy_type in POLICIES.values():
+            policy = policy_type(100)
+            for _ in range(5000):
+                block = int(generator.paretovariate(1)) % 200
+                policy.access(block, 1 + block % 20)
+                self.assertLessEqual(policy.used, policy.capacity, policy_type.name)
+
+    def test_scan_resistance(self):
+        # A frequently used working set interleaved with a long scan of blocks that are used once
+        blocks = []
+        for i in range(1000):
+            blocks.extend([i % 5, i % 5, 1000 + i])
+        hits = {policy_type.name: sum(_access_all(policy_type(8 * _SIZE), blocks))
+                for policy_type in (LRUPolicy, ARCPolicy, TwoQueuePolicy, LFUPolicy)}
+        self.assertGreater(hits[ARCPolicy.name], hits[LRUPolicy.name])
+        self.assertGreater(hits[TwoQueuePolicy.name], hits[LRUPolicy.name])
+        self.assertGreater(hits[LFUPolicy.name], hits[LRUPolicy.name])
+
+
+class TestSimulate(unittest.TestCase):
+    """
+    Unit tests for `get_accesses` and `simulate`.
+    """
+    def setUp(self):
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=1), 2 * _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=2)),
+            CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=3)),
+            CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=4)),
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=5), _SIZE)
+        ]
+        self.record_collection = RecordCollection(self.records)
+
+    def test_get_accesses(self):
+        accesses = get_accesses(self.record_collection)
+        self.assertEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_1, _BLOCK_HASH_3, _BLOCK_HASH_1],
+                         [accesses.block_hashes[block_id] for block_id in accesses.block_ids])
+        # Blocks that were never missed are given the mean size of those that were
+        self.assertEqual([_SIZE, 2 * _SIZE, _SIZE, int(1.5 * _SIZE), _SIZE], list(accesses.block_sizes))
+
+    def test_simulate(self):
+        result, = simulate(self.record_collection, [LRUPolicy(3 * _SIZE)])
+        self.assertEqual(LRUPolicy.name, result.policy)
+        self.assertEqual(5, result.accesses)
+        self.assertEqual(2, result.hits)
+        self.assertEqual(2 / 5, result.hit_ratio)
+        self.assertEqual(2 * _SIZE / (6.5 * _SIZE), result.byte_hit_ratio)
+        self.assertEqual(1, result.evictions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import random
+import unittest
+from bisect import bisect
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+from cacheanalysis.sketches import CountMinSketch, SpaceSaving, HyperLogLog, BlockSketches
+from cacheanalysis.timestamps import to_epoch_nanoseconds
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+
+
+def _generate_zipf_items(number_of_items: int, number_of_distinct_items: int, seed: int=0):
+    generator = random.Random(seed)
+    cumulative_weights = list(accumulate(1 / (rank + 1) for rank in range(number_of_distinct_items)))
+    return [str(bisect(cumulative_weights, generator.random() * cumulative_weights[-1]))
+            for _ in range(number_of_items)]
+
+
+class TestCountMinSketch(unittest.TestCase):
+    """
+    Unit tests for `CountMinSketch`.
+    """
+    def test_estimate_when_not_added(self):
+        self.assertEqual(0, CountMinSketch().estimate("other"))
+
+    def test_estimates_are_not_less_than_counts(self):
+        items = _generate_zipf_items(10000, 5000)
+        sketch = CountMinSketch(width=256)
+        for item in items:
+            sketch.add(item)
+        for item, count in Counter(items).items():
+            self.assertGreaterEqual(sketch.estimate(item), count)
+
+    def test_estimate_with_weighted_counts(self):
+        sketch = CountMinSketch()
+        sketch.add(_BLOCK_HASH_1, 5)
+        sketch.add(_BLOCK_HASH_1, 3)
+        self.assertEqual(8, sketch.estimate(_BLOCK_HASH_1))
+        self.assertEqual(8, sketch.total)
+
+
+class TestSpaceSaving(unittest.TestCase):
+    """
+    Unit tests for `SpaceSaving`.
+    """
+    def test_top_when_under_capacity(self):
+        sketch = SpaceSaving(capacity=10)
+        for item in [_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_1]:
+            sketch.add(item)
+        self.assertEqual([(_BLOCK_HASH_1, 2, 0), (_BLOCK_HASH_2, 1, 0)], sketch.top())
+
+    def test_replaces_smallest_count_when_full(self):
+        sketch = SpaceSaving(capacity=2)
+        for item in [_BLOCK_HASH_1, _BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3]:
+            sketch.add(item)
+        self.assertEqual([(_BLOCK_HASH_1, 2, 0), (_BLOCK_HASH_3, 2, 1)], sketch.top())
+
+    def test_heavy_hitters_are_kept(self):
+        items = _generate_zipf_items(20000, 5000)
+        sketch = SpaceSaving(capacity=100)
+        for item in items:
+            sketch.add(item)
+        top = sketch.top(10)
+        counts = Counter(items)
+        self.assertEqual({item for item, _ in counts.most_common(10)}, {item for item, _, _ in top})
+        for item, count, error in top:
+            self.assertGreaterEqual(count, counts[item])
+            self.assertLessEqual(count - error, counts[item])
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """
+    Unit tests for `HyperLogLog`.
+    """
+    def test_count_when_empty(self):
+        self.assertEqual(0, HyperLogLog().count())
+
+    def test_count_of_few_items_is_exact(self):
+        sketch = HyperLogLog()
+        for item in [_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_1, _BLOCK_HASH_3]:
+            sketch.add(item)
+        self.assertEqual(3, sketch.count())
+
+    def test_count_of_many_items(self):
+        sketch = HyperLogLog(precision=12)
+        for i in range(100000):
+            sketch.add(str(i % 50000))
+        self.assertAlmostEqual(50000, sketch.count(), delta=50000 * 0.05)
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(1000):
+            first.add(str(i))
+            second.add(str(i + 500))
+        first.merge(second)
+        self.assertAlmostEqual(1500, first.count(), delta=1500 * 0.05)
+
+    def test_merge_with_different_precision(self):
+        self.assertRaises(ValueError, HyperLogLog(10).merge, HyperLogLog(12))
+
+
+class TestBlockSketches(unittest.TestCase):
+    """
+    Unit tests for `BlockSketches`.
+    """
+    def setUp(self):
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP, _SIZE * 3),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1)),
+            CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1)),
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(hours=1), _SIZE),
+            CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(hours=2))
+        ]
+        self.sketches = BlockSketches(window=timedelta(hours=1))
+        self.sketches.register_file(BlockFile("file", [_BLOCK_HASH_1, _BLOCK_HASH_2]))
+        self.sketches.register_file(BlockFile("other", [_BLOCK_HASH_2]))
+        self.sketches.add_records(self.records)
+
+    def test_top_blocks_by_accesses(self):
+        self.assertEqual([(_BLOCK_HASH_1, 3, 0)], self.sketches.accesses.top(1))
+
+    def test_top_blocks_by_bytes_missed(self):
+        self.assertEqual([(_BLOCK_HASH_2, _SIZE * 3, 0), (_BLOCK_HASH_1, _SIZE * 2, 0)],
+                         self.sketches.bytes_missed.top())
+
+    def test_access_counts(self):
+        self.assertEqual(3, self.sketches.access_counts.estimate(_BLOCK_HASH_1))
+
+    def test_distinct_blocks(self):
+        self.assertEqual(3, self.sketches.distinct_blocks.count())
+
+    def test_distinct_files(self):
+        self.assertEqual(2, self.sketches.distinct_files.count())
+
+    def test_distinct_blocks_in_windows(self):
+        starts, counts = self.sketches.distinct_blocks_in_windows()
+        hour = 3600 * 10 ** 9
+        self.assertEqual([to_epoch_nanoseconds(_TIMESTAMP) + i * hour for i in range(3)], starts.tolist())
+        self.assertEqual([2, 1, 1], counts.tolist())
+
+    def test_report(self):
+        report = self.sketches.report()
+        self.assertIn("Blocks sorted by number of accesses", report)
+        self.assertIn(_BLOCK_HASH_3, report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from datetime import datetime, timedelta
 
-from cacheanalysis.collections import RecordCollection
+import numpy as np
+
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection
 from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
 from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis
 
@@ -16,6 +18,9 @@ class TestStatisticalBlockAnalysis(unittest.TestCase):
     """
     Unit tests for `StatisticalBlockAnalysis`.
     """
+    record_collection_type = RecordCollection
+    analysis_type = StatisticalBlockAnalysis
+
     def setUp(self):
         self.records = [
             CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
@@ -31,10 +36,10 @@ class TestStatisticalBlockAnalysis(unittest.TestCase):
             CacheMissRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(days=9), _SIZE),
             CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=10), _SIZE)
         ]
-        record_collection = RecordCollection()
+        record_collection = self.record_collection_type()
         for record in self.records:
             record_collection.add_record(record)
-        self.analysis = StatisticalBlockAnalysis(record_collection)
+        self.analysis = self.analysis_type(record_collection)
 
     def test_total_block_misses_when_not_loaded(self):
         self.assertEqual(0, self.analysis.total_block_misses("other"))
@@ -54,17 +59,95 @@ class TestStatisticalBlockAnalysis(unittest.TestCase):
     def test_mean_block_hits_when_loaded(self):
         self.assertEqual(1, self.analysis.mean_block_hits(_BLOCK_HASH_1))
 
+    def test_block_statistics(self):
+        statistics = self.analysis.block_statistics()
+        self.assertCountEqual([_BLOCK_HASH_1, _BLOCK_HASH_2, _BLOCK_HASH_3], statistics.block_hashes)
+        index = statistics.block_indexes[_BLOCK_HASH_1]
+        self.assertEqual(_BLOCK_HASH_1, statistics.block_hashes[index])
+        self.assertEqual(3, statistics.hits[index])
+        self.assertEqual(3, statistics.misses[index])
+        self.assertEqual(2, statistics.deletes[index])
+        self.assertEqual(1, statistics.mean_hits[index])
+        self.assertEqual(3 * _SIZE, statistics.bytes_missed[index])
+
+    def test_block_statistics_match_per_block_statistics(self):
+        statistics = self.analysis.block_statistics()
+        for block_hash, index in statistics.block_indexes.items():
+            self.assertEqual(self.analysis.total_block_hits(block_hash), statistics.hits[index])
+            self.assertEqual(self.analysis.total_block_misses(block_hash), statistics.misses[index])
+
+    def test_block_statistics_match_per_block_statistics_with_repeated_events(self):
+        for record in (CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)),
+                       CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11))):
+            self.analysis.record_collection.add_record(record)
+        statistics = self.analysis.block_statistics()
+        index = statistics.block_indexes[_BLOCK_HASH_2]
+        self.assertEqual(2, statistics.hits[index])
+        self.assertEqual(2, self.analysis.total_block_hits(_BLOCK_HASH_2))
+        self.assertEqual(2, self.analysis.mean_block_hits(_BLOCK_HASH_2))
+
+    def test_block_statistics_after_adding_record(self):
+        self.analysis.block_statistics()
+        self.analysis.record_collection.add_record(CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        statistics = self.analysis.block_statistics()
+        self.assertEqual(1, statistics.hits[statistics.block_indexes[_BLOCK_HASH_2]])
+
+    def test_lru_miss_ratio_curves(self):
+        object_curve, byte_curve = self.analysis.lru_miss_ratio_curves()
+        # 9 accesses, of which only the first access to each of the 3 blocks must miss
+        self.assertAlmostEqual(3 / 9, object_curve.miss_ratios[-1])
+        self.assertAlmostEqual(3 / 9, byte_curve.miss_ratios[-1])
+
     def test_mean_other_block_misses_between_reload_when_not_reloaded(self):
         self.assertIsNone(self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_2))
 
     def test_mean_other_block_misses_between_reload_when_reloaded(self):
         self.assertEqual(1, self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_1))
 
+    def test_all_mean_other_block_misses_between_reload(self):
+        self.assertEqual({_BLOCK_HASH_1: 1, _BLOCK_HASH_3: 0},
+                         self.analysis.all_mean_other_block_misses_between_reload())
+
+    def test_all_mean_other_block_misses_between_reload_after_adding_record(self):
+        self.analysis.all_mean_other_block_misses_between_reload()
+        self.analysis.record_collection.add_record(CacheDeleteRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=1)))
+        self.analysis.record_collection.add_record(
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11), _SIZE))
+        self.assertEqual(4, self.analysis.mean_other_block_misses_between_reload(_BLOCK_HASH_2))
+
+    def test_blocks_resident_at(self):
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_1],
+                         self.analysis.blocks_resident_at(_TIMESTAMP + timedelta(days=5)))
+        self.assertEqual([_BLOCK_HASH_2, _BLOCK_HASH_3, _BLOCK_HASH_1],
+                         self.analysis.blocks_resident_at(_TIMESTAMP + timedelta(days=11)))
+
+    def test_mean_block_lifetime(self):
+        day = 24 * 60 * 60 * 10 ** 9
+        self.assertEqual(2.5 * day, self.analysis.mean_block_lifetime(_BLOCK_HASH_1))
+        self.assertEqual(day, self.analysis.mean_block_lifetime(_BLOCK_HASH_3))
+        self.assertIsNone(self.analysis.mean_block_lifetime(_BLOCK_HASH_2))
+        self.assertIsNone(self.analysis.mean_block_lifetime("other"))
+
+    def test_residency_after_adding_record(self):
+        self.analysis.blocks_resident_at(_TIMESTAMP + timedelta(days=11))
+        self.analysis.record_collection.add_record(CacheDeleteRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        self.assertEqual([_BLOCK_HASH_3, _BLOCK_HASH_1],
+                         self.analysis.blocks_resident_at(_TIMESTAMP + timedelta(days=11)))
+
+
+class TestStatisticalBlockAnalysisWithColumnarRecords(TestStatisticalBlockAnalysis):
+    """
+    Unit tests for `StatisticalBlockAnalysis` over a `ColumnarRecordCollection`.
+    """
+    record_collection_type = ColumnarRecordCollection
+
 
 class TestStatisticalBlockFileAnalysis(unittest.TestCase):
     """
     Unit tests for `StatisticalBlockFileAnalysis`.
     """
+    analysis_type = StatisticalBlockFileAnalysis
+
     def setUp(self):
         self.records = [
             CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
@@ -83,7 +166,7 @@ class TestStatisticalBlockFileAnalysis(unittest.TestCase):
         record_collection = RecordCollection()
         for record in self.records:
             record_collection.add_record(record)
-        self.analysis = StatisticalBlockFileAnalysis(record_collection)
+        self.analysis = self.analysis_type(record_collection)
         block_file = BlockFile("blockfile", [_BLOCK_HASH_1, _BLOCK_HASH_2])
         self.analysis.register_file(block_file)
 
@@ -96,6 +179,39 @@ class TestStatisticalBlockFileAnalysis(unittest.TestCase):
     def test_not_known_file_block_hit_to_miss_proportion(self):
         self.assertEqual(0, self.analysis.not_known_file_block_hit_to_miss_proportion())
 
+    def test_file_statistics(self):
+        other_file = BlockFile("other", [_BLOCK_HASH_3, "unknown"])
+        self.analysis.register_file(other_file)
+        statistics = self.analysis.file_statistics()
+        self.assertEqual([BlockFile("blockfile", [_BLOCK_HASH_1, _BLOCK_HASH_2]), other_file], statistics.files)
+        np.testing.assert_array_equal([2, 2], statistics.blocks)
+        np.testing.assert_array_equal([3, 0], statistics.hits)
+        np.testing.assert_array_equal([4, 2], statistics.misses)
+        np.testing.assert_array_equal([3/7, 0], statistics.hit_ratios)
+        np.testing.assert_array_equal([1, 0.5], statistics.resident_fractions)
+        np.testing.assert_array_equal([4 * _SIZE, 2 * _SIZE], statistics.bytes_missed)
+        np.testing.assert_array_equal([2 * _SIZE, _SIZE], statistics.bytes_refetched)
+
+    def test_file_statistics_after_adding_record(self):
+        self.analysis.file_statistics()
+        self.analysis.record_collection.add_record(CacheDeleteRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(days=11)))
+        np.testing.assert_array_equal([0.5], self.analysis.file_statistics().resident_fractions)
+
+    def test_access_patterns(self):
+        patterns = self.analysis.access_patterns(window=1).file_access_patterns()
+        np.testing.assert_array_equal([7], patterns.accesses)
+        # The last access, to the first block of the file, is yet to be followed
+        np.testing.assert_array_equal([5], patterns.follow_opportunities)
+
+    def test_access_patterns_after_registering_file(self):
+        self.analysis.access_patterns()
+        self.analysis.register_file(BlockFile("other", [_BLOCK_HASH_3, "unknown"]))
+        np.testing.assert_array_equal([7, 2], self.analysis.access_patterns().file_access_patterns().accesses)
+
+    def test_access_patterns_are_not_shared(self):
+        self.analysis.access_patterns().add_record(CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(days=11)))
+        np.testing.assert_array_equal([7], self.analysis.access_patterns().file_access_patterns().accesses)
+
 
 if __name__ == "__main__":
     unittest.main()
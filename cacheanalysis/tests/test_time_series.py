@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from cacheanalysis import time_series as time_series_module
+from cacheanalysis.collections import ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord
+from cacheanalysis.time_series import windowed_metrics, windowed_metrics_of_columns
+from cacheanalysis.timestamps import to_epoch_nanoseconds
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+_MINUTE = timedelta(minutes=1)
+
+
+class TestWindowedMetrics(unittest.TestCase):
+    """
+    Unit tests for `windowed_metrics` and `windowed_metrics_of_columns`.
+    """
+    def setUp(self):
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=10), _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=20)),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(seconds=70), _SIZE * 2),
+            CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=80)),
+            CacheHitRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(minutes=3, seconds=5))
+        ]
+
+    def test_tumbling_windows(self):
+        time_series = windowed_metrics(self.records, _MINUTE)
+        start = to_epoch_nanoseconds(_TIMESTAMP)
+        np.testing.assert_array_equal([start + i * 60 * 10 ** 9 for i in range(4)], time_series.starts)
+        np.testing.assert_array_equal([1, 0, 0, 1], time_series.hits)
+        np.testing.assert_array_equal([1, 1, 0, 0], time_series.misses)
+        np.testing.assert_array_equal([0, 1, 0, 0], time_series.deletes)
+        np.testing.assert_array_equal([_SIZE, _SIZE * 2, 0, 0], time_series.bytes_missed)
+
+    def test_hit_ratios(self):
+        time_series = windowed_metrics(self.records, _MINUTE)
+        np.testing.assert_array_equal([0.5, 0, np.nan, 1], time_series.hit_ratios)
+
+    def test_sliding_windows(self):
+        time_series = windowed_metrics(self.records, 2 * _MINUTE, _MINUTE)
+        start = to_epoch_nanoseconds(_TIMESTAMP)
+        np.testing.assert_array_equal([start + i * 60 * 10 ** 9 for i in range(-1, 3)], time_series.starts)
+        np.testing.assert_array_equal([1, 1, 0, 1], time_series.hits)
+        np.testing.assert_array_equal([1, 2, 1, 0], time_series.misses)
+        np.testing.assert_array_equal([_SIZE, _SIZE * 3, _SIZE * 2, 0], time_series.bytes_missed)
+
+    def test_sliding_windows_match_tumbling_windows_when_step_is_width(self):
+        sliding = windowed_metrics(self.records, _MINUTE, _MINUTE)
+        tumbling = windowed_metrics(self.records, _MINUTE)
+        for field in ("starts", "hits", "misses", "deletes", "bytes_missed"):
+            np.testing.assert_array_equal(getattr(tumbling, field), getattr(sliding, field))
+
+    def test_of_columns_matches_records(self):
+        columns = ColumnarRecordCollection(self.records).columns
+        from_columns = windowed_metrics_of_columns(columns, 2 * _MINUTE, _MINUTE)
+        from_records = windowed_metrics(self.records, 2 * _MINUTE, _MINUTE)
+        for field in ("starts", "hits", "misses", "deletes", "bytes_missed"):
+            np.testing.assert_array_equal(getattr(from_records, field), getattr(from_columns, field))
+
+    def test_of_columns_matches_records_in_many_chunks(self):
+        random_state = np.random.RandomState(0)
+        record_collection = ColumnarRecordCollection()
+        timestamps = np.sort(random_state.randint(0, 10 ** 12, 1000))
+        for timestamp, event_type in zip(timestamps.tolist(), random_state.randint(3, size=1000).tolist()):
+            if event_type == 0:
+                record_collection.add_record(CacheMissRecord(_BLOCK_HASH_1, timestamp, int(timestamp % 100)))
+            elif event_type == 1:
+                record_collection.add_record(CacheHitRecord(_BLOCK_HASH_1, timestamp))
+            else:
+                record_collection.add_record(CacheDeleteRecord(_BLOCK_HASH_1, timestamp))
+        chunk_size = time_series_module._CHUNK_SIZE
+        time_series_module._CHUNK_SIZE = 64
+        try:
+            from_columns = windowed_metrics_of_columns(record_collection.columns, 10 ** 10, 10 ** 9)
+        finally:
+            time_series_module._CHUNK_SIZE = chunk_size
+        from_records = windowed_metrics(record_collection, 10 ** 10, 10 ** 9)
+        for field in ("starts", "hits", "misses", "deletes", "bytes_missed"):
+            np.testing.assert_array_equal(getattr(from_records, field), getattr(from_columns, field))
+
+    def test_of_columns_when_no_records(self):
+        time_series = windowed_metrics_of_columns(ColumnarRecordCollection().columns, _MINUTE)
+        self.assertEqual(0, len(time_series.starts))
+        self.assertEqual(0, len(time_series.hits))
+
+    def test_when_no_records(self):
+        time_series = windowed_metrics([], _MINUTE)
+        self.assertEqual(0, len(time_series.starts))
+        self.assertEqual(0, len(time_series.hit_ratios))
+
+    def test_step_that_does_not_divide_width(self):
+        self.assertRaises(ValueError, windowed_metrics, self.records, _MINUTE, timedelta(seconds=7))
+
+    def test_records_not_in_chronological_order(self):
+        self.assertRaises(ValueError, windowed_metrics, list(reversed(self.records)), _MINUTE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime, timezone, timedelta
+
+import dateutil.parser
+
+from cacheanalysis.timestamps import TimestampParser, to_epoch_nanoseconds, from_epoch_nanoseconds
+
+_TIMESTAMPS = [
+    "2016-08-01T12:34:56",
+    "2016-08-01T12:34:56.789012",
+    "2016-08-01T12:59:01.5",
+    "2016-08-01 23:00:00.000001",
+    "2016-08-01T12:34:56Z",
+    "2016-08-01T12:34:56.123456+00:00",
+    "2016-08-01T12:34:56-05:30",
+    "2016-02-29T00:00:00+0100",
+    "1 August 2016 12:34"
+]
+
+
+class TestTimestampParser(unittest.TestCase):
+    """
+    Unit tests for `TimestampParser`.
+    """
+    def test_parse_matches_dateutil(self):
+        parser = TimestampParser()
+        for timestamp in _TIMESTAMPS:
+            self.assertEqual(dateutil.parser.parse(timestamp), parser.parse(timestamp), timestamp)
+
+    def test_parse_to_epoch_nanoseconds_matches_dateutil(self):
+        parser = TimestampParser(epoch_nanoseconds=True)
+        for timestamp in _TIMESTAMPS:
+            self.assertEqual(to_epoch_nanoseconds(dateutil.parser.parse(timestamp)), parser.parse(timestamp),
+                             timestamp)
+
+    def test_parse_to_epoch_nanoseconds_keeps_nanoseconds(self):
+        parser = TimestampParser(epoch_nanoseconds=True)
+        self.assertEqual(1000000000123456789, parser.parse("2001-09-09T01:46:40.123456789"))
+
+    def test_parse_when_cache_full(self):
+        parser = TimestampParser(max_cached_prefixes=1)
+        self.assertEqual(datetime(2000, 1, 1, 1), parser.parse("2000-01-01T01:00:00"))
+        self.assertEqual(datetime(2000, 1, 1, 2), parser.parse("2000-01-01T02:00:00"))
+        self.assertEqual(datetime(2000, 1, 1, 1, 30), parser.parse("2000-01-01T01:30:00"))
+
+    def test_parse_when_out_of_range(self):
+        self.assertRaises(ValueError, TimestampParser().parse, "2000-02-30T00:00:00")
+
+    def test_parse_all_to_epoch_nanoseconds(self):
+        parser = TimestampParser()
+        utc_timestamps = [timestamp for timestamp in _TIMESTAMPS[:5]] + ["2001-09-09T01:46:40.123456789"]
+        self.assertEqual([TimestampParser(epoch_nanoseconds=True).parse(timestamp) for timestamp in utc_timestamps],
+                         parser.parse_all_to_epoch_nanoseconds(utc_timestamps).tolist())
+
+    def test_parse_all_to_epoch_nanoseconds_with_time_zones(self):
+        parser = TimestampParser()
+        self.assertEqual([to_epoch_nanoseconds(dateutil.parser.parse(timestamp)) for timestamp in _TIMESTAMPS],
+                         parser.parse_all_to_epoch_nanoseconds(_TIMESTAMPS).tolist())
+
+    def test_parse_all_to_epoch_nanoseconds_when_invalid(self):
+        parser = TimestampParser()
+        self.assertRaises(ValueError, parser.parse_all_to_epoch_nanoseconds, ["2000-01-01T00:00:00", "now"])
+        self.assertRaises(ValueError, parser.parse_all_to_epoch_nanoseconds, ["2000-02-30T00:00:00"])
+
+
+class TestEpochNanoseconds(unittest.TestCase):
+    """
+    Unit tests for `to_epoch_nanoseconds` and `from_epoch_nanoseconds`.
+    """
+    def test_to_epoch_nanoseconds_when_naive(self):
+        self.assertEqual(86400 * 10 ** 9 + 1000, to_epoch_nanoseconds(datetime(1970, 1, 2, microsecond=1)))
+
+    def test_to_epoch_nanoseconds_when_aware(self):
+        timestamp = datetime(1970, 1, 1, 1, tzinfo=timezone(timedelta(hours=1)))
+        self.assertEqual(0, to_epoch_nanoseconds(timestamp))
+
+    def test_to_epoch_nanoseconds_when_integer(self):
+        self.assertEqual(123, to_epoch_nanoseconds(123))
+
+    def test_from_epoch_nanoseconds(self):
+        timestamp = datetime(2000, 1, 1, 12, microsecond=5)
+        self.assertEqual(timestamp, from_epoch_nanoseconds(to_epoch_nanoseconds(timestamp)))
+
+    def test_from_epoch_nanoseconds_with_timezone(self):
+        timestamp = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+        converted = from_epoch_nanoseconds(to_epoch_nanoseconds(timestamp), timezone.utc)
+        self.assertEqual(timestamp, converted)
+        self.assertIsNotNone(converted.tzinfo)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from cacheanalysis.collections import RecordCollection, ColumnarRecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, CacheDeleteRecord, BlockFile
+from cacheanalysis.trace_files import write_trace, load_trace, convert_json_trace, TraceFileError
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+
+
+class TestTraceFiles(unittest.TestCase):
+    """
+    Unit tests for `write_trace` and `load_trace`.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.trace")
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(seconds=1), _SIZE * 2),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=2)),
+            CacheDeleteRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(seconds=3))
+        ]
+        self.block_files = [
+            BlockFile("file_1", [_BLOCK_HASH_1, _BLOCK_HASH_2]),
+            BlockFile("file_2", [_BLOCK_HASH_3, _BLOCK_HASH_1]),
+            BlockFile("empty", [])
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        write_trace(self.path, RecordCollection(self.records), self.block_files)
+        trace = load_trace(self.path)
+        self.assertEqual(self.records, list(trace.record_collection))
+        self.assertEqual(self.block_files, trace.block_files)
+
+    def test_round_trip_of_columnar_records(self):
+        write_trace(self.path, ColumnarRecordCollection(self.records), self.block_files)
+        self.assertEqual(self.records, list(load_trace(self.path).record_collection))
+
+    def test_blocks_only_in_block_files_do_not_have_records(self):
+        write_trace(self.path, RecordCollection(self.records), self.block_files)
+        record_collection = load_trace(self.path).record_collection
+        self.assertEqual({_BLOCK_HASH_1, _BLOCK_HASH_2}, set(record_collection.block_hashes))
+        self.assertEqual([], record_collection.get_block_misses(_BLOCK_HASH_3))
+
+    def test_round_trip_with_integer_timestamps(self):
+        records = [CacheMissRecord(_BLOCK_HASH_1, 1, _SIZE), CacheHitRecord(_BLOCK_HASH_1, 2)]
+        write_trace(self.path, RecordCollection(records))
+        self.assertEqual(records, list(load_trace(self.path).record_collection))
+
+    def test_round_trip_with_timezone_aware_timestamps(self):
+        records = [CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP.replace(tzinfo=timezone.utc))]
+        write_trace(self.path, RecordCollection(records))
+        self.assertEqual(records, list(load_trace(self.path).record_collection))
+
+    def test_round_trip_when_empty(self):
+        write_trace(self.path, RecordCollection())
+        trace = load_trace(self.path)
+        self.assertEqual(0, len(trace.record_collection))
+        self.assertEqual([], trace.block_files)
+
+    def test_events_are_memory_mapped(self):
+        write_trace(self.path, RecordCollection(self.records))
+        columns = load_trace(self.path).record_collection.columns
+        self.assertIsInstance(columns.timestamps.base, np.memmap)
+
+    def test_records_can_be_added_to_loaded_trace(self):
+        write_trace(self.path, RecordCollection(self.records))
+        record_collection = load_trace(self.path).record_collection
+        record = CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(seconds=4))
+        record_collection.add_record(record)
+        self.assertEqual(self.records + [record], list(record_collection))
+
+    def test_load_when_not_trace_file(self):
+        with open(self.path, "wb") as file:
+            file.write(b"{\"records\": []}" * 10)
+        self.assertRaises(TraceFileError, load_trace, self.path)
+
+    def test_convert_json_trace(self):
+        json_as_dict = {
+            "records": [{"type": "put", "hash": _BLOCK_HASH_1, "timestamp": "2000-01-01T00:00:00", "size": _SIZE}],
+            "references": [{"name": "file_1", "block_hashes": [_BLOCK_HASH_1]}]
+        }
+        convert_json_trace(json_as_dict, self.path)
+        trace = load_trace(self.path)
+        self.assertEqual([CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE)], list(trace.record_collection))
+        self.assertEqual([BlockFile("file_1", [_BLOCK_HASH_1])], trace.block_files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from cacheanalysis.collections import RecordCollection
+from cacheanalysis.models import CacheMissRecord, CacheHitRecord, BlockFile
+from cacheanalysis.visual_analysis import VisualBlockFileAnalysis
+
+_BLOCK_HASH_1 = "123"
+_BLOCK_HASH_2 = "456"
+_BLOCK_HASH_3 = "789"
+_TIMESTAMP = datetime(year=2000, month=1, day=1)
+_SIZE = 10
+
+
+class TestHeadlessVisualisation(unittest.TestCase):
+    """
+    Tests rendering visualisations to files.
+    """
+    def setUp(self):
+        self.records = [
+            CacheMissRecord(_BLOCK_HASH_1, _TIMESTAMP, _SIZE),
+            CacheHitRecord(_BLOCK_HASH_1, _TIMESTAMP + timedelta(minutes=1)),
+            CacheMissRecord(_BLOCK_HASH_2, _TIMESTAMP + timedelta(minutes=2), _SIZE),
+            CacheMissRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(minutes=3), _SIZE),
+            CacheHitRecord(_BLOCK_HASH_3, _TIMESTAMP + timedelta(minutes=4))
+        ]
+        self.analysis = VisualBlockFileAnalysis(RecordCollection(self.records))
+        self.analysis.register_file(BlockFile("file", [_BLOCK_HASH_1, _BLOCK_HASH_2]))
+        self.temp_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_directory)
+
+    def test_visualise_to_png(self):
+        output_path = os.path.join(self.temp_directory, "visualisation.png")
+        self.analysis.visualise(highlight_blocks=[_BLOCK_HASH_1], output_path=output_path)
+        with open(output_path, "rb") as file:
+            self.assertEqual(b"\x89PNG", file.read(4))
+
+    def test_visualise_to_svg(self):
+        output_path = os.path.join(self.temp_directory, "visualisation.svg")
+        self.analysis.visualise(output_path=output_path)
+        with open(output_path, "r") as file:
+            self.assertIn("<svg", file.read())
+
+    def test_visualise_density(self):
+        output_path = os.path.join(self.temp_directory, "visualisation.png")
+        self.analysis.visualise(highlight_files=[BlockFile("file", [_BLOCK_HASH_1])], output_path=output_path,
+                                density=True)
+        self.assertGreater(os.path.getsize(output_path), 0)
+
+    def test_miss_ratio_curve_sampled_for_many_records(self):
+        self.assertEqual(1.0, VisualBlockFileAnalysis.choose_miss_ratio_curve_sampling_rate(len(self.records)))
+        self.assertEqual(1.0, VisualBlockFileAnalysis.choose_miss_ratio_curve_sampling_rate(100000))
+        self.assertEqual(0.01, VisualBlockFileAnalysis.choose_miss_ratio_curve_sampling_rate(10000000))
+
+
+if __name__ == "__main__":
+    unittest.main()
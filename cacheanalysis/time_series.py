@@ -0,0 +1,177 @@
+from collections import deque, namedtuple
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from cacheanalysis.collections import RecordColumns, RECORD_TYPE_EVENTS, HIT_EVENT, MISS_EVENT, DELETE_EVENT
+from cacheanalysis.models import Record
+from cacheanalysis.timestamps import to_epoch_nanoseconds, to_nanoseconds, Duration
+
+# Event of (timestamp in nanoseconds since the epoch, event type, block size)
+_Event = Tuple[int, int, int]
+# Totals of a window of (hits, misses, deletes, bytes missed)
+_Totals = Tuple[int, int, int, int]
+
+# Number of events that are aggregated from columns at a time
+_CHUNK_SIZE = 1 << 20
+
+
+class TimeSeries(namedtuple("TimeSeries", ["starts", "width", "hits", "misses", "deletes", "bytes_missed"])):
+    """
+    Number of events of each type, and bytes missed, in consecutive windows of time. Each window covers `width`
+    nanoseconds from its start (in nanoseconds since the epoch) in `starts`. Windows of a sliding series overlap.
+    """
+    __slots__ = ()
+
+    @property
+    def hit_ratios(self) -> np.ndarray:
+        """
+        Gets the proportion of accesses (hits and misses) in each window that were hits.
+        :return: the hit ratio of each window, which is NaN for windows without accesses
+        """
+        accesses = self.hits + self.misses
+        return np.divide(self.hits, accesses, out=np.full(len(accesses), np.nan), where=accesses > 0)
+
+
+def windowed_metrics(records: Iterable[Record], width: Duration, step: Duration=None) -> TimeSeries:
+    """
+    Aggregates the given records into windows of time, in a single pass with memory bounded by the number of steps
+    in a window (aside from the output itself). Windows are aligned to multiples of the step since the epoch (e.g.
+    to the minute or hour) and windows without events are included.
+    :param records: the records, in chronological order (e.g. a live stream of records)
+    :param width: the width of each window, as a `timedelta` or in nanoseconds
+    :param step: the time between the starts of consecutive windows, which must divide the width. If `None`, the
+    windows are tumbling (i.e. the step is the width, so windows do not overlap)
+    :return: the metrics of each window
+    """
+    events = ((to_epoch_nanoseconds(record.timestamp), RECORD_TYPE_EVENTS[type(record)],
+               getattr(record, "block_size", 0)) for record in records)
+    return _aggregate_windows(events, width, step)
+
+
+def windowed_metrics_of_columns(columns: RecordColumns, width: Duration, step: Duration=None) -> TimeSeries:
+    """
+    Aggregates the events in the given columns into windows of time. See `windowed_metrics`. The events are binned
+    into steps a fixed-size chunk at a time, so memory is bounded by the chunk size (aside from the output itself),
+    and the windows are then summed from the running totals of the steps.
+    :param columns: the columns of events
+    :param width: see `windowed_metrics`
+    :param step: see `windowed_metrics`
+    :return: the metrics of each window
+    """
+    width, step = _get_width_and_step(width, step)
+    timestamps = columns.timestamps
+    if len(timestamps) == 0:
+        return TimeSeries(np.empty(0, dtype=np.int64), width, *(np.empty(0, dtype=np.int64) for _ in range(4)))
+    origin = int(timestamps[0]) - int(timestamps[0]) % step
+    number_of_steps = (int(timestamps[-1]) - origin) // step + 1
+
+    # Totals of each step, with a column for each event type
+    counts = np.zeros((number_of_steps, 3), dtype=np.int64)
+    bytes_missed = np.zeros(number_of_steps, dtype=np.int64)
+    for chunk_start in range(0, len(timestamps), _CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + _CHUNK_SIZE)
+        steps = (timestamps[chunk] - origin) // step
+        event_types = columns.event_types[chunk]
+        # The events are in chronological order, so the chunk's steps are a contiguous range
+        first_step, last_step = int(steps[0]), int(steps[-1])
+        chunk_steps = steps - first_step
+        number_of_chunk_steps = last_step - first_step + 1
+        counts[first_step:last_step + 1] += np.bincount(
+            chunk_steps * 3 + event_types, minlength=number_of_chunk_steps * 3).reshape((number_of_chunk_steps, 3))
+        misses = event_types == MISS_EVENT
+        bytes_missed[first_step:last_step + 1] += np.bincount(
+            chunk_steps[misses], weights=columns.block_sizes[chunk][misses],
+            minlength=number_of_chunk_steps).astype(np.int64)
+
+    steps_per_window = width // step
+    totals = [counts[:, HIT_EVENT], counts[:, MISS_EVENT], counts[:, DELETE_EVENT], bytes_missed]
+    windows = []
+    for step_totals in totals:
+        running_totals = np.concatenate(([0], np.cumsum(step_totals)))
+        window_totals = running_totals[1:].copy()
+        window_totals[steps_per_window:] -= running_totals[1:-steps_per_window]
+        windows.append(window_totals)
+    starts = origin + np.arange(number_of_steps, dtype=np.int64) * step + step - width
+    return TimeSeries(starts, width, *windows)
+
+
+def _aggregate_windows(events: Iterable[_Event], width: Duration, step: Duration=None) -> TimeSeries:
+    """
+    Aggregates the given events into windows of time. The totals of the last width / step steps are held, with
+    running sums of them that are updated as each step enters and leaves the window.
+    :param events: the events, in chronological order
+    :param width: see `windowed_metrics`
+    :param step: see `windowed_metrics`
+    :return: the metrics of each window
+    """
+    width, step = _get_width_and_step(width, step)
+    steps_per_window = width // step
+
+    steps = deque()     # type: deque
+    sums = [0, 0, 0, 0]
+    starts, hits, misses, deletes, bytes_missed = [], [], [], [], []
+    for start, totals in _iterate_steps(events, step):
+        steps.append(totals)
+        for i in range(4):
+            sums[i] += totals[i]
+        if len(steps) > steps_per_window:
+            removed = steps.popleft()
+            for i in range(4):
+                sums[i] -= removed[i]
+        starts.append(start + step - width)
+        hits.append(sums[0])
+        misses.append(sums[1])
+        deletes.append(sums[2])
+        bytes_missed.append(sums[3])
+    return TimeSeries(np.array(starts, dtype=np.int64), width,
+                      *(np.array(values, dtype=np.int64) for values in (hits, misses, deletes, bytes_missed)))
+
+
+def _get_width_and_step(width: Duration, step: Optional[Duration]) -> Tuple[int, int]:
+    """
+    Gets the width of windows and the step between them in nanoseconds, checking that the step divides the width.
+    :param width: see `windowed_metrics`
+    :param step: see `windowed_metrics`
+    :return: tuple of the width and the step, in nanoseconds
+    :raises ValueError: if the step is not positive or does not divide the width
+    """
+    width = to_nanoseconds(width)
+    step = width if step is None else to_nanoseconds(step)
+    if step <= 0 or width % step != 0:
+        raise ValueError("Step must be positive and divide the window width: width=%d, step=%d" % (width, step))
+    return width, step
+
+
+def _iterate_steps(events: Iterable[_Event], step: int) -> Iterator[Tuple[int, _Totals]]:
+    """
+    Totals the given events in consecutive steps of time, from the step containing the first event to the step
+    containing the last.
+    :param events: the events, in chronological order
+    :param step: the length of each step, in nanoseconds
+    :return: iterator of the start of each step and its totals
+    """
+    start = None
+    totals = [0, 0, 0, 0]
+    for timestamp, event_type, block_size in events:
+        if start is None:
+            start = timestamp - timestamp % step
+        elif timestamp >= start + step:
+            yield start, tuple(totals)
+            start += step
+            while timestamp >= start + step:
+                yield start, (0, 0, 0, 0)
+                start += step
+            totals = [0, 0, 0, 0]
+        elif timestamp < start:
+            raise ValueError("Events are not in chronological order")
+        if event_type == HIT_EVENT:
+            totals[0] += 1
+        elif event_type == MISS_EVENT:
+            totals[1] += 1
+            totals[3] += block_size
+        elif event_type == DELETE_EVENT:
+            totals[2] += 1
+    if start is not None:
+        yield start, tuple(totals)
+
@@ -0,0 +1,185 @@
+import calendar
+import re
+import warnings
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import dateutil.parser
+import numpy as np
+
+from cacheanalysis.instrumentation import increment
+
+Timestamp = Union[datetime, int]
+Duration = Union[timedelta, int]
+
+_NANOSECONDS_PER_SECOND = 10 ** 9
+_EPOCH = datetime(year=1970, month=1, day=1)
+_MICROSECOND = timedelta(microseconds=1)
+# Number of timestamps converted together when parsing many at once
+_CHUNK_SIZE = 65536
+
+# Fixed-format ISO-8601 (as written by machines): the date and hour are captured as one prefix so that the
+# work of converting them can be cached across timestamps that share it
+_ISO_8601_PATTERN = re.compile(
+    r"(\d{4}-\d{2}-\d{2}[T ]\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,9})\d*)?(Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+
+
+def to_epoch_nanoseconds(timestamp: Timestamp) -> int:
+    """
+    Converts the given timestamp to the number of nanoseconds since the Unix epoch. Timestamps without time
+    zone information are taken to be in UTC. Timestamps that are already integers are returned unchanged.
+    :param timestamp: the timestamp to convert
+    :return: nanoseconds since the epoch
+    """
+    if not isinstance(timestamp, datetime):
+        return timestamp
+    if timestamp.tzinfo is not None and timestamp.utcoffset() is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND * 1000
+
+
+def from_epoch_nanoseconds(nanoseconds: int, timestamp_timezone: Optional[tzinfo]=None) -> datetime:
+    """
+    Converts the given number of nanoseconds since the Unix epoch to a `datetime`. Precision beyond
+    microseconds is lost.
+    :param nanoseconds: nanoseconds since the epoch
+    :param timestamp_timezone: the time zone of the returned timestamp. If `None`, a naive timestamp in UTC is
+    returned
+    :return: the timestamp
+    """
+    timestamp = _EPOCH + timedelta(microseconds=nanoseconds // 1000)
+    if timestamp_timezone is not None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc).astimezone(timestamp_timezone)
+    return timestamp
+
+
+def to_nanoseconds(duration: Duration) -> int:
+    """
+    Converts the given duration to a number of nanoseconds. Durations that are already integers are returned
+    unchanged.
+    :param duration: the duration to convert
+    :return: nanoseconds
+    """
+    if not isinstance(duration, timedelta):
+        return duration
+    return duration // _MICROSECOND * 1000
+
+
+class TimestampParser:
+    """
+    Parser of ISO-8601 timestamps, optimised for the fixed-format strings that are machine-generated. Strings
+    that are not in this format are parsed by `dateutil`.
+    """
+    def __init__(self, epoch_nanoseconds: bool=False, max_cached_prefixes: int=4096):
+        """
+        Constructor.
+        :param epoch_nanoseconds: whether timestamps should be parsed to integer nanoseconds since the epoch
+        (see `to_epoch_nanoseconds`) rather than to `datetime` objects
+        :param max_cached_prefixes: the maximum number of date and hour prefixes to cache
+        """
+        self.epoch_nanoseconds = epoch_nanoseconds
+        self.max_cached_prefixes = max_cached_prefixes
+        self._prefixes = dict()     # type: Dict[str, Tuple[datetime, int]]
+        self._timezones = {"Z": timezone.utc}   # type: Dict[str, timezone]
+
+    def parse(self, timestamp: str) -> Timestamp:
+        """
+        Parses the given timestamp.
+        :param timestamp: the timestamp to parse
+        :return: the parsed timestamp, as either a `datetime` or as nanoseconds since the epoch
+        :raises ValueError: if the timestamp could not be parsed
+        """
+        match = _ISO_8601_PATTERN.match(timestamp)
+        if match is not None:
+            try:
+                return self._parse_match(*match.groups())
+            except ValueError:
+                pass
+        increment("timestamps parsed by dateutil")
+        parsed = dateutil.parser.parse(timestamp)
+        return to_epoch_nanoseconds(parsed) if self.epoch_nanoseconds else parsed
+
+    def parse_all_to_epoch_nanoseconds(self, timestamps: Sequence[str]) -> np.ndarray:
+        """
+        Parses the given timestamps to nanoseconds since the epoch. ISO-8601 timestamps in UTC (designated "Z") or
+        without a time zone are converted together by NumPy, in chunks, which is much faster than parsing them one
+        by one; chunks containing other timestamps are parsed one by one.
+        :param timestamps: the timestamps to parse
+        :return: the parsed timestamps
+        :raises ValueError: if a timestamp could not be parsed
+        """
+        parsed = np.empty(len(timestamps), dtype=np.int64)
+        for start in range(0, len(timestamps), _CHUNK_SIZE):
+            parsed[start:start + _CHUNK_SIZE] = self._parse_chunk(timestamps[start:start + _CHUNK_SIZE])
+        return parsed
+
+    def _parse_chunk(self, timestamps: Sequence[str]) -> np.ndarray:
+        """
+        Parses a chunk of timestamps to nanoseconds since the epoch (see `parse_all_to_epoch_nanoseconds`).
+        :raises ValueError: if a timestamp could not be parsed
+        """
+        # NumPy also accepts words such as "now", which are left to be rejected by the parser
+        if all(timestamp[:1].isdigit() for timestamp in timestamps):
+            try:
+                with warnings.catch_warnings():
+                    # NumPy warns, rather than fails, when given time zones
+                    warnings.simplefilter("error")
+                    return np.array([timestamp[:-1] if timestamp[-1:] == "Z" else timestamp
+                                     for timestamp in timestamps], dtype="datetime64[ns]").view(np.int64)
+            except (ValueError, Warning):
+                pass
+        parser = self if self.epoch_nanoseconds else TimestampParser(True, self.max_cached_prefixes)
+        return np.fromiter((parser.parse(timestamp) for timestamp in timestamps), np.int64, len(timestamps))
+
+    def _parse_match(self, prefix: str, minute: str, second: str, fraction: Optional[str],
+                     zone: Optional[str]) -> Timestamp:
+        """
+        Converts the components of a timestamp matched by the fixed-format pattern.
+        :raises ValueError: if a component is out of range
+        """
+        cached = self._prefixes.get(prefix)
+        if cached is None:
+            cached = self._parse_prefix(prefix)
+        hour, hour_epoch_seconds = cached
+        minute = int(minute)
+        second = int(second)
+        timestamp_timezone = None if zone is None else self._get_timezone(zone)
+
+        if self.epoch_nanoseconds:
+            if minute > 59 or second > 59:
+                raise ValueError("Minute or second out of range")
+            seconds = hour_epoch_seconds + minute * 60 + second
+            if timestamp_timezone is not None:
+                seconds -= timestamp_timezone.utcoffset(None) // timedelta(seconds=1)
+            nanoseconds = 0 if fraction is None else int(fraction.ljust(9, "0"))
+            return seconds * _NANOSECONDS_PER_SECOND + nanoseconds
+
+        microsecond = 0 if fraction is None else int(fraction[:6].ljust(6, "0"))
+        return hour.replace(minute=minute, second=second, microsecond=microsecond, tzinfo=timestamp_timezone)
+
+    def _parse_prefix(self, prefix: str) -> Tuple[datetime, int]:
+        """
+        Parses the date and hour prefix of a timestamp and caches the result.
+        :raises ValueError: if the date or hour is out of range
+        """
+        hour = datetime(year=int(prefix[0:4]), month=int(prefix[5:7]), day=int(prefix[8:10]),
+                        hour=int(prefix[11:13]))
+        parsed = (hour, calendar.timegm(hour.timetuple()))
+        if len(self._prefixes) >= self.max_cached_prefixes:
+            self._prefixes.clear()
+        self._prefixes[prefix] = parsed
+        return parsed
+
+    def _get_timezone(self, zone: str) -> timezone:
+        """
+        Gets the time zone for the given UTC offset designator (e.g. "+01:00").
+        :raises ValueError: if the offset is out of range
+        """
+        timestamp_timezone = self._timezones.get(zone)
+        if timestamp_timezone is None:
+            digits = zone[1:].replace(":", "")
+            offset = timedelta(hours=int(digits[0:2]), minutes=int(digits[2:4] or 0))
+            timestamp_timezone = timezone(-offset if zone[0] == "-" else offset)
+            self._timezones[zone] = timestamp_timezone
+        return timestamp_timezone
@@ -0,0 +1,224 @@
+"""
+Binary columnar trace files, holding records and reference block files so that they can be loaded without parsing.
+
+A trace file consists of a fixed-size header followed by sections, each aligned to 8 bytes:
+- events: fixed-width little-endian rows of (timestamp, block size, block id, event type), in chronological order;
+- block hash dictionary: offsets into, then UTF-8 data of, the hash of each block id. The blocks that have records
+  come first, followed by those that are only in block files;
+- block file names: offsets into, then UTF-8 data of, the name of each block file;
+- block file membership: offsets into, then the ids of, the blocks of each block file.
+
+Loading memory-maps the file, so the events are not read until they are used and processes that load the same
+trace share one copy of it in the page cache.
+
+Usage: python -m cacheanalysis.trace_files input.json output.trace
+(the input is JSON of the form accepted by `run_with_data`, i.e. {"records": [...], "references": [...]})
+"""
+import json
+import struct
+import sys
+from collections import namedtuple
+from datetime import timezone
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from cacheanalysis.collections import BaseRecordCollection, ColumnarRecordCollection, RecordColumns
+from cacheanalysis.json_converters import RecordJSONDecoder, BlockFileJSONDecoder
+from cacheanalysis.models import BlockFile
+
+Trace = namedtuple("Trace", ["record_collection", "block_files"])
+Trace.__doc__ = """
+Records, with the reference block files that the blocks in them belong to.
+"""
+
+EVENT_DTYPE = np.dtype([("timestamp", "<i8"), ("block_size", "<i8"), ("block_id", "<i4"), ("event_type", "i1")],
+                       align=True)
+
+_MAGIC = b"CATRACE\0"
+_FORMAT_VERSION = 1
+# Header: magic, format version, flags, number of events, number of blocks with records, number of blocks, number
+# of block files, then the offsets of the sections
+_HEADER = struct.Struct("<8sIIQQQQ7Q")
+_DATETIME_TIMESTAMPS_FLAG = 1
+_UTC_TIMESTAMPS_FLAG = 2
+_ALIGNMENT = 8
+
+
+class TraceFileError(ValueError):
+    """
+    Raised when a file is not a valid trace file.
+    """
+
+
+def write_trace(path: str, record_collection: BaseRecordCollection, block_files: Iterable[BlockFile]=()):
+    """
+    Writes the given records and block files to a trace file.
+    :param path: the path of the file to write
+    :param record_collection: the records
+    :param block_files: the reference block files
+    """
+    columns = record_collection.columns
+    block_files = list(block_files)
+    block_hashes = list(columns.block_hashes)
+    block_ids = {block_hash: i for i, block_hash in enumerate(block_hashes)}
+    number_of_record_blocks = len(block_hashes)
+    file_block_ids = []     # type: List[int]
+    for block_file in block_files:
+        for block_hash in block_file.block_hashes:
+            block_id = block_ids.get(block_hash)
+            if block_id is None:
+                block_id = len(block_hashes)
+                block_ids[block_hash] = block_id
+                block_hashes.append(block_hash)
+            file_block_ids.append(block_id)
+
+    events = np.zeros(len(columns.block_ids), dtype=EVENT_DTYPE)
+    events["timestamp"] = columns.timestamps
+    events["block_size"] = columns.block_sizes
+    events["block_id"] = columns.block_ids
+    events["event_type"] = columns.event_types
+    file_block_offsets = np.zeros(len(block_files) + 1, dtype="<i8")
+    np.cumsum([len(block_file.block_hashes) for block_file in block_files], out=file_block_offsets[1:])
+
+    sections = [events.tobytes()]
+    sections.extend(_encode_strings(block_hashes))
+    sections.extend(_encode_strings([block_file.name for block_file in block_files]))
+    sections.append(file_block_offsets.tobytes())
+    sections.append(np.array(file_block_ids, dtype="<i4").tobytes())
+
+    flags = 0
+    datetime_timestamps, timestamp_timezone = get_timestamp_type(record_collection)
+    if datetime_timestamps:
+        flags |= _DATETIME_TIMESTAMPS_FLAG
+    if timestamp_timezone is not None:
+        flags |= _UTC_TIMESTAMPS_FLAG
+
+    offsets = []
+    offset = _align(_HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset = _align(offset + len(section))
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, flags, len(events), number_of_record_blocks,
+                                len(block_hashes), len(block_files), *offsets))
+        for section_offset, section in zip(offsets, sections):
+            file.write(b"\0" * (section_offset - file.tell()))
+            file.write(section)
+
+
+def load_trace(path: str) -> Trace:
+    """
+    Loads the records and block files in the given trace file. The events are memory-mapped rather than read.
+    :param path: the path of the trace file
+    :return: the trace, with the records in a `ColumnarRecordCollection`
+    :raises TraceFileError: if the file is not a valid trace file
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(data) < _HEADER.size:
+        raise TraceFileError("File is too short to be a trace file: %s" % path)
+    magic, format_version, flags, number_of_events, number_of_record_blocks, number_of_blocks, number_of_files, \
+        *offsets = _HEADER.unpack(data[:_HEADER.size].tobytes())
+    if magic != _MAGIC:
+        raise TraceFileError("Not a trace file: %s" % path)
+    if format_version != _FORMAT_VERSION:
+        raise TraceFileError("Unsupported trace file version %d: %s" % (format_version, path))
+    events_offset, hash_offsets_offset, hash_data_offset, name_offsets_offset, name_data_offset, \
+        file_block_offsets_offset, file_block_ids_offset = offsets
+
+    events = data[events_offset:events_offset + number_of_events * EVENT_DTYPE.itemsize].view(EVENT_DTYPE)
+    block_hashes = _decode_strings(data, hash_offsets_offset, hash_data_offset, number_of_blocks)
+    names = _decode_strings(data, name_offsets_offset, name_data_offset, number_of_files)
+    file_block_offsets = _view(data, file_block_offsets_offset, "<i8", number_of_files + 1)
+    file_block_ids = _view(data, file_block_ids_offset, "<i4", int(file_block_offsets[-1])).tolist()
+
+    columns = RecordColumns(block_hashes[:number_of_record_blocks], events["block_id"], events["event_type"],
+                            events["timestamp"], events["block_size"])
+    record_collection = ColumnarRecordCollection.from_columns(
+        columns, bool(flags & _DATETIME_TIMESTAMPS_FLAG), timezone.utc if flags & _UTC_TIMESTAMPS_FLAG else None)
+    block_files = [BlockFile(name, [block_hashes[block_id] for block_id in file_block_ids[start:end]])
+                   for name, start, end in zip(names, file_block_offsets[:-1].tolist(),
+                                               file_block_offsets[1:].tolist())]
+    return Trace(record_collection, block_files)
+
+
+def convert_json_trace(json_as_dict: Dict, path: str):
+    """
+    Converts a trace in the JSON format into a trace file.
+    :param json_as_dict: the parsed JSON, with "records" and "references" entries
+    :param path: the path of the trace file to write
+    """
+    record_collection = RecordJSONDecoder().decode_to_collection(json_as_dict["records"])
+    block_files = BlockFileJSONDecoder().decode_parsed(json_as_dict["references"])
+    write_trace(path, record_collection, block_files)
+
+
+def get_timestamp_type(record_collection: BaseRecordCollection) -> Tuple[bool, timezone]:
+    """
+    Gets how the timestamps of the records in the given collection are represented.
+    :param record_collection: the records
+    :return: see `ColumnarRecordCollection.timestamp_type`
+    """
+    if isinstance(record_collection, ColumnarRecordCollection):
+        return record_collection.timestamp_type
+    record = next(iter(record_collection), None)
+    if record is None or isinstance(record.timestamp, int):
+        return False, None
+    return True, None if record.timestamp.utcoffset() is None else timezone.utc
+
+
+def _encode_strings(strings: Sequence[str]) -> Tuple[bytes, bytes]:
+    """
+    Encodes the given strings as offsets into UTF-8 data.
+    :param strings: the strings to encode
+    :return: tuple of the offsets (one more than the number of strings) and the data
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _decode_strings(data: np.ndarray, offsets_offset: int, data_offset: int, number_of_strings: int) -> List[str]:
+    """
+    Decodes strings encoded by `_encode_strings`.
+    :param data: the contents of the trace file
+    :param offsets_offset: the position of the offsets in the file
+    :param data_offset: the position of the UTF-8 data in the file
+    :param number_of_strings: the number of strings
+    :return: the strings
+    """
+    offsets = _view(data, offsets_offset, "<i8", number_of_strings + 1).tolist()
+    encoded = data[data_offset:data_offset + offsets[-1]].tobytes()
+    return [sys.intern(encoded[start:end].decode("utf-8")) for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def _view(data: np.ndarray, offset: int, dtype: str, length: int) -> np.ndarray:
+    """
+    Views part of the contents of the trace file as an array.
+    :param data: the contents of the trace file
+    :param offset: the position of the array in the file
+    :param dtype: the type of the elements of the array
+    :param length: the number of elements in the array
+    :return: the array
+    """
+    dtype = np.dtype(dtype)
+    return data[offset:offset + length * dtype.itemsize].view(dtype)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def main(argv: List[str]=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m cacheanalysis.trace_files input.json output.trace", file=sys.stderr)
+        sys.exit(2)
+    with open(argv[0], "r") as input_file:
+        json_as_dict = json.load(input_file)
+    convert_json_trace(json_as_dict, argv[1])
+
+
+if __name__ == "__main__":
+    main()
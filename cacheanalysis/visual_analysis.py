@@ -1,15 +1,33 @@
 from abc import abstractmethod
-from collections import Counter
+from datetime import timedelta
 from itertools import chain
 from typing import Iterable, List, Sequence, Tuple
 
 import matplotlib as mpl
+import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
 from tabulate import tabulate
 
 from cacheanalysis.analysis import Analysis, BlockAnalysis, BlockFileAnalysis
+from cacheanalysis.instrumentation import timed
+from cacheanalysis.miss_ratio_curves import MissRatioCurve
 from cacheanalysis.models import BlockFile
 from cacheanalysis.statistical_analysis import StatisticalBlockAnalysis, StatisticalBlockFileAnalysis
+from cacheanalysis.time_series import TimeSeries
+from cacheanalysis.timestamps import from_epoch_nanoseconds
+
+# Widths of window that time series are shown with, from which the shortest giving few enough windows is chosen
+_TIME_SERIES_WIDTHS = (timedelta(minutes=1), timedelta(minutes=10), timedelta(hours=1), timedelta(hours=6),
+                       timedelta(days=1), timedelta(weeks=1))
+_MAX_TIME_SERIES_WINDOWS = 500
+# Maximum number of distinct (misses, hits) pairs to plot as points before their density is plotted instead
+_MAX_SCATTER_POINTS = 10000
+_DENSITY_BINS = 200
+# Number of records above which the miss ratio curve is computed from a sample of the blocks, in proportion
+_MAX_MISS_RATIO_CURVE_RECORDS = 100000
 
 
 class VisualAnalysis(Analysis):
@@ -27,31 +45,68 @@ class VisualBlockAnalysis(VisualAnalysis, BlockAnalysis):
     """
     Visualisation for the analysis of blocks that are put in a cache.
     """
+    _statistical_analysis_type = StatisticalBlockAnalysis
+
     def __init__(self, record_collection):
         super().__init__(record_collection)
-        self.statistical_analysis = StatisticalBlockAnalysis(record_collection)
+        self.statistical_analysis = self._statistical_analysis_type(record_collection)
 
-    def visualise(self, highlight_blocks: Sequence[str]=()):
+    @timed()
+    def visualise(self, highlight_blocks: Sequence[str]=(), output_path: str=None, density: bool=None):
         """
         Visualises what happens to the blocks in the collection of records.
         :param highlight_blocks: a list of block hashes to highlight.
+        :param output_path: path of the image file to render the visualisation to, in the format given by its
+        extension (e.g. ".png" or ".svg"), without requiring a display. If `None`, the visualisation is shown
+        :param density: whether to show cache misses against cache hits as the density of blocks in bins rather
+        than as a point for each distinct pair. If `None`, density is shown when there are too many distinct pairs
+        to plot as points
         """
-        fig = plt.figure()
-
-        ax1 = fig.add_subplot(1, 1, 1)  # rows, columns, subplot number (1-indexed)
+        if output_path is not None:
+            # Render without pyplot so that no display (or interactive backend) is needed
+            fig = Figure(figsize=(18, 6))
+            FigureCanvasAgg(fig)
+        else:
+            fig = plt.figure(figsize=(18, 6))
+
+        ax1 = fig.add_subplot(1, 3, 1)  # rows, columns, subplot number (1-indexed)
         ax1.set_title("Cache misses against cache hits")
         x, y, size = self.get_misses_against_hits(self.block_hashes, self.statistical_analysis)
-        self.plot_misses_against_hits(ax1, x, y, s=size)
-        self.set_limits(ax1, x, y)
+        if density is None:
+            density = len(x) > _MAX_SCATTER_POINTS
+        if density:
+            mesh = self.plot_misses_against_hits_density(ax1, x, y, size)
+            fig.colorbar(mesh, ax=ax1, label="Blocks")
+        else:
+            self.plot_misses_against_hits(ax1, x, y, s=size)
+            self.set_limits(ax1, x, y)
         if highlight_blocks:
+            highlight_blocks = set(highlight_blocks)
             x, y, size = self.get_misses_against_hits(
                 [h for h in self.block_hashes if h in highlight_blocks], self.statistical_analysis
             )
             self.plot_misses_against_hits(ax1, x, y, s=size, c="cyan")
 
-        plt.show()
-
-        plt.close(fig)  # pyplot keeps a reference to fig unless close() is called.
+        ax2 = fig.add_subplot(1, 3, 2)
+        sampling_rate = self.choose_miss_ratio_curve_sampling_rate(len(self.record_collection))
+        ax2.set_title("LRU miss ratio against cache size" if sampling_rate == 1
+                      else "LRU miss ratio against cache size (%.2g%% of blocks sampled)" % (sampling_rate * 100))
+        object_curve, _ = self.statistical_analysis.lru_miss_ratio_curves(sampling_rate)
+        self.plot_miss_ratio_curve(ax2, object_curve)
+        ax2.set_xlabel("Cache size (blocks)")
+
+        ax3 = fig.add_subplot(1, 3, 3)
+        ax3.set_title("Hit ratio over time")
+        time_series = self.statistical_analysis.windowed_metrics(
+            self.choose_time_series_width(self.record_collection.columns.timestamps))
+        self.plot_time_series(ax3, time_series)
+
+        fig.tight_layout()
+        if output_path is not None:
+            fig.savefig(output_path)
+        else:
+            plt.show()
+            plt.close(fig)  # pyplot keeps a reference to fig unless close() is called.
 
         # print("Blocks sorted by number of accesses (hits + misses)")
         # # This shows basically how popular a block is
@@ -76,17 +131,16 @@ class VisualBlockAnalysis(VisualAnalysis, BlockAnalysis):
         # ))
 
     @staticmethod
-    def get_misses_against_hits(block_hashes: Iterable[str], statistical_analysis: StatisticalBlockAnalysis) -> Tuple[List[int], List[int], List[int]]:
-        count = Counter()
-        for block_hash in block_hashes:
-            x = statistical_analysis.total_block_misses(block_hash)
-            y = statistical_analysis.total_block_hits(block_hash)
-            count[(x, y)] += 1
-        xysize = []
-        for k, v in count.items():
-            xysize.append((*k, v))
-        x, y, size = zip(*xysize)
-        return x, y, size
+    def get_misses_against_hits(block_hashes: Iterable[str], statistical_analysis: StatisticalBlockAnalysis) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        statistics = statistical_analysis.block_statistics()
+        indexes = [statistics.block_indexes.get(block_hash, -1) for block_hash in block_hashes]
+        # Blocks without records have no misses or hits
+        misses = np.append(statistics.misses, 0)[indexes]
+        hits = np.append(statistics.hits, 0)[indexes]
+        # Count the blocks with each distinct (misses, hits) pair by combining the pair into one value
+        hits_range = int(hits.max()) + 1
+        pairs, size = np.unique(misses * hits_range + hits, return_counts=True)
+        return pairs // hits_range, pairs % hits_range, size
 
     @staticmethod
     def plot_misses_against_hits(ax: mpl.axes.Axes, x: Sequence[int], y: Sequence[int], **kwargs) -> mpl.collections.PathCollection:
@@ -94,26 +148,106 @@ class VisualBlockAnalysis(VisualAnalysis, BlockAnalysis):
         ax.set_ylabel("Cache hits")
         return ax.scatter(x, y, edgecolors="none", **kwargs)
 
+    @staticmethod
+    def plot_misses_against_hits_density(ax: mpl.axes.Axes, x: np.ndarray, y: np.ndarray, counts: np.ndarray,
+                                         bins: int=_DENSITY_BINS, **kwargs) -> mpl.collections.QuadMesh:
+        """
+        Plots the number of blocks in each bin of cache misses against cache hits, so that the cost of plotting
+        does not depend on the number of distinct pairs.
+        :param ax: the axes to plot on
+        :param x: the distinct numbers of cache misses
+        :param y: the distinct numbers of cache hits
+        :param counts: the number of blocks with each pair of cache misses and cache hits
+        :param bins: the number of bins along each axis
+        :return: the plotted mesh
+        """
+        ax.set_xlabel("Cache misses")
+        ax.set_ylabel("Cache hits")
+        binned_counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, weights=counts)
+        # Empty bins are left blank, as they cannot be shown on a logarithmic scale
+        return ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(binned_counts.T, 0), norm=LogNorm(), **kwargs)
+
+    @staticmethod
+    def plot_miss_ratio_curve(ax: mpl.axes.Axes, curve: MissRatioCurve, **kwargs) -> List[mpl.lines.Line2D]:
+        ax.set_xlabel("Cache size")
+        ax.set_ylabel("Miss ratio")
+        ax.set_ylim(0, 1.05)
+        # The miss ratio is 1 until the first capacity at which any access hits
+        return ax.step(np.append(0, curve.capacities), np.append(1, curve.miss_ratios), where="post", **kwargs)
+
+    @staticmethod
+    def plot_time_series(ax: mpl.axes.Axes, time_series: TimeSeries) -> Tuple[mpl.axes.Axes, mpl.axes.Axes]:
+        """
+        Plots the hit ratio of each window of the given time series, with the bytes missed on a second y-axis.
+        :param ax: the axes to plot on
+        :param time_series: the time series
+        :return: tuple of the axes of the hit ratio and of the bytes missed
+        """
+        times = [from_epoch_nanoseconds(start) for start in time_series.starts.tolist()]
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Hit ratio")
+        ax.set_ylim(0, 1.05)
+        ax.step(times, time_series.hit_ratios, where="post", color="blue")
+        bytes_ax = ax.twinx()
+        bytes_ax.set_ylabel("Bytes missed")
+        bytes_ax.step(times, time_series.bytes_missed, where="post", color="red", alpha=0.5)
+        ax.figure.autofmt_xdate()
+        return ax, bytes_ax
+
+    @staticmethod
+    def choose_time_series_width(timestamps: np.ndarray) -> timedelta:
+        """
+        Chooses the width of the windows to show a time series over the given timestamps with, so that there are
+        not too many windows to see.
+        :param timestamps: the timestamps in the time series, in chronological order
+        :return: the width
+        """
+        span = timedelta(microseconds=int(timestamps[-1] - timestamps[0]) // 1000) if len(timestamps) > 0 \
+            else timedelta(0)
+        for width in _TIME_SERIES_WIDTHS:
+            if span / width < _MAX_TIME_SERIES_WINDOWS:
+                return width
+        return span / _MAX_TIME_SERIES_WINDOWS
+
+    @staticmethod
+    def choose_miss_ratio_curve_sampling_rate(number_of_records: int) -> float:
+        """
+        Chooses the proportion of blocks to sample when computing the miss ratio curve to show for the given number
+        of records, so that the curve of a large collection is quick to compute.
+        :param number_of_records: the number of records
+        :return: the sampling rate, in (0, 1]
+        """
+        if number_of_records <= _MAX_MISS_RATIO_CURVE_RECORDS:
+            return 1.0
+        return _MAX_MISS_RATIO_CURVE_RECORDS / number_of_records
+
     @staticmethod
     def set_limits(ax, x, y):
-        ax.set_xlim(-.1*(max(x)-min(x)), max(x) + .1*(max(x)-min(x)))
-        ax.set_ylim(-.1*(max(y)-min(y)), max(y) + .1*(max(y)-min(y)))
+        x_min, x_max, y_min, y_max = np.min(x), np.max(x), np.min(y), np.max(y)
+        ax.set_xlim(-.1*(x_max-x_min), x_max + .1*(x_max-x_min))
+        ax.set_ylim(-.1*(y_max-y_min), y_max + .1*(y_max-y_min))
 
 
 class VisualBlockFileAnalysis(VisualBlockAnalysis, BlockFileAnalysis):
     """
     Visualisation for the analysis of known blocks that are put in a cache.
     """
-    def __init__(self, record_collection):
-        super().__init__(record_collection)
-        self.statistical_analysis = StatisticalBlockFileAnalysis(record_collection)
+    _statistical_analysis_type = StatisticalBlockFileAnalysis
+
+    def register_file(self, file: BlockFile):
+        super().register_file(file)
+        self.statistical_analysis.register_file(file)
 
-    def visualise(self, highlight_blocks: Sequence[str]=(), highlight_files: Sequence[BlockFile]=()):
+    def visualise(self, highlight_blocks: Sequence[str]=(), highlight_files: Sequence[BlockFile]=(),
+                  output_path: str=None, density: bool=None):
         """
         Visualises what happens to the blocks in the collection of records, with
         information on what file each block belongs to.
         :param highlight_blocks: a list of block hashes to highlight. Combined with
         `highlight_files`.
         :param highlight_files: a list of files to highlight. Combined with `highlight_blocks`.
+        :param output_path: see `VisualBlockAnalysis.visualise`
+        :param density: see `VisualBlockAnalysis.visualise`
         """
-        super().visualise(list(highlight_blocks) + list(chain.from_iterable([f.block_hashes for f in highlight_files])))
+        super().visualise(list(highlight_blocks) + list(chain.from_iterable([f.block_hashes for f in highlight_files])),
+                          output_path, density)